@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+'''
+Bake a SmugMug gallery into a frame pack that slideshow.py --frame-pack plays without decoding
+'''
+#
+# Standard Imports
+#
+from __future__ import absolute_import, division, print_function, unicode_literals
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import logging
+import multiprocessing
+import os
+try:
+    from pathlib import Path
+except ModuleNotFoundError:
+    from pathlib2 import Path
+import sys
+import time
+#
+# Ensure ./lib is in the lib path for local includes
+#
+LIB_PATH = Path(__file__).resolve().parent / 'lib'
+sys.path.append(str(LIB_PATH))
+#
+# pylint: disable=wrong-import-position
+# local directory imports here
+#
+from framepack import FramePack, FramePackWriter, PIXEL_FORMAT, PIXEL_FORMATS
+from imaging import scale_pixels, SCALE_QUALITIES, SCALE_QUALITY
+from smug import Slideshow
+from transport import configure_transport
+#
+##############################################################################
+#
+# Global Variables
+#
+DEFAULT_LOG_LEVEL = os.environ.get('PY_LOG_LEVEL', 'WARNING')
+
+# Worker processes that decode and scale
+PROCESSES = max(1, (os.cpu_count() or 1) - 1)
+
+# Images downloaded and scaled at once; bounds the memory held in flight
+BATCH = 8
+#
+##############################################################################
+#
+# _get_logger() - reusable code to get the correct logger by name
+#
+def _get_logger():
+    '''
+    Reusable code to get the correct logger by name of current file
+
+    Returns:
+        logging.logger: Instance of logger for name of current file
+    '''
+    return logging.getLogger(Path(__file__).resolve().name)
+#
+##############################################################################
+#
+# bake()
+#
+# pylint: disable=too-many-arguments,too-many-locals
+def bake(slide_show=None, writer=None, size=None, quality=SCALE_QUALITY,
+         pixel_format=PIXEL_FORMAT, processes=PROCESSES, skip=None):
+    '''
+    Download, decode and scale every image of a slideshow into a frame pack. Each batch
+        downloads on threads and then scales in worker processes; frames are written in playlist
+        order.
+
+    Args:
+        slide_show (Slideshow): Slideshow with the gallery loaded
+        writer (FramePackWriter): Pack to add the frames to
+        size (tuple): Width and height of the display
+        quality (str): One of imaging.SCALE_QUALITIES
+        pixel_format (str): One of framepack.PIXEL_FORMATS
+        processes (int): Worker processes that decode and scale. 0 does it in this one.
+        skip (FramePack): Existing pack whose frames are copied instead of baked again
+
+    Returns:
+        int: Number of images that could not be baked
+    '''
+    logger = _get_logger()
+    refs = slide_show.image_refs()
+    failed = 0
+    started = time.monotonic()
+
+    scaler = None
+    if processes > 0:
+        # spawned, like the renderer's, so no download threads are copied into the workers
+        scaler = ProcessPoolExecutor(max_workers=processes,
+                                     mp_context=multiprocessing.get_context('spawn'))
+
+    with ThreadPoolExecutor(max_workers=BATCH, thread_name_prefix='bake') as fetcher:
+        for start in range(0, len(refs), BATCH):
+            downloads = []
+            for key, url in refs[start:start + BATCH]:
+                if key in writer:
+                    continue
+                if None not in [skip] and key in skip:
+                    pixels, frame_size = skip.pixels(key)
+                    writer.add(key, pixels, frame_size)
+                    pixels.release()
+                    continue
+                downloads.append((key, fetcher.submit(slide_show.fetch, key, url)))
+
+            scaling = []
+            for key, download in downloads:
+                data = download.result()
+                if None in [data]:
+                    logger.error("Loading '%s' failed", key)
+                    failed += 1
+                    continue
+                if None in [scaler]:
+                    scaling.append((key, None, data))
+                else:
+                    scaling.append((key, scaler.submit(scale_pixels, data, size, quality, False,
+                                                       pixel_format), None))
+
+            for key, future, data in scaling:
+                # pylint: disable=broad-except
+                try:
+                    if None in [future]:
+                        pixels, frame_size, _ = scale_pixels(data, size, quality, False,
+                                                             pixel_format)
+                    else:
+                        pixels, frame_size, _ = future.result()
+                except Exception as err:
+                    logger.error("Scaling '%s' failed: '%s'", key, err)
+                    failed += 1
+                    continue
+                writer.add(key, pixels, frame_size)
+            logger.info("Baked %d of %d images", len(writer), len(refs))
+
+    if None not in [scaler]:
+        scaler.shutdown(wait=True)
+    logger.info("Baked %d images in %.1fs", len(writer), time.monotonic() - started)
+    return failed
+#
+##############################################################################
+#
+# handle_arguments()
+#
+def handle_arguments():
+    '''
+    Parse command line arguments
+
+    Returns:
+        argparse.Namespace: Representation of provided arguments
+    '''
+    parser = argparse.ArgumentParser(
+        description=('Scale one or more SmugMug galleries for a display ahead of time and store '
+                     'the frames in a pack for slideshow.py --frame-pack'))
+
+    parser.add_argument('-g', '--gallery-id', action='append',
+                        help='Gallery Id to bake. May be repeated.')
+    parser.add_argument('-u', '--gallery-url', action='append',
+                        help='URL of Gallery to bake. May be repeated.')
+    parser.add_argument('-n', '--nickname', action='append',
+                        help='SmugMug nickname whose recent images to bake. May be repeated.')
+
+    parser.add_argument("--site-url", action='store', required=False, default=Slideshow.SITE_URL,
+                        help=("Site to look gallery ids and nicknames up on. "
+                              "Default: {}".format(Slideshow.SITE_URL)))
+
+    parser.add_argument('-o', '--output', action='store', required=True,
+                        help="Frame pack file to write")
+
+    parser.add_argument("--resolution", action='store', required=True, type=int, nargs=2,
+                        metavar=('WIDTH', 'HEIGHT'),
+                        help="Size of the display the pack will be played on")
+
+    parser.add_argument("--pixel-format", action='store', required=False,
+                        choices=sorted(PIXEL_FORMATS), default=PIXEL_FORMAT,
+                        help=("Pixel format of the display, so frames blit without converting. "
+                              "slideshow.py logs the one it wants. "
+                              "Default: {}".format(PIXEL_FORMAT)))
+
+    parser.add_argument("--scale-quality", action='store', required=False,
+                        choices=sorted(SCALE_QUALITIES), default=SCALE_QUALITY,
+                        help="Image scaling quality. Default: {}".format(SCALE_QUALITY))
+
+    parser.add_argument('-d', '--downscale-only', action='store_true', required=False,
+                        help=('Enable downscale mode. Prefer images larger than the display. '
+                              'Default: False'), default=False)
+
+    parser.add_argument("--render-processes", action='store', required=False, default=PROCESSES,
+                        type=int,
+                        help=("Worker processes that decode and scale images. 0 does it in the "
+                              "main process. Default: {}".format(PROCESSES)))
+
+    parser.add_argument("--cache-dir", action='store', required=False, default=None,
+                        help=("Directory of the slideshow's persistent image cache, to bake from "
+                              "images already downloaded. Default: memory only"))
+
+    parser.add_argument("--update", action='store_true', required=False, default=False,
+                        help=("Copy the frames an existing pack at the output path already has "
+                              "and only bake new images. Default: False"))
+
+    parser.add_argument('-l', '--log-level', action='store', required=False,
+                        choices=["debug", "info", "warning", "error", "critical"],
+                        default=DEFAULT_LOG_LEVEL.upper(),
+                        help='Logging verbosity. Default: {}'.format(DEFAULT_LOG_LEVEL.upper()))
+
+    args = parser.parse_args()
+
+    if not (args.gallery_id or args.gallery_url or args.nickname):
+        parser.error("at least one of -g/--gallery-id, -u/--gallery-url or -n/--nickname "
+                     "is required")
+
+    return args
+#
+##############################################################################
+#
+# main()
+#
+def main():
+    '''
+    Bake the galleries
+    '''
+    args = handle_arguments()
+
+    logging.basicConfig(format='%(levelname)s:%(module)s.%(funcName)s:%(message)s',
+                        level=getattr(logging, args.log_level.upper()))
+
+    size = tuple(args.resolution)
+
+    skip = None
+    if args.update and os.path.exists(args.output):
+        try:
+            skip = FramePack(args.output)
+        except (OSError, RuntimeError) as err:
+            _get_logger().warning("Baking everything again: '%s'", err)
+        else:
+            if skip.size != size or skip.pixel_format != args.pixel_format or \
+                    skip.quality != args.scale_quality:
+                _get_logger().warning("Baking everything again: '%s' is %dx%d %s %s",
+                                      args.output, skip.size[0], skip.size[1], skip.pixel_format,
+                                      skip.quality)
+                skip.close()
+                skip = None
+
+    configure_transport()
+    slide_show = Slideshow(gallery_id=args.gallery_id, gallery_url=args.gallery_url,
+                           nickname=args.nickname, site_url=args.site_url,
+                           downscale=args.downscale_only, height=size[1], width=size[0],
+                           prefetch_ahead=0, prefetch_behind=0, cache_dir=args.cache_dir)
+
+    writer = FramePackWriter(args.output, size, args.pixel_format, args.scale_quality)
+    try:
+        failed = bake(slide_show, writer, size, args.scale_quality, args.pixel_format,
+                      args.render_processes, skip)
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        slide_show.close()
+        if None not in [skip]:
+            skip.close()
+    writer.close()
+
+    print("Baked {} frames into '{}' ({:.1f} MB), {} failed".format(
+        len(writer), args.output, os.path.getsize(args.output) / 1024 / 1024, failed))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
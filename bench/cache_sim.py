@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+'''
+Replay a slideshow playlist against the memory cache eviction policies and compare hit rates
+'''
+#
+# Standard Imports
+#
+from __future__ import absolute_import, division, print_function, unicode_literals
+import argparse
+try:
+    from pathlib import Path
+except ModuleNotFoundError:
+    from pathlib2 import Path
+import random
+import sys
+#
+# Ensure ../lib is in the lib path for local includes
+#
+LIB_PATH = Path(__file__).resolve().parent.parent / 'lib'
+sys.path.append(str(LIB_PATH))
+#
+# pylint: disable=wrong-import-position
+# local directory imports here
+#
+from cache import LruCache, PlaylistCache
+#
+##############################################################################
+#
+# RandomCache
+#
+class RandomCache(LruCache):
+    '''RandomCache - the original Slideshow policy: evict a random entry'''
+    #
+    ####################################################################################
+    #
+    # __init__()
+    #
+    def __init__(self, max_size=None, seed=None):
+        super(RandomCache, self).__init__(max_size=max_size)
+        self._random = random.Random(seed)
+    #
+    ####################################################################################
+    #
+    # _victim()
+    #
+    def _victim(self, keep=None):
+        candidates = [key for key in self._entries if key != keep]
+        return self._random.choice(candidates) if candidates else None
+#
+##############################################################################
+#
+# simulate()
+#
+def simulate(cache=None, sizes=None, args=None):
+    '''
+    Replay a playlist the way Slideshow walks it
+
+    Args:
+        cache (LruCache): Cache under test
+        sizes (list): Size (in bytes) of every gallery entry
+        args (argparse.Namespace): Simulation settings
+
+    Returns:
+        dict: Display hit rate, network fetches and bytes fetched
+    '''
+    rand = random.Random(args.seed)
+    length = len(sizes)
+    playlist = rand.sample(range(length), k=length)
+    cache.set_playlist(playlist)
+
+    fetches = {'count': 0, 'bytes': 0}
+
+    def fetch(key):
+        if key not in cache:
+            fetches['count'] += 1
+            fetches['bytes'] += sizes[key]
+            cache.put(key, b'', size=sizes[key])
+
+    pos = 0
+    shown = 0
+    hits = 0
+    for _ in range(args.steps):
+        direction = -1 if rand.random() < args.back else 1
+        pos += direction
+        if pos >= length:
+            pos = 0
+            if args.reshuffle:
+                playlist = rand.sample(range(length), k=length)
+                cache.set_playlist(playlist)
+        elif pos < 0:
+            pos = length - 1
+        cache.set_position(pos, direction)
+
+        key = playlist[pos]
+        shown += 1
+        if None not in [cache.get(key)]:
+            hits += 1
+        else:
+            fetch(key)
+
+        # what Slideshow.prefetch() asks for once the slide is up
+        offsets = list(range(1, args.ahead + 1))
+        offsets += [-offset for offset in range(1, args.behind + 1)]
+        for offset in offsets:
+            fetch(playlist[(pos + offset) % length])
+
+    return {
+        'hit_rate': hits / shown,
+        'fetches': fetches['count'],
+        'fetched_mb': fetches['bytes'] / 1024 / 1024,
+    }
+#
+##############################################################################
+#
+# handle_arguments()
+#
+def handle_arguments():
+    '''
+    Parse command line arguments
+
+    Returns:
+        argparse.Namespace: Representation of provided arguments
+    '''
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+
+    parser.add_argument('--images', type=int, default=2000, help='Gallery size. Default: 2000')
+    parser.add_argument('--cache-size', type=int, default=128,
+                        help='Memory cache size in megabytes. Default: 128')
+    parser.add_argument('--min-size', type=int, default=500,
+                        help='Smallest image in kilobytes. Default: 500')
+    parser.add_argument('--max-size', type=int, default=3000,
+                        help='Largest image in kilobytes. Default: 3000')
+    parser.add_argument('--steps', type=int, default=20000,
+                        help='Number of transitions to replay. Default: 20000')
+    parser.add_argument('--back', type=float, default=0.1,
+                        help='Probability that a transition is a left arrow. Default: 0.1')
+    parser.add_argument('--ahead', type=int, default=2, help='Prefetch ahead. Default: 2')
+    parser.add_argument('--behind', type=int, default=1, help='Prefetch behind. Default: 1')
+    parser.add_argument('--reshuffle', action='store_true', default=False,
+                        help='Reshuffle at the end of every loop like the original next()')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed. Default: 1')
+
+    return parser.parse_args()
+#
+##############################################################################
+#
+# main()
+#
+def main():
+    '''
+    Run the simulation for every policy and print a table
+    '''
+    args = handle_arguments()
+
+    rand = random.Random(args.seed)
+    sizes = [rand.randint(args.min_size, args.max_size) * 1024 for _ in range(args.images)]
+    max_size = args.cache_size * 1024 * 1024
+
+    policies = [
+        ('random', RandomCache(max_size=max_size, seed=args.seed)),
+        ('lru', LruCache(max_size=max_size)),
+        ('playlist', PlaylistCache(max_size=max_size)),
+    ]
+
+    print("{:<10} {:>9} {:>9} {:>12}".format('policy', 'hit rate', 'fetches', 'fetched MB'))
+    for name, cache in policies:
+        result = simulate(cache=cache, sizes=sizes, args=args)
+        print("{:<10} {:>8.2f}% {:>9} {:>12.1f}".format(name, result['hit_rate'] * 100,
+                                                         result['fetches'],
+                                                         result['fetched_mb']))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+'''
+Measure the CPU the slideshow event loop uses while an image is on screen
+'''
+#
+# Standard Imports
+#
+from __future__ import absolute_import, division, print_function, unicode_literals
+import argparse
+import os
+try:
+    from pathlib import Path
+except ModuleNotFoundError:
+    from pathlib2 import Path
+import sys
+import time
+#
+# Render without a real display
+#
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+#
+# Ensure the repository root is in the lib path for slideshow.py
+#
+ROOT_PATH = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_PATH))
+#
+# Non-standard imports
+#
+import pygame
+#
+# pylint: disable=wrong-import-position
+# local directory imports here
+#
+import slideshow
+from scheduler import Scheduler
+#
+##############################################################################
+#
+# spin_loop()
+#
+def spin_loop(deadline=None):
+    '''The original main() loop: poll the event queue without waiting'''
+    count = 0
+    while time.monotonic() < deadline:
+        # pylint: disable=no-member
+        for event in pygame.event.get():
+            if event.type == pygame.USEREVENT:
+                count += 1
+    return count, 0
+#
+##############################################################################
+#
+# wait_loop()
+#
+def wait_loop(deadline=None):
+    '''The current main() loop: sleep in next_events() and run chores while idle'''
+    count = 0
+    scheduler = Scheduler()
+    # a flush-sized chore every second, far more often than the slideshow schedules any
+    scheduler.every(1, lambda: None, name='chore')
+
+    while time.monotonic() < deadline:
+        for event in slideshow.next_events(scheduler):
+            # pylint: disable=no-member
+            if event.type == pygame.USEREVENT:
+                count += 1
+    return count, scheduler.runs
+#
+##############################################################################
+#
+# handle_arguments()
+#
+def handle_arguments():
+    '''
+    Parse command line arguments
+
+    Returns:
+        argparse.Namespace: Representation of provided arguments
+    '''
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+
+    parser.add_argument('--seconds', type=float, default=10,
+                        help='How long to run each loop. Default: 10')
+    parser.add_argument('--show-time', type=int, default=1000,
+                        help='Milliseconds between slide timer events. Default: 1000')
+
+    return parser.parse_args()
+#
+##############################################################################
+#
+# main()
+#
+def main():
+    '''
+    Run both loops against the same timer and report CPU time per wall second
+    '''
+    args = handle_arguments()
+
+    # pylint: disable=no-member
+    pygame.init()
+    pygame.display.set_mode((320, 240))
+    pygame.time.set_timer(pygame.USEREVENT, args.show_time)
+
+    print("{:<6} {:>8} {:>8} {:>7}".format('loop', 'CPU %', 'ticks', 'chores'))
+    for name, loop in [('spin', spin_loop), ('wait', wait_loop)]:
+        pygame.event.clear()
+        wall = time.monotonic()
+        cpu = time.process_time()
+        ticks, chores = loop(deadline=wall + args.seconds)
+        cpu = time.process_time() - cpu
+        wall = time.monotonic() - wall
+        print("{:<6} {:>7.1f}% {:>8} {:>7}".format(name, cpu / wall * 100, ticks, chores))
+
+if __name__ == '__main__':
+    main()
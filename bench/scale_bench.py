@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+'''
+Benchmark scale_image() against the original decode/scale path on large JPEGs
+'''
+#
+# Standard Imports
+#
+from __future__ import absolute_import, division, print_function, unicode_literals
+import argparse
+from io import BytesIO
+import json
+import logging
+import math
+import os
+try:
+    from pathlib import Path
+except ModuleNotFoundError:
+    from pathlib2 import Path
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+#
+# Render without a real display
+#
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+#
+# Ensure ./lib is in the lib path for local includes
+#
+LIB_PATH = Path(__file__).resolve().parent.parent / 'lib'
+sys.path.append(str(LIB_PATH))
+#
+# Non-standard imports
+#
+import PIL
+from PIL import Image
+import pygame
+#
+# pylint: disable=wrong-import-position
+# local directory imports here
+#
+from imaging import fit_size, resize_fit, SCALE_QUALITY
+#
+##############################################################################
+#
+# make_jpeg()
+#
+def make_jpeg(path=None, size=None, exif=None):
+    '''
+    Write a synthetic photo-like JPEG: smooth gradients with sensor-like noise
+
+    Args:
+        path (str): Where to write the JPEG
+        size (tuple): Width and height
+        exif (PIL.Image.Exif): EXIF block to embed. Default: none
+    '''
+    gradient = Image.linear_gradient('L').resize(size)
+    noise = Image.effect_noise(size, 24)
+    red = Image.blend(gradient, noise, 0.3)
+    green = Image.blend(gradient.transpose(Image.FLIP_LEFT_RIGHT), noise, 0.3)
+    blue = Image.blend(gradient.transpose(Image.FLIP_TOP_BOTTOM), noise, 0.3)
+    Image.merge('RGB', (red, green, blue)).save(path, 'JPEG', quality=92,
+                                                 exif=exif if exif else b'')
+#
+##############################################################################
+#
+# peak_rss()
+#
+def peak_rss():
+    '''
+    Peak resident memory of this process in kilobytes. VmHWM is per address space, unlike
+        ru_maxrss which Linux carries over from the parent across exec().
+
+    Returns:
+        int: Peak resident set size (in kilobytes)
+    '''
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+#
+##############################################################################
+#
+# image_to_surface()
+#
+def image_to_surface(the_image=None):
+    '''
+    Wrap an RGB Pillow image in a pygame surface. The surface shares the single bytes object
+        exported from Pillow instead of copying it again the way fromstring() does.
+
+    Args:
+        the_image (PIL.Image): RGB Pillow image
+
+    Returns:
+        pygame.Surface: Surface backed by the image pixels
+    '''
+    return pygame.image.frombuffer(the_image.tobytes(), the_image.size, the_image.mode)
+#
+##############################################################################
+#
+# scale_image()
+#
+def scale_image(img=None, size=None, quality=SCALE_QUALITY):
+    '''
+    Take loaded image bytes and scale it to the max size that will fit in the width x height
+        provided while preserving the aspect ratio of the original. The single-image path the
+        renderer's imaging.scale_pixels() grew out of, kept for the benchmark.
+
+    The image is decoded once with Pillow. pygame only decodes it if Pillow cannot.
+
+    Inspiration fron:
+    https://github.com/charlesthk/python-resize-image/blob/master/resizeimage/resizeimage.py#L98
+
+    Args:
+        picture (BytesIO): The image data to scale
+        size (set): Two member set of width and height
+        quality (str): One of SCALE_QUALITIES
+
+    Return:
+        pygame.image: Image result. Centering and the black border are left to the caller.
+
+    Raises:
+        RuntimeError: If any arguments are missing
+    '''
+    if None in [img, size]:
+        raise RuntimeError("Missing an argument!")
+
+    result = None
+    # pylint: disable=broad-except
+    try:
+        with Image.open(img) as pil_image:
+            result = image_to_surface(resize_fit(pil_image, size, quality))
+    except Exception as err:
+        logging.getLogger(Path(__file__).resolve().name).error("Scaling failed: '%s'", err)
+
+    if None in [result]:
+        img.seek(0)
+        result = pygame.image.load(img)
+        new_size = fit_size(result.get_size(), size)
+        if new_size != result.get_size():
+            try:
+                result = pygame.transform.smoothscale(result, new_size)
+            except ValueError as err:
+                logging.getLogger(Path(__file__).resolve().name).error("Scaling failed: '%s'", err)
+
+    return result
+#
+##############################################################################
+#
+# legacy_scale_image()
+#
+def legacy_scale_image(img=None, size=None):
+    '''The scale_image() path this benchmark was written against, kept for comparison'''
+    tmp_img = BytesIO(img.getvalue())
+    result = pygame.image.load(tmp_img)
+
+    with PIL.Image.open(img) as pil_image:
+        the_image = pil_image.copy()
+        the_image.thumbnail(size, PIL.Image.LANCZOS)
+        background = PIL.Image.new('RGB', size, (0, 0, 0))
+        background.paste(the_image, (int(math.ceil((size[0] - the_image.size[0]) / 2)),
+                                     int(math.ceil((size[1] - the_image.size[1]) / 2))))
+    result = pygame.image.fromstring(background.tobytes(), background.size, background.mode)
+    return result
+#
+##############################################################################
+#
+# run_worker()
+#
+def run_worker(args=None):
+    '''
+    Time one implementation in this process and print the results as JSON
+    '''
+    with open(args.file, 'rb') as jpeg_file:
+        data = jpeg_file.read()
+
+    scale = legacy_scale_image if args.worker == 'legacy' else scale_image
+    size = tuple(args.size)
+
+    # warm up imports and codecs on a tiny image before taking the baseline
+    warm_up = BytesIO()
+    Image.new('RGB', (64, 64)).save(warm_up, 'JPEG')
+    scale(img=BytesIO(warm_up.getvalue()), size=(32, 32))
+    baseline = peak_rss()
+
+    timings = []
+    for _ in range(args.iterations):
+        start = time.perf_counter()
+        surface = scale(img=BytesIO(data), size=size)
+        timings.append((time.perf_counter() - start) * 1000)
+        del surface
+
+    peak = peak_rss()
+    print(json.dumps({
+        'mode': args.worker,
+        'mean_ms': sum(timings) / len(timings),
+        'min_ms': min(timings),
+        'peak_delta_mb': (peak - baseline) / 1024,
+    }))
+#
+##############################################################################
+#
+# handle_arguments()
+#
+def handle_arguments():
+    '''
+    Parse command line arguments
+
+    Returns:
+        argparse.Namespace: Representation of provided arguments
+    '''
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+
+    parser.add_argument('--file', default=None,
+                        help='JPEG to scale. Default: generate a 6000x4000 (24MP) JPEG')
+    parser.add_argument('--size', type=int, nargs=2, default=[1920, 1080],
+                        help='Display size to scale to. Default: 1920 1080')
+    parser.add_argument('--iterations', type=int, default=5,
+                        help='Scales per implementation. Default: 5')
+    parser.add_argument('--worker', choices=['legacy', 'current'], default=None,
+                        help=argparse.SUPPRESS)
+
+    return parser.parse_args()
+#
+##############################################################################
+#
+# main()
+#
+def main():
+    '''
+    Run each implementation in a fresh process so peak memory is measured independently
+    '''
+    args = handle_arguments()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    tmp_dir = None
+    if None in [args.file]:
+        tmp_dir = tempfile.mkdtemp()
+        args.file = os.path.join(tmp_dir, '24mp.jpg')
+        make_jpeg(args.file, (6000, 4000))
+
+    print("{} ({:.1f}MB) -> {}x{}".format(args.file, os.path.getsize(args.file) / 1024 / 1024,
+                                          *args.size))
+    print("{:<8} {:>10} {:>10} {:>14}".format('mode', 'mean ms', 'min ms', 'peak +MB'))
+    for mode in ['legacy', 'current']:
+        output = subprocess.check_output([sys.executable, __file__, '--worker', mode,
+                                          '--file', args.file, '--iterations',
+                                          str(args.iterations), '--size'] +
+                                         [str(dim) for dim in args.size])
+        result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+        print("{:<8} {:>10.1f} {:>10.1f} {:>14.1f}".format(mode, result['mean_ms'],
+                                                          result['min_ms'],
+                                                          result['peak_delta_mb']))
+
+    if tmp_dir:
+        os.unlink(args.file)
+        os.rmdir(tmp_dir)
+
+if __name__ == '__main__':
+    main()
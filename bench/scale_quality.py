@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+'''
+Compare the --scale-quality modes: milliseconds per image and PSNR against the best mode
+'''
+#
+# Standard Imports
+#
+from __future__ import absolute_import, division, print_function, unicode_literals
+import argparse
+from io import BytesIO
+import math
+import os
+try:
+    from pathlib import Path
+except ModuleNotFoundError:
+    from pathlib2 import Path
+import sys
+import tempfile
+import time
+#
+# Render without a real display
+#
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+#
+# Ensure ./lib is in the lib path for local includes
+#
+LIB_PATH = Path(__file__).resolve().parent.parent / 'lib'
+sys.path.append(str(LIB_PATH))
+#
+# Non-standard imports
+#
+import PIL
+from PIL import ImageChops, ImageStat
+#
+# pylint: disable=wrong-import-position
+# local directory imports here
+#
+from imaging import resize_fit
+from scale_bench import make_jpeg
+#
+##############################################################################
+#
+# psnr()
+#
+def psnr(reference=None, candidate=None):
+    '''
+    Peak signal-to-noise ratio of candidate against reference, in dB
+
+    Args:
+        reference (PIL.Image): Reference RGB image
+        candidate (PIL.Image): RGB image of the same size
+
+    Returns:
+        float: PSNR (infinite for identical images)
+    '''
+    diff = ImageChops.difference(reference, candidate)
+    mse = sum(ImageStat.Stat(diff).sum2) / (reference.size[0] * reference.size[1] * 3)
+    if mse == 0:
+        return float('inf')
+    return 10 * math.log10(255 * 255 / mse)
+#
+##############################################################################
+#
+# handle_arguments()
+#
+def handle_arguments():
+    '''
+    Parse command line arguments
+
+    Returns:
+        argparse.Namespace: Representation of provided arguments
+    '''
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+
+    parser.add_argument('files', nargs='*',
+                        help='JPEGs to scale. Default: generate a 6000x4000 (24MP) JPEG')
+    parser.add_argument('--size', type=int, nargs=2, default=[1920, 1080],
+                        help='Display size to scale to. Default: 1920 1080')
+    parser.add_argument('--iterations', type=int, default=5,
+                        help='Scales per file and mode. Default: 5')
+
+    return parser.parse_args()
+#
+##############################################################################
+#
+# main()
+#
+def main():
+    '''
+    Scale every file in every mode and print a table
+    '''
+    args = handle_arguments()
+    size = tuple(args.size)
+
+    tmp_dir = None
+    if not args.files:
+        tmp_dir = tempfile.mkdtemp()
+        args.files = [os.path.join(tmp_dir, '24mp.jpg')]
+        make_jpeg(args.files[0], (6000, 4000))
+
+    print("{} file(s) -> {}x{}".format(len(args.files), *size))
+    print("{:<10} {:>10} {:>10}".format('mode', 'ms/image', 'PSNR dB'))
+
+    results = {}
+    for path in args.files:
+        with open(path, 'rb') as jpeg_file:
+            data = jpeg_file.read()
+
+        reference = None
+        for quality in ['best', 'balanced', 'fast']:
+            timings = []
+            for _ in range(args.iterations):
+                start = time.perf_counter()
+                with PIL.Image.open(BytesIO(data)) as pil_image:
+                    scaled = resize_fit(pil_image, size, quality)
+                timings.append((time.perf_counter() - start) * 1000)
+
+            reference = scaled if None in [reference] else reference
+            result = results.setdefault(quality, {'ms': [], 'psnr': []})
+            result['ms'].append(sum(timings) / len(timings))
+            result['psnr'].append(psnr(reference, scaled))
+
+    for quality in ['best', 'balanced', 'fast']:
+        result = results[quality]
+        print("{:<10} {:>10.1f} {:>10.2f}".format(quality, sum(result['ms']) / len(result['ms']),
+                                                   min(result['psnr'])))
+
+    if tmp_dir:
+        os.unlink(args.files[0])
+        os.rmdir(tmp_dir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+'''
+Benchmark the slideshow end to end against a local stub SmugMug server and save the results as
+JSON to compare runs
+'''
+#
+# Standard Imports
+#
+from __future__ import absolute_import, division, print_function, unicode_literals
+import argparse
+import atexit
+from datetime import datetime
+import json
+import logging
+import os
+try:
+    from pathlib import Path
+except ModuleNotFoundError:
+    from pathlib2 import Path
+import random
+import resource
+import subprocess
+import sys
+import time
+#
+# Render without a real display
+#
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+#
+# Ensure the repository root is in the lib path for slideshow.py
+#
+ROOT_PATH = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_PATH))
+#
+# Non-standard imports
+#
+import pygame
+#
+# pylint: disable=wrong-import-position
+# local directory imports here
+#
+import slideshow
+from metrics import configure_metrics
+from render import FRAME_READY, Renderer
+from scale_bench import peak_rss
+from scheduler import Scheduler
+from smug import Slideshow
+#
+##############################################################################
+#
+# Global Variables
+#
+# Wakes the loop when a wait is over
+TIMER_EVENT = pygame.USEREVENT + 2
+
+# Metrics where a larger value is better; for the rest smaller is better
+HIGHER_IS_BETTER = ('instant_rate', 'cache_hit_rate')
+#
+##############################################################################
+#
+# percentile()
+#
+def percentile(values=None, pct=None):
+    '''
+    Nearest-rank percentile
+
+    Args:
+        values (list): Samples
+        pct (float): Percentile between 0 and 100
+
+    Returns:
+        float: The percentile or None if there are no samples
+    '''
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(-(-pct * len(ordered) // 100)))
+    return ordered[rank - 1]
+#
+##############################################################################
+#
+# start_stub()
+#
+def start_stub(args=None):
+    '''
+    Start bench/stub_server.py in its own process, so serving does not count against the
+        slideshow's CPU time
+
+    Returns:
+        tuple: (subprocess.Popen, gallery URL)
+    '''
+    command = [sys.executable, str(Path(__file__).resolve().parent / 'stub_server.py'),
+               '--images', str(args.images), '--latency', str(args.latency),
+               '--bandwidth', str(args.bandwidth)]
+    stub = subprocess.Popen(command, stdout=subprocess.PIPE)
+    gallery_url = stub.stdout.readline().decode('utf-8').strip()
+    if not gallery_url:
+        stub.kill()
+        raise RuntimeError("Stub server did not start")
+    return stub, gallery_url
+#
+##############################################################################
+#
+# wait_for()
+#
+def wait_for(scheduler=None, timeout=None, match=None):
+    '''
+    Run the event loop like slideshow.py main() until an event matches or the timeout passes
+
+    Args:
+        scheduler (Scheduler): Background tasks to run while idle
+        timeout (float): Seconds to wait at most
+        match (callable): match(event) is True for the event to wait for
+
+    Returns:
+        pygame.event.Event: The matching event or None on timeout
+    '''
+    # pylint: disable=no-member
+    pygame.time.set_timer(TIMER_EVENT, max(1, int(timeout * 1000)), 1)
+    try:
+        while 1:
+            for event in slideshow.next_events(scheduler):
+                if event.type == TIMER_EVENT:
+                    return None
+                if None not in [match] and match(event):
+                    return event
+    finally:
+        pygame.time.set_timer(TIMER_EVENT, 0)
+#
+##############################################################################
+#
+# run()
+#
+def run(args=None, gallery_url=None):
+    '''
+    Start a slideshow on the stub gallery, page through it and measure
+
+    Returns:
+        dict: Metrics
+    '''
+    # pylint: disable=no-member,too-many-locals
+    pygame.init()
+    pygame.display.set_mode(tuple(args.display))
+    surface = pygame.display.get_surface()
+    size = surface.get_size()
+
+    rand = random.Random(args.seed)
+    # Slideshow shuffles with the random module
+    random.seed(args.seed)
+
+    # time every stage of the hot path too
+    stage_metrics = configure_metrics(enabled=True)
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = usage.ru_utime + usage.ru_stime
+    start = time.perf_counter()
+
+    slide_show = Slideshow(gallery_url=gallery_url, width=size[0], height=size[1],
+                           cache_size=args.cache_size * 1024 * 1024, refresh_interval=0,
+                           prefetch_ahead=args.prefetch_ahead, prefetch_behind=args.prefetch_behind,
+                           time_budget=args.time_budget)
+    renderer = Renderer(slide_show=slide_show, size=size, quality=args.scale_quality,
+                        processes=args.render_processes, render_ahead=args.render_ahead,
+                        preview=args.preview)
+    scheduler = Scheduler()
+
+    first_pixel = None
+
+    def show():
+        '''
+        Show the current slide the way slideshow.py main() does
+
+        Returns:
+            tuple: (seconds until the full frame was on screen or None on timeout,
+                    whether it was already rendered)
+        '''
+        nonlocal first_pixel
+        began = time.perf_counter()
+        scheduler.hold(slideshow.IDLE_HOLD)
+        scheduler.call_later(0, slide_show.prefetch, name='prefetch')
+        picture = renderer.request()
+        instant = None not in [picture]
+        while None in [picture]:
+            event = wait_for(scheduler, args.timeout,
+                             lambda event: (event.type == FRAME_READY and
+                                            event.key == slide_show.current_key()))
+            if None in [event]:
+                return None, False
+            if not event.preview:
+                picture = event.frame
+                break
+            slideshow.draw_picture(surface=surface, picture=event.frame)
+            pygame.display.flip()
+            if None in [first_pixel]:
+                first_pixel = time.perf_counter() - start
+
+        slideshow.draw_picture(surface=surface, picture=picture)
+        pygame.display.flip()
+        if None in [first_pixel]:
+            first_pixel = time.perf_counter() - start
+        return time.perf_counter() - began, instant
+
+    first_image, _ = show()
+    first_image = None if None in [first_image] else time.perf_counter() - start
+
+    latencies = []
+    instant = 0
+    timeouts = 0
+    for _ in range(args.transitions):
+        wait_for(scheduler, args.dwell)
+        slide_show.move(-1 if rand.random() < args.back else 1)
+        latency, rendered = show()
+        if None in [latency]:
+            timeouts += 1
+            continue
+        latencies.append(latency * 1000)
+        instant += rendered
+
+    stats = slide_show.cache_stats()
+    self_peak = peak_rss()
+    renderer.close()
+    slide_show.close()
+    pygame.quit()
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    results = {
+        'time_to_first_pixel_s': first_pixel,
+        'time_to_first_image_s': first_image,
+        'transition_p50_ms': percentile(latencies, 50),
+        'transition_p95_ms': percentile(latencies, 95),
+        'transition_p99_ms': percentile(latencies, 99),
+        'transition_max_ms': max(latencies) if latencies else None,
+        'timeouts': timeouts,
+        'instant_rate': instant / len(latencies) if latencies else None,
+        'cache_hit_rate': stats.get('hit_rate'),
+        'peak_rss_mb': self_peak / 1024,
+        # render processes; the stub server is still running and not counted
+        'peak_rss_children_mb': children.ru_maxrss / 1024,
+        'cpu_s': usage.ru_utime + usage.ru_stime - cpu + children.ru_utime + children.ru_stime,
+        'wall_s': time.perf_counter() - start,
+    }
+    for name, (_, _, p95) in sorted(stage_metrics.stages().items()):
+        results['stage_{}_p95_ms'.format(name)] = p95 * 1000
+    return results
+#
+##############################################################################
+#
+# compare()
+#
+def compare(results=None, baseline=None, tolerance=None):
+    '''
+    Print every metric against a baseline run
+
+    Args:
+        results (dict): Metrics of this run
+        baseline (dict): Metrics of the run to compare with
+        tolerance (float): Percent a metric may get worse before it counts as a regression
+
+    Returns:
+        list: Names of the metrics that regressed
+    '''
+    regressions = []
+    print("{:<24} {:>12} {:>12} {:>9}".format('metric', 'baseline', 'this run', 'change'))
+    for name, value in results.items():
+        old = baseline.get(name)
+        if None in [old, value] or isinstance(value, bool):
+            continue
+        change = (value - old) / old * 100 if old else 0.0
+        worse = -change if name in HIGHER_IS_BETTER else change
+        flag = ''
+        if worse > tolerance and (abs(value - old) > 0.001):
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print("{:<24} {:>12.3f} {:>12.3f} {:>8.1f}%{}".format(name, old, value, change, flag))
+    return regressions
+#
+##############################################################################
+#
+# git_revision()
+#
+def git_revision():
+    '''
+    Returns:
+        str: Short hash of the checked out commit or None
+    '''
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                         cwd=str(ROOT_PATH), stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode('utf-8').strip()
+#
+##############################################################################
+#
+# handle_arguments()
+#
+def handle_arguments():
+    '''
+    Parse command line arguments
+
+    Returns:
+        argparse.Namespace: Representation of provided arguments
+    '''
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+
+    # the stub server
+    parser.add_argument('--images', type=int, default=50, help='Gallery size. Default: 50')
+    parser.add_argument('--latency', type=float, default=50,
+                        help='Milliseconds before every response. Default: 50')
+    parser.add_argument('--bandwidth', type=int, default=2048,
+                        help='Kilobytes per second per connection, 0 for unlimited. Default: 2048')
+
+    # the walk through the gallery
+    parser.add_argument('--transitions', type=int, default=100,
+                        help='Number of slide changes to time. Default: 100')
+    parser.add_argument('--dwell', type=float, default=0.5,
+                        help='Seconds each slide stays up. Default: 0.5')
+    parser.add_argument('--back', type=float, default=0.1,
+                        help='Probability that a slide change goes back. Default: 0.1')
+    parser.add_argument('--timeout', type=float, default=30,
+                        help='Seconds to wait for a slide before giving up. Default: 30')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed. Default: 1')
+
+    # the slideshow
+    parser.add_argument('--display', type=int, nargs=2, default=[1920, 1080],
+                        metavar=('WIDTH', 'HEIGHT'), help='Display size. Default: 1920 1080')
+    parser.add_argument('--cache-size', type=int, default=Slideshow.MAX_CACHE_SIZE // 1024 // 1024,
+                        help='Memory cache size in megabytes. Default: {}'.format(
+                            Slideshow.MAX_CACHE_SIZE // 1024 // 1024))
+    parser.add_argument('--prefetch-ahead', type=int, default=Slideshow.PREFETCH_AHEAD,
+                        help='Default: {}'.format(Slideshow.PREFETCH_AHEAD))
+    parser.add_argument('--prefetch-behind', type=int, default=Slideshow.PREFETCH_BEHIND,
+                        help='Default: {}'.format(Slideshow.PREFETCH_BEHIND))
+    parser.add_argument('--scale-quality', choices=sorted(slideshow.SCALE_QUALITIES),
+                        default=slideshow.SCALE_QUALITY,
+                        help='Default: {}'.format(slideshow.SCALE_QUALITY))
+    parser.add_argument('--render-processes', type=int, default=Renderer.PROCESSES,
+                        help='Default: {}'.format(Renderer.PROCESSES))
+    parser.add_argument('--render-ahead', type=int, default=Renderer.RENDER_AHEAD,
+                        help='Default: {}'.format(Renderer.RENDER_AHEAD))
+    parser.add_argument('--no-preview', dest='preview', action='store_false', default=True,
+                        help='Do not show previews while images download')
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help='Adaptive rendition time budget in seconds. Default: off')
+
+    # results
+    parser.add_argument('--output', default=None, help='Write the results to this JSON file')
+    parser.add_argument('--compare', default=None,
+                        help='JSON file of an earlier run to compare the results with')
+    parser.add_argument('--tolerance', type=float, default=10,
+                        help=('Percent a metric may get worse than in --compare before the run '
+                              'fails. Default: 10'))
+
+    return parser.parse_args()
+#
+##############################################################################
+#
+# main()
+#
+def main():
+    '''
+    Run the benchmark, print the metrics and optionally save and compare them
+    '''
+    args = handle_arguments()
+    logging.basicConfig(format='%(levelname)s:%(module)s.%(funcName)s:%(message)s',
+                        level=logging.WARNING)
+
+    stub, gallery_url = start_stub(args)
+    # downloads still in flight finish before atexit handlers run, so they do not fail and retry
+    atexit.register(stub.wait)
+    atexit.register(stub.terminate)
+    metrics = run(args, gallery_url)
+
+    results = {
+        'date': datetime.now().isoformat(),
+        'revision': git_revision(),
+        'config': vars(args),
+        'metrics': metrics,
+    }
+
+    for name, value in metrics.items():
+        print("{:<24} {}".format(name, 'n/a' if None in [value] else round(value, 3)))
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=4, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            baseline = json.load(baseline)
+        print()
+        if compare(metrics, baseline.get('metrics', {}), args.tolerance):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
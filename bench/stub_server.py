@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+'''
+Serve a synthetic SmugMug gallery locally: a gallery page, its hack/feed.mg RSS feed and generated
+JPEG renditions, with configurable latency and bandwidth
+'''
+#
+# Standard Imports
+#
+from __future__ import absolute_import, division, print_function, unicode_literals
+import argparse
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+import struct
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+#
+# Non-standard imports
+#
+from PIL import Image
+#
+# pylint: disable=wrong-import-position
+# local directory imports here
+#
+from scale_bench import make_jpeg
+#
+##############################################################################
+#
+# Global Variables
+#
+# (suffix, width, height) of the renditions every item has, smallest first like SmugMug's feeds
+RENDITIONS = [
+    ('Th', 150, 100),
+    ('S', 400, 267),
+    ('M', 600, 400),
+    ('L', 800, 533),
+    ('XL', 1024, 683),
+    ('X2', 1280, 853),
+    ('X3', 1600, 1067),
+    ('O', 3000, 2000),
+]
+
+GALLERY_PATH = '/Bench/Gallery'
+
+# EXIF every rendition carries: make, model, date taken, f-number, exposure, ISO, focal length
+EXIF = {0x010f: 'Stub', 0x0110: 'Bench Camera'}
+EXIF_IFD = {0x9003: '2024:05:01 12:34:56', 0x829d: 5.6, 0x829a: 1 / 250, 0x8827: 200,
+            0x920a: 35.0}
+#
+##############################################################################
+#
+# tag_jpeg()
+#
+def tag_jpeg(data=None, tag=None):
+    '''
+    Make a JPEG unique by adding a comment segment after the start of image marker. Every image
+        decodes the same way but has its own bytes, so content-addressed caches do not merge them.
+
+    Args:
+        data (bytes): JPEG data
+        tag (str): Comment text
+
+    Returns:
+        bytes: Tagged JPEG data
+    '''
+    comment = tag.encode('utf-8')
+    return data[:2] + b'\xff\xfe' + struct.pack('>H', len(comment) + 2) + comment + data[2:]
+#
+##############################################################################
+#
+# title_jpeg()
+#
+def title_jpeg(data=None, title=None):
+    '''
+    Give a JPEG an IPTC title in a Photoshop APP13 segment after the start of image marker
+
+    Args:
+        data (bytes): JPEG data
+        title (str): Title text
+
+    Returns:
+        bytes: JPEG data with the title
+    '''
+    title = title.encode('utf-8')
+    iptc = b'\x1c\x02\x05' + struct.pack('>H', len(title)) + title
+    resource = b'8BIM\x04\x04\0\0' + struct.pack('>I', len(iptc)) + iptc + b'\0' * (len(iptc) % 2)
+    payload = b'Photoshop 3.0\0' + resource
+    return data[:2] + b'\xff\xed' + struct.pack('>H', len(payload) + 2) + payload + data[2:]
+#
+##############################################################################
+#
+# StubGallery
+#
+class StubGallery(object):
+    '''
+    StubGallery - the content the stub server serves
+
+    Rendition JPEGs are generated once per size and tagged per image, so even large galleries
+    start in a few seconds.
+    '''
+    #
+    ####################################################################################
+    #
+    # __init__()
+    #
+    def __init__(self, images=50, renditions=None):
+        '''
+        Args:
+            images (int): Number of items in the feed
+            renditions (list): (suffix, width, height) of every rendition. Default: RENDITIONS
+        '''
+        super(StubGallery, self).__init__()
+
+        self.images = images
+        self.renditions = renditions if renditions else RENDITIONS
+        exif = Image.Exif()
+        exif.update(EXIF)
+        exif.get_ifd(0x8769).update(EXIF_IFD)
+        self._jpegs = {}
+        for suffix, width, height in self.renditions:
+            output = BytesIO()
+            make_jpeg(output, (width, height), exif)
+            self._jpegs[suffix] = output.getvalue()
+        self._lock = threading.Lock()
+        self._version = 1
+        self._modified = time.time()
+    #
+    ####################################################################################
+    #
+    # feed()
+    #
+    def feed(self, base_url=None):
+        '''
+        Args:
+            base_url (str): scheme://host:port the server is reached at
+
+        Returns:
+            bytes: RSS 2.0 feed with Media RSS renditions, like hack/feed.mg&format=rss200
+        '''
+        published = formatdate(self._modified, usegmt=True)
+        items = []
+        for index in range(self.images):
+            name = 'i-{:05d}'.format(index)
+            media = ''.join(
+                '<media:content url="{base}/photos/{name}/0/{suffix}/{name}-{suffix}.jpg" '
+                'fileSize="{size}" type="image/jpeg" medium="image" width="{width}" '
+                'height="{height}"/>'.format(base=base_url, name=name, suffix=suffix,
+                                             size=len(self._jpegs[suffix]), width=width,
+                                             height=height)
+                for suffix, width, height in self.renditions)
+            items.append(
+                '<item><title>{title}</title><link>{base}{gallery}/{name}</link>'
+                '<guid isPermaLink="false">{name}</guid><pubDate>{published}</pubDate>'
+                '<category>Bench</category>{media}</item>'.format(
+                    title=escape('Bench image {}'.format(index)), base=base_url,
+                    gallery=GALLERY_PATH, name=name, published=published, media=media))
+
+        return ('<?xml version="1.0" encoding="utf-8"?>'
+                '<rss version="2.0" xmlns:media="http://search.yahoo.com/mrss/">'
+                '<channel><title>Bench Gallery</title><link>{base}{gallery}</link>'
+                '<description>Synthetic gallery</description>{items}</channel></rss>'.format(
+                    base=base_url, gallery=GALLERY_PATH, items=''.join(items))).encode('utf-8')
+    #
+    ####################################################################################
+    #
+    # image()
+    #
+    def image(self, name=None):
+        '''
+        Args:
+            name (str): File name, e.g. i-00001-L.jpg
+
+        Returns:
+            bytes: JPEG data or None if there is no such image
+        '''
+        try:
+            _, index, suffix = name[:-len('.jpg')].split('-')
+            index = int(index)
+        except ValueError:
+            return None
+        if suffix not in self._jpegs or not 0 <= index < self.images:
+            return None
+        return title_jpeg(tag_jpeg(self._jpegs[suffix], name),
+                          'Bench image {:05d}'.format(index))
+    #
+    ####################################################################################
+    #
+    # touch()
+    #
+    def touch(self):
+        '''Change the feed, e.g. to exercise refreshes'''
+        with self._lock:
+            self._version += 1
+            self._modified = time.time()
+    #
+    ##############################################################################
+    ##############################################################################
+    #
+    @property
+    def etag(self):
+        '''str: ETag of the current feed'''
+        return '"v{}"'.format(self._version)
+#
+##############################################################################
+#
+# byte_range()
+#
+def byte_range(header=None, length=0):
+    '''
+    Args:
+        header (str): Range request header, e.g. bytes=0-65535
+        length (int): Size of the whole body
+
+    Returns:
+        tuple: First and last byte to send, or None for the whole body
+    '''
+    if not header or not header.startswith('bytes=') or ',' in header or not length:
+        return None
+    first, _, last = header[len('bytes='):].partition('-')
+    try:
+        if not first:
+            # the last N bytes
+            return max(0, length - int(last)), length - 1
+        return int(first), min(length - 1, int(last) if last else length - 1)
+    except ValueError:
+        return None
+#
+##############################################################################
+#
+# StubHandler
+#
+class StubHandler(BaseHTTPRequestHandler):
+    '''StubHandler - answer gallery page, feed and image requests'''
+
+    protocol_version = 'HTTP/1.1'
+    #
+    ####################################################################################
+    #
+    # log_message()
+    #
+    def log_message(self, *args): # pylint: disable=arguments-differ
+        pass
+    #
+    ####################################################################################
+    #
+    # _send()
+    #
+    def _send(self, status=200, body=b'', content_type='text/plain', headers=None):
+        '''Send a response after the latency, throttled to the bandwidth'''
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers if headers else {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        if not server.bandwidth:
+            self.wfile.write(body)
+            return
+
+        # send in 20 slices a second
+        chunk = max(1, server.bandwidth // 20)
+        start = time.monotonic()
+        for offset in range(0, len(body), chunk):
+            self.wfile.write(body[offset:offset + chunk])
+            ahead = (offset + chunk) / server.bandwidth - (time.monotonic() - start)
+            if ahead > 0:
+                time.sleep(ahead)
+    #
+    ####################################################################################
+    #
+    # do_GET()
+    #
+    def do_GET(self): # pylint: disable=invalid-name
+        '''Route a request'''
+        url = urlparse(self.path)
+        gallery = self.server.gallery
+        base_url = 'http://{}:{}'.format(*self.server.server_address[:2])
+
+        if url.path.startswith(GALLERY_PATH):
+            page = ('<html><head>\n'
+                    '<link rel="alternate" type="application/rss+xml" title="Bench" '
+                    'href="/hack/feed.mg?Type=gallery&amp;Data=1_Bench&amp;format=rss200">\n'
+                    '</head><body></body></html>')
+            self._send(body=page.encode('utf-8'), content_type='text/html')
+
+        elif url.path == '/hack/feed.mg':
+            # the feed link in the gallery page keeps its &amp;
+            query = parse_qs(url.query.replace('&amp;', '&'))
+            if query.get('Type', [''])[0] not in ['gallery', 'nickname']:
+                self._send(status=400, body=b'unknown feed type')
+            elif self.headers.get('If-None-Match') == gallery.etag:
+                self._send(status=304, headers={'ETag': gallery.etag})
+            else:
+                self._send(body=gallery.feed(base_url), content_type='application/rss+xml',
+                           headers={'ETag': gallery.etag})
+
+        elif url.path.startswith('/photos/'):
+            data = gallery.image(url.path.rsplit('/', 1)[-1])
+            span = byte_range(self.headers.get('Range'), len(data) if data else 0)
+            if None in [data]:
+                self._send(status=404, body=b'no such image')
+            elif None not in [span]:
+                self._send(status=206, body=data[span[0]:span[1] + 1], content_type='image/jpeg',
+                           headers={'Content-Range': 'bytes {}-{}/{}'.format(span[0], span[1],
+                                                                             len(data))})
+            else:
+                self._send(body=data, content_type='image/jpeg',
+                           headers={'Accept-Ranges': 'bytes'})
+
+        else:
+            self._send(status=404, body=b'not found')
+#
+##############################################################################
+#
+# StubServer
+#
+class StubServer(ThreadingHTTPServer):
+    '''StubServer - threaded HTTP server for a StubGallery'''
+
+    daemon_threads = True
+    #
+    ####################################################################################
+    #
+    # __init__()
+    #
+    def __init__(self, gallery=None, port=0, latency=0, bandwidth=0):
+        '''
+        Args:
+            gallery (StubGallery): What to serve
+            port (int): Port on 127.0.0.1. 0 picks a free one.
+            latency (float): Seconds before every response
+            bandwidth (int): Bytes per second per connection. 0 is unlimited.
+        '''
+        ThreadingHTTPServer.__init__(self, ('127.0.0.1', port), StubHandler)
+        self.gallery = gallery
+        self.latency = latency
+        self.bandwidth = bandwidth
+    #
+    ##############################################################################
+    ##############################################################################
+    #
+    @property
+    def gallery_url(self):
+        '''str: URL of the gallery page to give slideshow.py -u'''
+        return 'http://{}:{}{}'.format(self.server_address[0], self.server_address[1],
+                                       GALLERY_PATH)
+#
+##############################################################################
+#
+# handle_arguments()
+#
+def handle_arguments():
+    '''
+    Parse command line arguments
+
+    Returns:
+        argparse.Namespace: Representation of provided arguments
+    '''
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+
+    parser.add_argument('--port', type=int, default=0, help='Port. Default: any free port')
+    parser.add_argument('--images', type=int, default=50, help='Gallery size. Default: 50')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='Milliseconds before every response. Default: 0')
+    parser.add_argument('--bandwidth', type=int, default=0,
+                        help='Kilobytes per second per connection. Default: unlimited')
+
+    return parser.parse_args()
+#
+##############################################################################
+#
+# main()
+#
+def main():
+    '''
+    Serve until interrupted. The first line printed is the gallery URL.
+    '''
+    args = handle_arguments()
+
+    server = StubServer(gallery=StubGallery(images=args.images), port=args.port,
+                        latency=args.latency / 1000, bandwidth=args.bandwidth * 1024)
+    print(server.gallery_url)
+    sys.stdout.flush()
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+#
+'''
+Adaptive Rendition Selection Classes
+'''
+#
+# Standard Imports
+#
+from __future__ import division, print_function
+import json
+import logging
+import os
+import threading
+#
+##############################################################################
+#
+# CostModel
+#
+class CostModel(object):
+    '''
+    CostModel - learn how long this device takes to fetch and decode an image
+
+    Every download updates the request latency, the transfer throughput and the compressed size
+    per pixel, and every decode updates the decode cost per megapixel. Each is an exponentially
+    weighted moving average, so the model follows a link that becomes congested or recovers. The
+    first observation of each replaces its starting guess.
+
+    choose() picks the largest rendition, up to the one that best fits the display, whose
+    estimated fetch, decode and scale time fits a budget. Renditions that are already on hand only
+    cost their decode.
+    '''
+    #
+    ####################################################################################
+    #
+    # Class variables
+    #
+    # Weight of the newest observation
+    ALPHA = 0.3
+
+    # Starting guesses, until there is something to learn from
+    LATENCY = 0.2
+    THROUGHPUT = 2 * 1024 * 1024
+    BYTES_PER_PIXEL = 0.3
+    DECODE_PER_MEGAPIXEL = 0.05
+
+    # Downloads shorter than this say more about latency than throughput
+    MIN_TRANSFER = 0.02
+
+    FIELDS = ('latency', 'throughput', 'bytes_per_pixel', 'decode_per_megapixel')
+    #
+    ####################################################################################
+    #
+    # __init__()
+    #
+    def __init__(self, alpha=ALPHA):
+        '''
+        Args:
+            alpha (float): Weight of the newest observation, between 0 and 1
+        '''
+        super(CostModel, self).__init__()
+
+        self._logger = logging.getLogger(type(self).__name__)
+
+        self._alpha = alpha
+        self._lock = threading.Lock()
+        self._values = {
+            'latency': self.LATENCY,
+            'throughput': self.THROUGHPUT,
+            'bytes_per_pixel': self.BYTES_PER_PIXEL,
+            'decode_per_megapixel': self.DECODE_PER_MEGAPIXEL,
+        }
+        # fields still holding their starting guess
+        self._guessed = set(self.FIELDS)
+    #
+    ####################################################################################
+    #
+    # _update()
+    #
+    def _update(self, field=None, value=None):
+        with self._lock:
+            if field in self._guessed:
+                self._guessed.discard(field)
+                self._values[field] = value
+            else:
+                self._values[field] += self._alpha * (value - self._values[field])
+    #
+    ####################################################################################
+    #
+    # observe_fetch()
+    #
+    def observe_fetch(self, size=None, latency=None, seconds=None, pixels=None):
+        '''
+        Learn from a download
+
+        Args:
+            size (int): Bytes downloaded
+            latency (float): Seconds until the response headers arrived
+            seconds (float): Seconds the whole download took
+            pixels (int): Pixels in the image, if known
+        '''
+        if None in [size, latency, seconds]:
+            return
+
+        self._update('latency', latency)
+        transfer = seconds - latency
+        if transfer >= self.MIN_TRANSFER and size > 0:
+            self._update('throughput', size / transfer)
+        if pixels:
+            self._update('bytes_per_pixel', size / pixels)
+    #
+    ####################################################################################
+    #
+    # observe_decode()
+    #
+    def observe_decode(self, pixels=None, seconds=None):
+        '''
+        Learn from a decode and scale
+
+        Args:
+            pixels (int): Pixels in the decoded image
+            seconds (float): Seconds it took
+        '''
+        if pixels and None not in [seconds]:
+            self._update('decode_per_megapixel', seconds / (pixels / 1000000))
+    #
+    ####################################################################################
+    #
+    # estimate()
+    #
+    def estimate(self, pixels=None, on_hand=False):
+        '''
+        Estimate how long an image takes to show
+
+        Args:
+            pixels (int): Pixels in the image
+            on_hand (bool): The image is already cached and only needs decoding
+
+        Returns:
+            float: Seconds to fetch (unless on hand), decode and scale it
+        '''
+        with self._lock:
+            values = dict(self._values)
+
+        seconds = pixels / 1000000 * values['decode_per_megapixel']
+        if not on_hand:
+            seconds += values['latency']
+            seconds += pixels * values['bytes_per_pixel'] / values['throughput']
+        return seconds
+    #
+    ####################################################################################
+    #
+    # choose()
+    #
+    # pylint: disable=too-many-arguments
+    def choose(self, widths=None, heights=None, ceiling=None, budget=None, on_hand=None):
+        '''
+        Choose the largest rendition that can be shown within a budget
+
+        Args:
+            widths (array): Rendition widths
+            heights (array): Rendition heights
+            ceiling (int): Index of the largest rendition worth showing
+            budget (float): Seconds to fetch, decode and scale it
+            on_hand (callable): on_hand(index) is True if a rendition is already cached
+
+        Returns:
+            int: Index of the chosen rendition. The smallest one if none fit.
+        '''
+        if ceiling < 0 or None in [budget]:
+            return ceiling
+
+        limit = widths[ceiling] * heights[ceiling]
+        candidates = sorted((index for index in range(len(widths))
+                             if widths[index] * heights[index] <= limit),
+                            key=lambda index: widths[index] * heights[index], reverse=True)
+
+        for index in candidates:
+            cached = bool(on_hand and on_hand(index))
+            if self.estimate(widths[index] * heights[index], cached) <= budget:
+                return index
+        return candidates[-1]
+    #
+    ####################################################################################
+    #
+    # stats()
+    #
+    def stats(self):
+        '''
+        Returns:
+            dict: What the model has learned so far
+        '''
+        with self._lock:
+            return dict(self._values)
+    #
+    ####################################################################################
+    #
+    # load()
+    #
+    def load(self, path=None):
+        '''
+        Start from what an earlier run learned on this device
+
+        Args:
+            path (str): JSON file written by save()
+        '''
+        try:
+            with open(path) as model_file:
+                values = json.load(model_file)
+        except (OSError, ValueError) as err:
+            self._logger.info("No saved cost model loaded: '%s'", err)
+            return
+
+        with self._lock:
+            for field in self.FIELDS:
+                if isinstance(values.get(field), (int, float)) and values[field] > 0:
+                    self._values[field] = values[field]
+                    self._guessed.discard(field)
+    #
+    ####################################################################################
+    #
+    # save()
+    #
+    def save(self, path=None):
+        '''
+        Keep what has been learned for the next run
+
+        Args:
+            path (str): JSON file to write
+        '''
+        tmp_path = '{}.tmp'.format(path)
+        try:
+            with open(tmp_path, 'w') as model_file:
+                json.dump(self.stats(), model_file)
+            os.replace(tmp_path, path)
+        except OSError as err:
+            self._logger.warning("Saving cost model failed: '%s'", err)
@@ -0,0 +1,741 @@
+# -*- coding: utf-8 -*-
+#
+'''
+Cache Classes
+'''
+#
+# Standard Imports
+#
+from __future__ import print_function
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+#
+##############################################################################
+#
+# available_memory()
+#
+def available_memory():
+    '''
+    Find how much memory the system can give us without swapping
+
+    Returns:
+        int: Available memory (in bytes) or None if it cannot be determined
+    '''
+    # pylint: disable=broad-except
+    try:
+        with open('/proc/meminfo') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except Exception:
+        pass
+
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except Exception:
+        return None
+#
+##############################################################################
+#
+# LruCache
+#
+class LruCache(object):
+    '''
+    LruCache - in-memory cache with a byte budget and least recently used eviction
+
+    Entries are kept in an OrderedDict so lookups, recency updates and evictions are all O(1).
+    Sizes are the real payload lengths, not the size of the Python objects holding them.
+    '''
+    #
+    ####################################################################################
+    #
+    # Class variables
+    #
+    # stats() that only ever grow
+    COUNTERS = ('hits', 'misses', 'evictions')
+    #
+    ####################################################################################
+    #
+    # __init__()
+    #
+    def __init__(self, max_size=None, on_evict=None):
+        '''
+        Args:
+            max_size (int): Maximum size of cached content (in bytes)
+            on_evict (callable): Called with the data of every entry evicted or replaced, e.g.
+                to release what it holds. Runs with the cache locked.
+        '''
+        super(LruCache, self).__init__()
+
+        if None in [max_size]:
+            raise RuntimeError("Need max_size to proceed!")
+
+        self._logger = logging.getLogger(type(self).__name__)
+
+        self._max_size = max_size
+        self._on_evict = on_evict
+
+        self._lock = threading.RLock()
+        # key -> (data, size), least recently used first
+        self._entries = OrderedDict()
+        self._size = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+    #
+    ####################################################################################
+    #
+    # _victim()
+    #
+    def _victim(self, keep=None):
+        '''Choose the key to evict next, never keep'''
+        for key in self._entries:
+            if key != keep:
+                return key
+        return None
+    #
+    ####################################################################################
+    #
+    # _evict()
+    #
+    def _evict(self, keep=None):
+        while len(self._entries) > 1 and self._size > self._max_size:
+            # never throw out what was just added
+            key = self._victim(keep)
+            self._logger.info("Clearing '%s' from cache", key)
+            self._drop(key)
+            self._evictions += 1
+    #
+    ####################################################################################
+    #
+    # _drop()
+    #
+    def _drop(self, key, replacement=None):
+        data, size = self._entries.pop(key)
+        self._size -= size
+        # putting the same data again does not release it
+        if None not in [self._on_evict] and data is not replacement:
+            self._on_evict(data)
+    #
+    ####################################################################################
+    #
+    # get()
+    #
+    def get(self, key=None):
+        '''
+        Look up an entry, counting the hit or miss
+
+        Args:
+            key (hashable): Cache key
+
+        Returns:
+            object: Cached data or None
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if None in [entry]:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+    #
+    ####################################################################################
+    #
+    # peek()
+    #
+    def peek(self, key=None):
+        '''
+        Look up an entry without touching its recency or the counters
+
+        Args:
+            key (hashable): Cache key
+
+        Returns:
+            object: Cached data or None
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if None in [entry] else entry[0]
+    #
+    ####################################################################################
+    #
+    # put()
+    #
+    def put(self, key=None, data=None, size=None):
+        '''
+        Add an entry, evicting others until the cache fits its budget
+
+        Args:
+            key (hashable): Cache key
+            data (object): Data to cache
+            size (int): Size of data (in bytes). Default: len(data)
+        '''
+        if None in [key, data]:
+            return
+
+        size = len(data) if None in [size] else size
+        with self._lock:
+            if key in self._entries:
+                self._drop(key, replacement=data)
+            self._entries[key] = (data, size)
+            self._size += size
+            self._evict(keep=key)
+            self._logger.debug("Cache is %fMb", self._size / 1024 / 1024)
+    #
+    ####################################################################################
+    #
+    # set_playlist()
+    #
+    def set_playlist(self, keys=None):
+        '''
+        Hint the order keys will be used in. Ignored by LRU.
+
+        Args:
+            keys (list): Cache key for every playlist position
+        '''
+        pass
+    #
+    ####################################################################################
+    #
+    # set_position()
+    #
+    def set_position(self, pos=None, direction=1):
+        '''
+        Hint the current playlist position. Ignored by LRU.
+
+        Args:
+            pos (int): Current playlist position
+            direction (int): 1 when moving forward, -1 when moving back
+        '''
+        pass
+    #
+    ####################################################################################
+    #
+    # alias()
+    #
+    def alias(self, key=None, playlist_key=None):
+        '''
+        Hint that key is another rendition of the image the playlist knows as playlist_key.
+            Ignored by LRU.
+
+        Args:
+            key (str): Cache key
+            playlist_key (str): Key the image has in the playlist
+        '''
+        pass
+    #
+    ####################################################################################
+    #
+    # stats()
+    #
+    def stats(self):
+        '''
+        Returns:
+            dict: Entry count, size and hit/miss/eviction counters
+        '''
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'size': self._size,
+                'max_size': self._max_size,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hit_rate': (self._hits / lookups) if lookups else 0.0,
+            }
+    #
+    ####################################################################################
+    #
+    # __contains__()
+    #
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+    #
+    ##############################################################################
+    ##############################################################################
+    #
+    @property
+    def max_size(self):
+        '''int: maximum size of cached content (in bytes)'''
+        return self._max_size
+
+    @property
+    def size(self):
+        '''int: bytes of content currently cached'''
+        return self._size
+#
+##############################################################################
+#
+# PlaylistCache
+#
+class PlaylistCache(LruCache):
+    '''
+    PlaylistCache - evict the entry whose next use is furthest away (Belady's MIN)
+
+    The slideshow knows its playback order up front, so instead of guessing from recency this
+    looks each cached key up in the playlist and estimates how many transitions away its next
+    use is. Entries ahead of the current position are needed after that many forward steps.
+    Entries behind it are only needed if the user goes back, so their distance is scaled by how
+    many forward moves have been seen for every move back; while the user is stepping back the
+    scale drops to one and the entries behind are treated like the ones ahead. Keys that are not
+    in the playlist at all go first, then ties fall back to least recently used. Tuple keys are
+    looked up by their first member, so scaled frames follow the image they were made from.
+    '''
+    #
+    ####################################################################################
+    #
+    # __init__()
+    #
+    def __init__(self, max_size=None):
+        '''
+        Args:
+            max_size (int): Maximum size of cached content (in bytes)
+        '''
+        super(PlaylistCache, self).__init__(max_size=max_size)
+
+        self._direction = 1
+        self._forward = 0
+        self._backward = 0
+        self._length = 0
+        self._pos = 0
+        # key -> playlist positions it appears at
+        self._positions = {}
+        # other renditions -> the key they appear as in the playlist
+        self._aliases = {}
+    #
+    ####################################################################################
+    #
+    # _distance()
+    #
+    def _distance(self, key):
+        # display-ready frames are keyed by (image key, size, quality)
+        if isinstance(key, tuple):
+            key = key[0]
+        positions = self._positions.get(self._aliases.get(key, key))
+        if not positions:
+            return float('inf')
+
+        # how many forward transitions to expect for each step back
+        back_cost = 1.0
+        if self._direction > 0:
+            back_cost = (self._forward + 1) / (self._backward + 1)
+
+        closest = float('inf')
+        for pos in positions:
+            ahead = (pos - self._pos) % self._length
+            behind = (self._pos - pos) % self._length
+            closest = min(closest, ahead, behind * back_cost)
+        return closest
+    #
+    ####################################################################################
+    #
+    # _victim()
+    #
+    def _victim(self, keep=None):
+        '''Choose the key to evict next, never keep'''
+        victim = None
+        furthest = -1
+        # iterate least recently used first so ties keep LRU behaviour
+        for key in self._entries:
+            if key == keep:
+                continue
+            distance = self._distance(key)
+            if distance > furthest:
+                victim, furthest = key, distance
+                if distance == float('inf'):
+                    break
+        return victim
+    #
+    ####################################################################################
+    #
+    # set_playlist()
+    #
+    def set_playlist(self, keys=None):
+        '''
+        Set the order keys will be used in
+
+        Args:
+            keys (list): Cache key for every playlist position
+        '''
+        keys = keys if keys else []
+        positions = {}
+        for pos, key in enumerate(keys):
+            if None not in [key]:
+                positions.setdefault(key, []).append(pos)
+
+        with self._lock:
+            self._positions = positions
+            # forget aliases of images that have left the cache
+            self._aliases = dict((alias, key) for alias, key in self._aliases.items()
+                                 if alias in self._entries)
+            self._length = len(keys)
+            self._pos = min(self._pos, max(0, self._length - 1))
+    #
+    ####################################################################################
+    #
+    # set_position()
+    #
+    def set_position(self, pos=None, direction=1):
+        '''
+        Set the current playlist position
+
+        Args:
+            pos (int): Current playlist position
+            direction (int): 1 when moving forward, -1 when moving back
+        '''
+        with self._lock:
+            self._pos = pos
+            self._direction = -1 if direction < 0 else 1
+            if direction < 0:
+                self._backward += 1
+            else:
+                self._forward += 1
+    #
+    ####################################################################################
+    #
+    # alias()
+    #
+    def alias(self, key=None, playlist_key=None):
+        '''
+        Treat key as another rendition of the image the playlist knows as playlist_key
+
+        Args:
+            key (str): Cache key
+            playlist_key (str): Key the image has in the playlist
+        '''
+        if None in [key, playlist_key] or key == playlist_key:
+            return
+        with self._lock:
+            self._aliases[key] = playlist_key
+#
+##############################################################################
+#
+# DiskCache
+#
+class DiskCache(object):
+    '''
+    DiskCache - persistent, content-addressed image cache
+
+    Objects are stored under objects/<digest[:2]>/<digest> where digest is the SHA-256 of the
+    content, and an index maps cache keys to digests in least to most recently used order. Every
+    write goes through a temporary file and os.replace() so a crash never leaves a partial object
+    behind, and every read is hashed again so a corrupt object is dropped instead of displayed.
+
+    The index is only rewritten by flush(). Each put in between is appended to a journal once its
+    object is on disk, and the journal is replayed on load, so a crash loses nothing it stored.
+    '''
+    #
+    ####################################################################################
+    #
+    # Class variables
+    #
+    INDEX_FILE = 'index.json'
+    JOURNAL_FILE = 'journal.jsonl'
+    OBJECTS_DIR = 'objects'
+    #
+    ####################################################################################
+    #
+    # __init__()
+    #
+    def __init__(self, path=None, max_size=None):
+        '''
+        Args:
+            path (str): Directory to keep the cache in. Created if needed.
+            max_size (int): Maximum size of cached content (in bytes)
+        '''
+        super(DiskCache, self).__init__()
+
+        if None in [path, max_size]:
+            raise RuntimeError("Need path and max_size to proceed!")
+
+        self._logger = logging.getLogger(type(self).__name__)
+
+        self._path = os.path.abspath(os.path.expanduser(path))
+        self._max_size = max_size
+
+        self._lock = threading.RLock()
+        # held while the journal is appended to, or replaced by a new index
+        self._journal_lock = threading.Lock()
+        self._dirty = False
+        # key -> [digest, size], least recently used first
+        self._index = OrderedDict()
+        # digest -> number of keys sharing the object
+        self._refs = {}
+        self._size = 0
+
+        os.makedirs(os.path.join(self._path, self.OBJECTS_DIR), exist_ok=True)
+        self._load_index()
+    #
+    ####################################################################################
+    #
+    # _object_path()
+    #
+    def _object_path(self, digest):
+        return os.path.join(self._path, self.OBJECTS_DIR, digest[:2], digest)
+    #
+    ####################################################################################
+    #
+    # _atomic_write()
+    #
+    @staticmethod
+    def _atomic_write(path, data):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        handle, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(handle, 'wb') as tmp_file:
+                tmp_file.write(data)
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+    #
+    ####################################################################################
+    #
+    # _load_index()
+    #
+    def _load_index(self):
+        index = []
+        # pylint: disable=broad-except
+        try:
+            with open(os.path.join(self._path, self.INDEX_FILE)) as index_file:
+                index = json.load(index_file)
+        except FileNotFoundError:
+            pass
+        except Exception as err:
+            self._logger.warning("Ignoring unreadable cache index: '%s'", err)
+
+        for key, digest, size in index:
+            if not os.path.isfile(self._object_path(digest)):
+                continue
+            self._add_ref(key, digest, size)
+
+        # puts since the index was last written
+        replayed = 0
+        try:
+            with open(os.path.join(self._path, self.JOURNAL_FILE)) as journal_file:
+                for line in journal_file:
+                    try:
+                        key, digest, size = json.loads(line)
+                    except ValueError:
+                        # the last line may be cut short by a crash
+                        continue
+                    if not os.path.isfile(self._object_path(digest)):
+                        continue
+                    if key in self._index:
+                        # a later line may share the object; the sweep below drops it if not
+                        self._remove(key, unlink=False)
+                    self._add_ref(key, digest, size)
+                    replayed += 1
+        except OSError:
+            pass
+        self._dirty = replayed > 0
+
+        # drop objects the index does not know about, including stale temp files
+        known = set(self._refs)
+        objects_dir = os.path.join(self._path, self.OBJECTS_DIR)
+        for root, _, files in os.walk(objects_dir):
+            for name in files:
+                if name not in known:
+                    self._logger.debug("Removing orphaned cache object '%s'", name)
+                    os.unlink(os.path.join(root, name))
+
+        self._logger.info("Loaded %d cached images (%fMb) from '%s'", len(self._index),
+                          self._size / 1024 / 1024, self._path)
+        self._evict()
+    #
+    ####################################################################################
+    #
+    # _add_ref()
+    #
+    def _add_ref(self, key, digest, size):
+        self._index[key] = [digest, size]
+        self._index.move_to_end(key)
+        if digest not in self._refs:
+            self._refs[digest] = 0
+            self._size += size
+        self._refs[digest] += 1
+    #
+    ####################################################################################
+    #
+    # _remove()
+    #
+    def _remove(self, key, unlink=True):
+        digest, size = self._index.pop(key)
+        self._refs[digest] -= 1
+        if self._refs[digest] <= 0:
+            del self._refs[digest]
+            self._size -= size
+            if not unlink:
+                return
+            try:
+                os.unlink(self._object_path(digest))
+            except OSError:
+                pass
+        self._dirty = True
+    #
+    ####################################################################################
+    #
+    # _evict()
+    #
+    def _evict(self):
+        while self._index and self._size > self._max_size:
+            key = next(iter(self._index))
+            self._logger.info("Evicting '%s' from disk cache", key)
+            self._remove(key)
+    #
+    ####################################################################################
+    #
+    # get()
+    #
+    def get(self, key=None):
+        '''
+        Read an image from the cache
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            bytes: Cached content or None
+        '''
+        with self._lock:
+            entry = self._index.get(key)
+            if None in [entry]:
+                return None
+            digest = entry[0]
+
+        # read and hash without the lock so other lookups and puts do not wait on the disk
+        data = None
+        try:
+            with open(self._object_path(digest), 'rb') as object_file:
+                data = object_file.read()
+        except OSError as err:
+            self._logger.warning("Could not read cached '%s': '%s'", key, err)
+        else:
+            if hashlib.sha256(data).hexdigest() != digest:
+                self._logger.warning("Cached '%s' failed integrity check. Dropping...", key)
+                data = None
+
+        with self._lock:
+            # the key may have been evicted or replaced meanwhile
+            current = self._index.get(key)
+            if None in [current] or current[0] != digest:
+                return data
+            if None in [data]:
+                self._remove(key)
+                return None
+            self._index.move_to_end(key)
+            self._dirty = True
+        return data
+    #
+    ####################################################################################
+    #
+    # put()
+    #
+    def put(self, key=None, data=None):
+        '''
+        Write an image to the cache
+
+        Args:
+            key (str): Cache key
+            data (bytes): Content to cache
+        '''
+        if None in [key, data] or len(data) > self._max_size:
+            return
+
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            entry = self._index.get(key)
+            if None not in [entry] and entry[0] == digest:
+                self._index.move_to_end(key)
+                return
+            stored = digest in self._refs
+
+        # write without the lock so lookups and other puts do not wait on the disk
+        if not stored:
+            self._atomic_write(self._object_path(digest), data)
+
+        with self._lock:
+            entry = self._index.get(key)
+            if None not in [entry] and entry[0] == digest:
+                self._index.move_to_end(key)
+                return
+            if None not in [entry]:
+                self._remove(key)
+            # the last key sharing the object may have been evicted meanwhile
+            if digest not in self._refs and not os.path.isfile(self._object_path(digest)):
+                self._atomic_write(self._object_path(digest), data)
+            self._add_ref(key, digest, len(data))
+            self._dirty = True
+            self._evict()
+
+        with self._journal_lock:
+            with open(os.path.join(self._path, self.JOURNAL_FILE), 'a') as journal_file:
+                journal_file.write(json.dumps([key, digest, len(data)]) + '\n')
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+    #
+    ####################################################################################
+    #
+    # flush()
+    #
+    def flush(self):
+        '''Write the index to disk if it has changed, and start a new journal'''
+        with self._journal_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                index = [[key, digest, size] for key, (digest, size) in self._index.items()]
+                self._dirty = False
+
+            # puts after the snapshot wait for the journal lock, so they land in the new journal
+            try:
+                self._atomic_write(os.path.join(self._path, self.INDEX_FILE),
+                                   json.dumps(index).encode('utf-8'))
+            except OSError:
+                with self._lock:
+                    self._dirty = True
+                raise
+            try:
+                os.unlink(os.path.join(self._path, self.JOURNAL_FILE))
+            except FileNotFoundError:
+                pass
+    #
+    ####################################################################################
+    #
+    # __contains__()
+    #
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._index
+    #
+    ##############################################################################
+    ##############################################################################
+    #
+    @property
+    def path(self):
+        '''str: directory holding the cache'''
+        return self._path
+
+    @property
+    def size(self):
+        '''int: bytes of content currently cached'''
+        return self._size
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+#
+'''
+Frame Pack Classes
+
+A frame pack is one file of display-ready frames, scaled ahead of time for one display size and
+stored raw in the display's pixel format:
+
+    header  magic, display width and height, offset and length of the index
+    frames  one per image, each starting on a page boundary
+    index   JSON: display size, pixel format, scaling quality and key -> (offset, width, height)
+
+Playback memory-maps the file and wraps each frame in a pygame surface without decoding or
+copying it. The OS page cache decides which frames stay in memory.
+'''
+#
+# Standard Imports
+#
+from __future__ import division, print_function
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+#
+# Non-standard imports
+#
+import pygame
+#
+##############################################################################
+#
+# Global Variables
+#
+MAGIC = b'SMUGPAK1'
+
+# magic, display width, display height, index offset, index length
+HEADER = struct.Struct('<8sIIQQ')
+
+# Frames start on a page boundary, so each maps and pages in on its own
+ALIGN = mmap.PAGESIZE
+
+# pygame.image.frombuffer() format -> bytes per pixel, the formats imaging.scale_pixels() makes
+PIXEL_FORMATS = {
+    'RGB': 3,
+    'BGR': 3,
+    'RGBX': 4,
+    'BGRA': 4,
+}
+
+# 32-bit XRGB, what most displays and framebuffers use
+PIXEL_FORMAT = 'BGRA'
+#
+##############################################################################
+#
+# display_format()
+#
+def display_format(surface=None):
+    '''
+    Find the frame pack pixel format a surface blits from without converting
+
+    Args:
+        surface (pygame.Surface): The display surface
+
+    Returns:
+        str: One of PIXEL_FORMATS or None if none matches
+    '''
+    if sys.byteorder != 'little':
+        return None
+    masks = tuple(surface.get_masks()[:3])
+    return {
+        (4, (0xff0000, 0xff00, 0xff)): 'BGRA',
+        (4, (0xff, 0xff00, 0xff0000)): 'RGBX',
+        (3, (0xff0000, 0xff00, 0xff)): 'BGR',
+        (3, (0xff, 0xff00, 0xff0000)): 'RGB',
+    }.get((surface.get_bytesize(), masks))
+#
+##############################################################################
+#
+# FramePackWriter
+#
+class FramePackWriter(object):
+    '''
+    FramePackWriter - write frames into a new pack
+
+    The pack is written next to its final path and only replaces it in close(), so a reader never
+    maps half a pack.
+    '''
+    #
+    ####################################################################################
+    #
+    # __init__()
+    #
+    def __init__(self, path=None, size=None, pixel_format=PIXEL_FORMAT, quality=None):
+        '''
+        Args:
+            path (str): Pack file to write
+            size (tuple): Width and height of the display the frames are for
+            pixel_format (str): One of PIXEL_FORMATS
+            quality (str): Scaling quality the frames were made with, for the record
+        '''
+        super(FramePackWriter, self).__init__()
+
+        if None in [path, size]:
+            raise RuntimeError("Need a path and size to proceed!")
+        if pixel_format not in PIXEL_FORMATS:
+            raise RuntimeError("Unknown pixel format '{}'".format(pixel_format))
+
+        self._logger = logging.getLogger(type(self).__name__)
+
+        self._path = path
+        self._tmp_path = '{}.tmp'.format(path)
+        self._size = tuple(size)
+        self._pixel_format = pixel_format
+        self._quality = quality
+        self._frames = {}
+
+        self._file = open(self._tmp_path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, self._size[0], self._size[1], 0, 0))
+    #
+    ####################################################################################
+    #
+    # add()
+    #
+    def add(self, key=None, pixels=None, frame_size=None):
+        '''
+        Append a frame
+
+        Args:
+            key (str): Cache key of the image
+            pixels (bytes): Raw pixels in the pack's pixel format, rows without padding
+            frame_size (tuple): Width and height of the frame, at most the display size
+        '''
+        width, height = frame_size
+        if len(pixels) != width * height * PIXEL_FORMATS[self._pixel_format]:
+            raise RuntimeError("Frame '{}' is not {}x{} {}".format(key, width, height,
+                                                                   self._pixel_format))
+
+        offset = self._align()
+        self._file.write(pixels)
+        self._frames[key] = (offset, width, height)
+    #
+    ####################################################################################
+    #
+    # _align()
+    #
+    def _align(self):
+        '''
+        Pad the file to the next page boundary
+
+        Returns:
+            int: The aligned offset
+        '''
+        offset = self._file.tell()
+        padding = -offset % ALIGN
+        if padding:
+            self._file.write(b'\0' * padding)
+        return offset + padding
+    #
+    ####################################################################################
+    #
+    # close()
+    #
+    def close(self):
+        '''Write the index and header and put the pack in place'''
+        index = json.dumps({
+            'size': list(self._size),
+            'format': self._pixel_format,
+            'quality': self._quality,
+            'frames': self._frames,
+        }).encode('utf-8')
+
+        offset = self._file.tell()
+        self._file.write(index)
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, self._size[0], self._size[1], offset, len(index)))
+        self._file.close()
+        os.replace(self._tmp_path, self._path)
+        self._logger.info("Wrote %d frames to '%s'", len(self._frames), self._path)
+    #
+    ####################################################################################
+    #
+    # abort()
+    #
+    def abort(self):
+        '''Throw the partly written pack away'''
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+    #
+    ##############################################################################
+    ##############################################################################
+    #
+    def __len__(self):
+        return len(self._frames)
+
+    def __contains__(self, key):
+        return key in self._frames
+#
+##############################################################################
+#
+# FramePack
+#
+class FramePack(object):
+    '''
+    FramePack - memory-mapped frames to play without decoding
+
+    frame() wraps the mapped pixels in a surface, so showing a frame costs a page-in at most and
+    the blit. advise() asks the OS to page upcoming frames in ahead of time.
+    '''
+    #
+    ####################################################################################
+    #
+    # __init__()
+    #
+    def __init__(self, path=None):
+        '''
+        Args:
+            path (str): Pack file written by FramePackWriter
+
+        Raises:
+            RuntimeError: If the file is not a frame pack
+            OSError: If the file cannot be read
+        '''
+        super(FramePack, self).__init__()
+
+        self._logger = logging.getLogger(type(self).__name__)
+
+        self._path = path
+        with open(path, 'rb') as pack_file:
+            try:
+                self._map = mmap.mmap(pack_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as err:
+                # empty file
+                raise RuntimeError("'{}' is not a frame pack: '{}'".format(path, err))
+
+        try:
+            magic, width, height, offset, length = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise ValueError('bad magic')
+            index = json.loads(self._map[offset:offset + length].decode('utf-8'))
+            self.pixel_format = index['format']
+            self._bytes_per_pixel = PIXEL_FORMATS[self.pixel_format]
+            self._frames = dict((key, tuple(frame)) for key, frame in index['frames'].items())
+        except (struct.error, ValueError, KeyError) as err:
+            self._map.close()
+            raise RuntimeError("'{}' is not a frame pack: '{}'".format(path, err))
+
+        self.size = (width, height)
+        self.quality = index.get('quality')
+        self._view = memoryview(self._map)
+        self._logger.info("Mapped %d %dx%d frames from '%s'", len(self._frames), width, height,
+                          path)
+    #
+    ####################################################################################
+    #
+    # frame()
+    #
+    def frame(self, key=None):
+        '''
+        Args:
+            key (str): Cache key of the image
+
+        Returns:
+            pygame.Surface: The frame, backed by the mapped file, or None if it is not in the
+                pack. It must not be drawn on.
+        '''
+        pixels, frame_size = self.pixels(key)
+        if None in [pixels]:
+            return None
+
+        surface = pygame.image.frombuffer(pixels, frame_size, self.pixel_format)
+        if self.pixel_format == 'BGRA':
+            # the fourth byte is padding, not alpha: blit without blending
+            surface.set_alpha(None)
+        return surface
+    #
+    ####################################################################################
+    #
+    # pixels()
+    #
+    def pixels(self, key=None):
+        '''
+        Args:
+            key (str): Cache key of the image
+
+        Returns:
+            tuple: (memoryview of the raw pixels in the mapped file, frame size) or (None, None)
+                if the image is not in the pack
+        '''
+        frame = self._frames.get(key)
+        if None in [frame]:
+            return None, None
+
+        offset, width, height = frame
+        return (self._view[offset:offset + width * height * self._bytes_per_pixel],
+                (width, height))
+    #
+    ####################################################################################
+    #
+    # advise()
+    #
+    def advise(self, key=None):
+        '''
+        Ask the OS to read a frame into the page cache before it is shown
+
+        Args:
+            key (str): Cache key of the image
+        '''
+        frame = self._frames.get(key)
+        if None in [frame] or not hasattr(self._map, 'madvise'):
+            return
+
+        offset, width, height = frame
+        # pylint: disable=no-member
+        try:
+            self._map.madvise(mmap.MADV_WILLNEED, offset, width * height * self._bytes_per_pixel)
+        except (OSError, ValueError) as err:
+            self._logger.debug("Could not advise '%s': '%s'", key, err)
+    #
+    ####################################################################################
+    #
+    # close()
+    #
+    def close(self):
+        '''Unmap the pack once no surface uses it any more'''
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # surfaces still point into the map; it goes when they do
+            self._logger.debug("Frames of '%s' still in use", self._path)
+    #
+    ##############################################################################
+    ##############################################################################
+    #
+    def __len__(self):
+        return len(self._frames)
+
+    def __contains__(self, key):
+        return key in self._frames
@@ -0,0 +1,648 @@
+# -*- coding: utf-8 -*-
+#
+'''
+Frame Server Classes
+
+One FrameServer owns the gallery feeds, the downloads and the image caches for every slideshow
+it serves. Slideshows connect with a FrameClient over a Unix socket, or over TCP from other
+machines, and ask it for the playlist, for compressed images and for display-ready frames.
+
+Each image is decoded once, and every display size asked for is scaled from that decode. Frames
+are written to anonymous shared memory. Over a Unix socket its file descriptor is passed, so a
+client maps the pixels the server wrote instead of receiving a copy; over TCP the pixels are sent.
+
+Messages are a 4 byte big-endian header length, a JSON header and, if the header has a 'length',
+that many bytes of payload. A frame reply over a Unix socket carries its file descriptor with the
+header instead.
+'''
+#
+# Standard Imports
+#
+from __future__ import division, print_function
+import json
+import logging
+import mmap
+import os
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+#
+# local directory imports here
+#
+from cache import LruCache
+from imaging import (decode_image, image_pixels, PIXEL_FORMATS, resize_fit, SCALE_QUALITIES,
+                     SCALE_QUALITY)
+#
+##############################################################################
+#
+# Global Variables
+#
+# Where the server listens unless told otherwise
+SOCKET_PATH = os.path.join(os.environ.get('XDG_RUNTIME_DIR', tempfile.gettempdir()),
+                           'smug-slideshow.sock')
+
+HEADER_LENGTH = struct.Struct('>I')
+
+# Largest header accepted, far above any playlist
+MAX_HEADER = 64 * 1024 * 1024
+
+# Largest request the server accepts: a few short fields
+MAX_REQUEST = 4 * 1024
+
+# Largest display frames are scaled for
+MAX_FRAME_SIZE = (7680, 4320)
+#
+##############################################################################
+#
+# parse_address()
+#
+def parse_address(address=None):
+    '''
+    Args:
+        address (str): Path of a Unix socket, or HOST:PORT to use TCP
+
+    Returns:
+        tuple: (socket family, address to bind or connect to)
+    '''
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit() and os.sep not in address:
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, address
+#
+##############################################################################
+#
+# Messages
+#
+def send_message(sock=None, header=None, payload=None, fd=None):
+    '''
+    Args:
+        sock (socket.socket): Connected socket
+        header (dict): JSON header
+        payload (bytes): Bytes sent after the header. Their length is added to the header.
+        fd (int): File descriptor passed along with the header. Unix sockets only.
+    '''
+    if None not in [payload]:
+        header = dict(header, length=len(payload))
+    data = json.dumps(header).encode('utf-8')
+    data = HEADER_LENGTH.pack(len(data)) + data
+    if None in [fd]:
+        sock.sendall(data)
+    else:
+        sent = socket.send_fds(sock, [data], [fd])
+        sock.sendall(data[sent:])
+    if payload:
+        sock.sendall(payload)
+
+def _receive_exactly(sock=None, length=None, fds=None):
+    '''
+    Returns:
+        bytes: length bytes from the socket. File descriptors that come with them are appended
+            to fds.
+
+    Raises:
+        EOFError: If the other end closed the connection
+    '''
+    chunks = []
+    while length > 0:
+        if None in [fds]:
+            chunk = sock.recv(min(length, 1024 * 1024))
+        else:
+            chunk, received, _, _ = socket.recv_fds(sock, min(length, 1024 * 1024), 1)
+            fds.extend(received)
+        if not chunk:
+            raise EOFError('connection closed')
+        chunks.append(chunk)
+        length -= len(chunk)
+    return b''.join(chunks)
+
+def receive_message(sock=None, with_fd=False, max_length=None):
+    '''
+    Args:
+        sock (socket.socket): Connected socket
+        with_fd (bool): Accept a file descriptor with the header. Unix sockets only.
+        max_length (int): Largest header and payload accepted. Default: MAX_HEADER for the
+            header and any payload
+
+    Returns:
+        tuple: (header, payload or None, file descriptor or None)
+
+    Raises:
+        EOFError: If the other end closed the connection
+        ValueError: If the message is malformed
+    '''
+    fds = [] if with_fd else None
+    length = HEADER_LENGTH.unpack(_receive_exactly(sock, HEADER_LENGTH.size, fds))[0]
+    if length > (MAX_HEADER if None in [max_length] else max_length):
+        raise ValueError('header of {} bytes'.format(length))
+    header = json.loads(_receive_exactly(sock, length, fds).decode('utf-8'))
+    if not isinstance(header, dict):
+        raise ValueError('header is not an object')
+    payload = None
+    if 'length' in header:
+        length = header['length']
+        if not isinstance(length, int) or length < 0 or (None not in [max_length] and
+                                                         length > max_length):
+            raise ValueError('payload of {} bytes'.format(length))
+        payload = _receive_exactly(sock, length)
+    for extra in (fds or [])[1:]:
+        os.close(extra)
+    return header, payload, fds[0] if fds else None
+#
+##############################################################################
+#
+# _shared_memory()
+#
+def _shared_memory(data=None):
+    '''
+    Args:
+        data (bytes): Content
+
+    Returns:
+        file: Anonymous file in memory holding data, to pass to other processes by descriptor
+    '''
+    if hasattr(os, 'memfd_create'):
+        shared = os.fdopen(os.memfd_create('smug-frame', os.MFD_CLOEXEC), 'w+b')
+    else:
+        # already unlinked: it lives as long as a descriptor or mapping of it does
+        shared = tempfile.TemporaryFile()
+    shared.write(data)
+    shared.flush()
+    return shared
+#
+##############################################################################
+#
+# FrameServer
+#
+class FrameServer(object):
+    '''
+    FrameServer - serve one slideshow's gallery, images and frames to many displays
+
+    Requests, one JSON header each:
+        gallery  the playlist, every entry with the rendition chosen for the largest display
+        image    compressed data of an image, through the slideshow's memory and disk caches
+        frame    an image scaled to fit a size, in a pixel format, by shared memory over a Unix
+                 socket and as payload over TCP
+
+    Decoded images and scaled frames are kept in caches of their own. Requests for the same
+    image wait on one another, so two displays asking at once cost one download and one decode.
+
+    Clients name images by cache key only. The server looks the key up among the renditions of
+    its own gallery and fetches that URL, so it never loads anything else on a client's behalf.
+    '''
+    #
+    ####################################################################################
+    #
+    # Class variables
+    #
+    # Maximum size of decoded images to keep, to scale to further sizes (in bytes)
+    DECODED_CACHE_SIZE = 256 * 1024 * 1024
+
+    # Maximum size of scaled frames to keep in shared memory (in bytes)
+    FRAME_CACHE_SIZE = 256 * 1024 * 1024
+    #
+    ####################################################################################
+    #
+    # __init__()
+    #
+    def __init__(self, slide_show=None, path=SOCKET_PATH, decoded_cache_size=DECODED_CACHE_SIZE,
+                 frame_cache_size=FRAME_CACHE_SIZE):
+        '''
+        Args:
+            slide_show (Slideshow): Slideshow that loads the feeds and fetches the images
+            path (str): Unix socket to listen on, a stale one is replaced, or HOST:PORT to
+                listen on over TCP. TCP has no access control beyond what reaches the port.
+            decoded_cache_size (int): Maximum size of decoded images to keep (in bytes)
+            frame_cache_size (int): Maximum size of scaled frames to keep (in bytes)
+        '''
+        super(FrameServer, self).__init__()
+
+        if None in [slide_show]:
+            raise RuntimeError("Need a slideshow to proceed!")
+
+        self._logger = logging.getLogger(type(self).__name__)
+
+        self._slide_show = slide_show
+        self._path = path
+        self._decoded = LruCache(max_size=decoded_cache_size)
+        # frames hold a descriptor and shared memory each, released as soon as they are evicted
+        self._frames = LruCache(max_size=frame_cache_size, on_evict=self._close_frame)
+        self._lock = threading.Lock()
+        # cache key -> [lock held while the image is fetched and decoded, requests using it]
+        self._image_locks = {}
+        # cache key -> URL of every rendition in the gallery, as last listed
+        self._urls = {}
+        self._decodes = 0
+
+        self._family, address = parse_address(path)
+        if self._family == socket.AF_UNIX and os.path.exists(path):
+            os.remove(path)
+
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            '''Answer one client until it disconnects'''
+            def handle(self):
+                server.handle(self.request)
+
+        if self._family == socket.AF_UNIX:
+            self._server = socketserver.ThreadingUnixStreamServer(address, Handler)
+            os.chmod(path, 0o660)
+        else:
+            self._server = socketserver.ThreadingTCPServer(address, Handler,
+                                                           bind_and_activate=False)
+            # restarting should not wait out connections the last run left in TIME_WAIT
+            self._server.allow_reuse_address = True
+            self._server.server_bind()
+            self._server.server_activate()
+        self._server.daemon_threads = True
+        self._logger.info("Serving frames on '%s'", path)
+    #
+    ####################################################################################
+    #
+    # handle()
+    #
+    def handle(self, sock=None):
+        '''
+        Answer requests from one client until it disconnects
+
+        Args:
+            sock (socket.socket): Connected client
+        '''
+        while 1:
+            try:
+                header, _, _ = receive_message(sock, max_length=MAX_REQUEST)
+            except (EOFError, OSError, ValueError):
+                return
+
+            # pylint: disable=broad-except
+            try:
+                operation = header.get('op')
+                if operation == 'gallery':
+                    send_message(sock, {'entries': self._gallery()})
+                elif operation == 'image':
+                    key = header.get('key')
+                    url = self._resolve(key)
+                    data = None if None in [url] else self._slide_show.fetch(key, url)
+                    if None in [data]:
+                        send_message(sock, {'error': 'not found'})
+                    else:
+                        send_message(sock, {}, payload=data)
+                elif operation == 'frame':
+                    self._send_frame(sock, header)
+                else:
+                    send_message(sock, {'error': "unknown op '{}'".format(operation)})
+            except OSError:
+                return
+            except Exception as err:
+                self._logger.error("Request %s failed: '%s'", header, err)
+                try:
+                    send_message(sock, {'error': str(err)})
+                except OSError:
+                    return
+    #
+    ####################################################################################
+    #
+    # _gallery()
+    #
+    def _gallery(self):
+        '''
+        Returns:
+            list: as_dict() of every gallery entry with a rendition to show, in playlist order
+        '''
+        self._slide_show.wait_ready()
+        return [entry.as_dict() for entry in self._slide_show.entries() if entry.chosen >= 0]
+    #
+    ####################################################################################
+    #
+    # _resolve()
+    #
+    def _resolve(self, key=None):
+        '''
+        Returns:
+            str: URL of the gallery rendition with this cache key, or None if there is none
+        '''
+        if not isinstance(key, str):
+            return None
+        with self._lock:
+            url = self._urls.get(key)
+        if None not in [url]:
+            return url
+
+        # the gallery may have changed since its keys were last listed
+        urls = dict((os.path.basename(url), url) for entry in self._slide_show.entries()
+                    for url in entry.urls)
+        with self._lock:
+            self._urls = urls
+        return urls.get(key)
+    #
+    ####################################################################################
+    #
+    # _send_frame()
+    #
+    def _send_frame(self, sock=None, header=None):
+        '''Scale an image for a client, or find it scaled already, and pass it on'''
+        key = header.get('key')
+        size = header.get('size')
+        quality = header.get('quality') or SCALE_QUALITY
+        pixel_format = header.get('format') or 'RGB'
+        if (not isinstance(size, list) or len(size) != 2 or
+                not all(isinstance(value, int) and 0 < value <= limit
+                        for value, limit in zip(size, MAX_FRAME_SIZE))):
+            send_message(sock, {'error': 'size must be at most {}x{}'.format(*MAX_FRAME_SIZE)})
+            return
+        if quality not in SCALE_QUALITIES or pixel_format not in PIXEL_FORMATS:
+            send_message(sock, {'error': 'unknown quality or format'})
+            return
+
+        url = self._resolve(key)
+        frame = None
+        if None not in [url]:
+            frame = self._frame(key, url, tuple(size), quality, pixel_format)
+        if None in [frame]:
+            send_message(sock, {'error': 'not found'})
+            return
+
+        fd, frame_size, length = frame
+        header = {'size': list(frame_size), 'format': pixel_format, 'bytes': length}
+        try:
+            if self._family == socket.AF_UNIX:
+                send_message(sock, header, fd=fd)
+                return
+
+            # other machines cannot map the memory, so send what is in it
+            pixels = mmap.mmap(fd, length, access=mmap.ACCESS_READ)
+            try:
+                send_message(sock, header, payload=pixels)
+            finally:
+                pixels.close()
+        finally:
+            os.close(fd)
+    #
+    ####################################################################################
+    #
+    # _hold_frame()
+    #
+    def _hold_frame(self, frame=None):
+        '''
+        Returns:
+            tuple: (own descriptor of the shared memory, frame size, bytes), or None if the frame
+                was evicted and closed meanwhile. The caller closes the descriptor.
+        '''
+        shared, frame_size, length = frame
+        with self._lock:
+            if shared.closed:
+                return None
+            return os.dup(shared.fileno()), frame_size, length
+    #
+    ####################################################################################
+    #
+    # _close_frame()
+    #
+    def _close_frame(self, frame=None):
+        '''Release an evicted frame. Requests sending it hold descriptors of their own.'''
+        with self._lock:
+            frame[0].close()
+    #
+    ####################################################################################
+    #
+    # _frame()
+    #
+    # pylint: disable=too-many-arguments
+    def _frame(self, key=None, url=None, size=None, quality=None, pixel_format=None):
+        '''
+        Returns:
+            tuple: (descriptor of the shared memory, frame size, bytes) of the scaled image or
+                None. The caller closes the descriptor. Every image is fetched and decoded once,
+                and every size scaled once, however many clients ask at once.
+        '''
+        frame_key = (key, size, quality, pixel_format)
+        frame = self._frames.get(frame_key)
+        held = None if None in [frame] else self._hold_frame(frame)
+        if None not in [held]:
+            return held
+
+        # one lock per image being worked on, dropped when the last request for it is done
+        with self._lock:
+            entry = self._image_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+
+        try:
+            with entry[0]:
+                frame = self._frames.peek(frame_key)
+                held = None if None in [frame] else self._hold_frame(frame)
+                if None not in [held]:
+                    return held
+
+                decoded = self._decoded.get(key)
+                if None in [decoded]:
+                    data = self._slide_show.fetch(key, url)
+                    if None in [data]:
+                        return None
+                    decoded = decode_image(data)
+                    self._decoded.put(key, decoded, size=decoded.size[0] * decoded.size[1] * 3)
+                    with self._lock:
+                        self._decodes += 1
+
+                pixels, frame_size, _ = image_pixels(resize_fit(decoded, size, quality),
+                                                     pixel_format)
+                frame = (_shared_memory(pixels), frame_size, len(pixels))
+                # held before it is cached, where another request's put could evict it
+                held = self._hold_frame(frame)
+                self._frames.put(frame_key, frame, size=len(pixels))
+            return held
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self._image_locks[key]
+    #
+    ####################################################################################
+    #
+    # stats()
+    #
+    def stats(self):
+        '''
+        Returns:
+            dict: Decodes done and the decoded image and frame cache counters
+        '''
+        stats = {'decodes': self._decodes}
+        for name, cache in [('decoded', self._decoded), ('frames', self._frames)]:
+            stats.update(('{}_{}'.format(name, stat), value)
+                         for stat, value in cache.stats().items())
+        return stats
+    #
+    ####################################################################################
+    #
+    # serve_forever()
+    #
+    def serve_forever(self):
+        '''Answer clients until shutdown()'''
+        self._server.serve_forever()
+    #
+    ####################################################################################
+    #
+    # shutdown()
+    #
+    def shutdown(self):
+        '''Stop serving and remove the socket'''
+        self._server.shutdown()
+        self._server.server_close()
+        if self._family != socket.AF_UNIX:
+            return
+        try:
+            os.remove(self._path)
+        except OSError:
+            pass
+#
+##############################################################################
+#
+# FrameClient
+#
+class FrameClient(object):
+    '''
+    FrameClient - a slideshow's connection to a FrameServer
+
+    Requests go one at a time over a single connection, which is opened again after an error.
+    Over TCP frames come as bytes instead of shared memory.
+    '''
+    #
+    ####################################################################################
+    #
+    # __init__()
+    #
+    def __init__(self, path=SOCKET_PATH):
+        '''
+        Args:
+            path (str): Unix socket the server listens on, or its HOST:PORT over TCP
+        '''
+        super(FrameClient, self).__init__()
+
+        self._logger = logging.getLogger(type(self).__name__)
+
+        self._path = path
+        self._family, self._address = parse_address(path)
+        self._lock = threading.Lock()
+        self._sock = None
+    #
+    ####################################################################################
+    #
+    # _request()
+    #
+    def _request(self, header=None, with_fd=False):
+        '''
+        Returns:
+            tuple: (header, payload, file descriptor) of the reply
+
+        Raises:
+            OSError: If the server cannot be reached
+            RuntimeError: If the server answered with an error
+        '''
+        with self._lock:
+            try:
+                if None in [self._sock]:
+                    self._sock = socket.socket(self._family, socket.SOCK_STREAM)
+                    self._sock.connect(self._address)
+                send_message(self._sock, header)
+                reply = receive_message(self._sock,
+                                        with_fd=with_fd and self._family == socket.AF_UNIX)
+            except (EOFError, OSError, ValueError) as err:
+                self._close()
+                raise OSError("Frame server '{}': {}".format(self._path, err))
+
+        if 'error' in reply[0]:
+            if None not in [reply[2]]:
+                os.close(reply[2])
+            raise RuntimeError(reply[0]['error'])
+        return reply
+    #
+    ####################################################################################
+    #
+    # gallery()
+    #
+    def gallery(self):
+        '''
+        Returns:
+            list: as_dict() of every gallery entry, in the server's playlist order
+
+        Raises:
+            OSError: If the server cannot be reached
+        '''
+        return self._request({'op': 'gallery'})[0]['entries']
+    #
+    ####################################################################################
+    #
+    # image()
+    #
+    # pylint: disable=unused-argument
+    def image(self, key=None, url=None):
+        '''
+        Args:
+            key (str): Cache key
+            url (str): URL of the image. Not sent: the server fetches its own URL for key.
+
+        Returns:
+            bytes: Compressed image data or None
+        '''
+        try:
+            return self._request({'op': 'image', 'key': key})[1]
+        except (OSError, RuntimeError) as err:
+            self._logger.error("Loading '%s' failed: '%s'", key, err)
+        return None
+    #
+    ####################################################################################
+    #
+    # frame()
+    #
+    # pylint: disable=too-many-arguments,unused-argument
+    def frame(self, key=None, url=None, size=None, quality=SCALE_QUALITY, pixel_format='RGB'):
+        '''
+        Args:
+            key (str): Cache key
+            url (str): URL of the image. Not sent: the server fetches its own URL for key.
+            size (tuple): Width and height to fit in
+            quality (str): One of imaging.SCALE_QUALITIES
+            pixel_format (str): One of imaging.PIXEL_FORMATS
+
+        Returns:
+            tuple: (memoryview of the pixels, in shared memory unless over TCP, frame size,
+                pixel format) ready for pygame.image.frombuffer(), or (None, None, None)
+        '''
+        try:
+            header, payload, fd = self._request({'op': 'frame', 'key': key,
+                                                 'size': list(size), 'quality': quality,
+                                                 'format': pixel_format}, with_fd=True)
+        except (OSError, RuntimeError) as err:
+            self._logger.error("Loading frame of '%s' failed: '%s'", key, err)
+            return None, None, None
+
+        if None not in [payload]:
+            return memoryview(payload), tuple(header['size']), header['format']
+        if None in [fd]:
+            self._logger.error("Frame of '%s' came without its memory", key)
+            return None, None, None
+        try:
+            # the mapping outlives the descriptor, and goes once nothing uses the pixels
+            shared = mmap.mmap(fd, header['bytes'], access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        return memoryview(shared), tuple(header['size']), header['format']
+    #
+    ####################################################################################
+    #
+    # _close()
+    #
+    def _close(self):
+        if None not in [self._sock]:
+            self._sock.close()
+            self._sock = None
+    #
+    ####################################################################################
+    #
+    # close()
+    #
+    def close(self):
+        '''Disconnect'''
+        with self._lock:
+            self._close()
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+#
+'''
+Gallery Entry Classes
+'''
+#
+# Standard Imports
+#
+from __future__ import print_function
+from array import array
+import logging
+import os
+#
+##############################################################################
+#
+# GalleryEntry
+#
+# pylint: disable=too-few-public-methods
+class GalleryEntry(object):
+    '''
+    GalleryEntry - the parts of a feed entry the slideshow needs
+
+    Renditions keep their feed order, with their sizes parsed once into arrays. The rendition to
+    show is chosen when the entry is created, so finding the image for a position is a lookup
+    rather than a search through media_content.
+    '''
+    __slots__ = ('entry_id', 'link', 'title', 'year', 'urls', 'widths', 'heights', 'chosen',
+                 'key')
+    #
+    ####################################################################################
+    #
+    # __init__()
+    #
+    # pylint: disable=too-many-arguments
+    def __init__(self, entry_id=None, link=None, title=None, year=None, renditions=None):
+        '''
+        Args:
+            entry_id (str): Stable identifier of the entry
+            link (str): Link to the image page
+            title (str): Image title
+            year (int): Year the image was published
+            renditions (list): (url, width, height) of every rendition in feed order
+        '''
+        renditions = renditions if renditions else []
+
+        self.entry_id = entry_id if entry_id else link
+        self.link = link
+        self.title = title
+        self.year = year
+        self.urls = tuple(url for url, _, _ in renditions)
+        self.widths = array('I', (width for _, width, _ in renditions))
+        self.heights = array('I', (height for _, _, height in renditions))
+        self.chosen = -1
+        self.key = None
+    #
+    ####################################################################################
+    #
+    # from_feed()
+    #
+    @classmethod
+    def from_feed(cls, entry=None):
+        '''
+        Build an entry from a feedparser entry
+
+        Args:
+            entry (dict): feedparser entry
+
+        Returns:
+            GalleryEntry: Compact entry
+        '''
+        renditions = []
+        for image in entry.get('media_content') or []:
+            try:
+                renditions.append((image.get('url'), int(image.get('width')),
+                                   int(image.get('height'))))
+            except (TypeError, ValueError):
+                logging.getLogger(cls.__name__).debug("Skipping rendition without a size")
+
+        published = entry.get('published_parsed')
+
+        return cls(entry_id=entry.get('id'), link=entry.get('link'), title=entry.get('title'),
+                   year=published[0] if published else None, renditions=renditions)
+    #
+    ####################################################################################
+    #
+    # as_dict()
+    #
+    def as_dict(self):
+        '''
+        Returns:
+            dict: The entry and its chosen rendition as plain JSON types, for from_dict()
+        '''
+        return {
+            'entry_id': self.entry_id,
+            'link': self.link,
+            'title': self.title,
+            'year': self.year,
+            'renditions': [[url, width, height] for url, width, height
+                           in zip(self.urls, self.widths, self.heights)],
+            'chosen': self.chosen,
+        }
+    #
+    ####################################################################################
+    #
+    # from_dict()
+    #
+    @classmethod
+    def from_dict(cls, data=None):
+        '''
+        Rebuild an entry, with the rendition chosen for it, from as_dict()
+
+        Args:
+            data (dict): as_dict() of an entry
+
+        Returns:
+            GalleryEntry: Compact entry
+        '''
+        entry = cls(entry_id=data.get('entry_id'), link=data.get('link'), title=data.get('title'),
+                    year=data.get('year'), renditions=data.get('renditions'))
+        entry.chosen = data.get('chosen', -1)
+        if not 0 <= entry.chosen < len(entry.urls):
+            entry.chosen = -1
+        entry.key = os.path.basename(entry.urls[entry.chosen]) if entry.chosen >= 0 else None
+        return entry
+    #
+    ####################################################################################
+    #
+    # choose()
+    #
+    def choose(self, width=None, height=None, downscale=False):
+        '''
+        Choose the rendition that best fits a W x H display
+
+        Args:
+            width (int): Width of target display
+            height (int): Height of target display
+            downscale (bool): Prefer renditions larger than the display
+
+        Returns:
+            int: Index of the chosen rendition or -1
+        '''
+        self.chosen = best_rendition(self.widths, self.heights, width, height, downscale)
+        self.key = os.path.basename(self.urls[self.chosen]) if self.chosen >= 0 else None
+        return self.chosen
+    #
+    ##############################################################################
+    ##############################################################################
+    #
+    @property
+    def url(self):
+        '''str: URL of the chosen rendition or None'''
+        return self.urls[self.chosen] if self.chosen >= 0 else None
+
+    @property
+    def preview(self):
+        '''int: index of the smallest rendition, quickest to fetch, or -1'''
+        if not self.urls:
+            return -1
+        return min(range(len(self.urls)),
+                   key=lambda index: self.widths[index] * self.heights[index])
+
+    @property
+    def original(self):
+        '''int: index of the largest rendition, closest to the original file, or -1'''
+        if not self.urls:
+            return -1
+        return max(range(len(self.urls)),
+                   key=lambda index: self.widths[index] * self.heights[index])
+#
+##############################################################################
+#
+# best_rendition()
+#
+# pylint: disable=too-many-arguments
+def best_rendition(widths=None, heights=None, width=None, height=None, downscale=False):
+    '''
+    Choose the rendition whose longer side is closest to the matching side of the display
+
+    Args:
+        widths (array): Rendition widths in feed order
+        heights (array): Rendition heights in feed order
+        width (int): Width of target display
+        height (int): Height of target display
+        downscale (bool): Search from large to small and stop at the first rendition smaller
+            than the display
+
+    Returns:
+        int: Index of the best rendition or -1
+    '''
+    best = -1
+    closest = 10000000
+
+    indexes = range(len(widths))
+    if downscale:
+        indexes = reversed(indexes)
+
+    for index in indexes:
+        if widths[index] >= heights[index]:
+            diff = width - widths[index]
+        else:
+            diff = height - heights[index]
+
+        # NOTE: a positive diff indicates an image smaller than the display, end search if
+        # in downscale mode
+        if downscale and diff > 0:
+            break
+
+        diff = abs(diff)
+
+        if diff < closest:
+            closest = diff
+            best = index
+
+        if closest == 0:
+            break
+
+    return best
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+#
+'''
+Image Scaling Functions
+
+Everything here works on plain bytes and Pillow images, with no pygame, so the CPU-bound decode
+and scale can run in a worker process. Pillow is imported on first use: a show that scales in
+worker processes never needs it in the main one.
+'''
+#
+# Standard Imports
+#
+from __future__ import absolute_import, division, print_function, unicode_literals
+from io import BytesIO
+import mmap
+import os
+import tempfile
+#
+##############################################################################
+#
+# Global Variables
+#
+# Scaling quality modes: (how many times the target size to decode/reduce to, final filter)
+#   fast      JPEG draft (DCT domain) decode and reduce() to just above the target, bilinear
+#   balanced  JPEG draft decode and reduce() to twice the target, bicubic
+#   best      full decode, Lanczos
+SCALE_QUALITIES = {
+    'fast': (1, 'BILINEAR'),
+    'balanced': (2, 'BICUBIC'),
+    'best': (None, 'LANCZOS'),
+}
+SCALE_QUALITY = 'best'
+
+# Pixel formats pygame.image.frombuffer() takes -> Pillow raw mode that writes them. The fourth
+# byte of the 32-bit formats is padding.
+PIXEL_FORMATS = {
+    'RGB': 'RGB',
+    'BGR': 'BGR',
+    'RGBX': 'RGBX',
+    'BGRA': 'BGRX',
+}
+
+# Where scale_shared() leaves frames for the caller to map: in memory, where Linux offers it
+SHARED_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+#
+##############################################################################
+#
+# preload()
+#
+def preload():
+    '''
+    Import Pillow ahead of the first decode, e.g. in a worker process that just started
+    '''
+    # pylint: disable=import-outside-toplevel,unused-import
+    import PIL.Image
+#
+##############################################################################
+#
+# fit_size()
+#
+def fit_size(image_size=None, size=None):
+    '''
+    Find the largest size with the aspect ratio of image_size that fits in size. Images are never
+        enlarged.
+
+    Args:
+        image_size (tuple): Width and height of the original
+        size (tuple): Width and height to fit in
+
+    Returns:
+        tuple: Width and height of the scaled image
+    '''
+    scale = min(1.0, size[0] / image_size[0], size[1] / image_size[1])
+    return (max(1, int(round(image_size[0] * scale))),
+            max(1, int(round(image_size[1] * scale))))
+#
+##############################################################################
+#
+# resize_fit()
+#
+def resize_fit(the_image=None, size=None, quality=SCALE_QUALITY, exact=False):
+    """
+    Scale an image to fit in size, decoding it at most once and without letterboxing
+
+    Args:
+        the_image (PIL.Image): A Pillow image instance. May be returned as-is if it already fits.
+            Draft decoding only applies if it has not been loaded yet.
+        size (list): A list of two integers [width, height]
+        quality (str): One of SCALE_QUALITIES
+        exact (bool): Scale to exactly size, up or down, e.g. to match another rendition of the
+            same image
+
+    Returns:
+        PIL.Image: Scaled RGB image results
+    """
+    import PIL.Image # pylint: disable=import-outside-toplevel
+
+    gap, resample = SCALE_QUALITIES[quality]
+    resample = getattr(PIL.Image, resample)
+    img = the_image
+    new_size = tuple(size) if exact else fit_size(img.size, size)
+
+    if gap and new_size[0] < img.size[0]:
+        # let libjpeg scale by 1/2, 1/4 or 1/8 while decoding, then shrink by whole pixels
+        img.draft('RGB', (new_size[0] * gap, new_size[1] * gap))
+        factor = min(img.size[0] // (new_size[0] * gap), img.size[1] // (new_size[1] * gap))
+        if factor > 1 and hasattr(img, 'reduce'):
+            img = img.reduce(factor)
+
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    if new_size != img.size:
+        # NOTE: https://pillow.readthedocs.io/en/5.2.x/handbook/concepts.html#filters-comparison-table
+        img = img.resize(new_size, resample)
+    return img
+#
+##############################################################################
+#
+# decode_image()
+#
+def decode_image(data=None):
+    '''
+    Decode compressed image data in full, to scale to several sizes with resize_fit()
+
+    Args:
+        data (bytes): Compressed image data
+
+    Returns:
+        PIL.Image: Loaded RGB image
+
+    Raises:
+        OSError: If Pillow cannot decode the data
+    '''
+    import PIL.Image # pylint: disable=import-outside-toplevel
+
+    with PIL.Image.open(BytesIO(data)) as pil_image:
+        pil_image.load()
+        return pil_image.convert('RGB') if pil_image.mode != 'RGB' else pil_image.copy()
+#
+##############################################################################
+#
+# image_pixels()
+#
+def image_pixels(img=None, pixel_format='RGB'):
+    '''
+    Args:
+        img (PIL.Image): RGB image
+        pixel_format (str): One of PIXEL_FORMATS
+
+    Returns:
+        tuple: (pixels, size, mode) ready for pygame.image.frombuffer()
+    '''
+    if pixel_format == img.mode:
+        return img.tobytes(), img.size, img.mode
+    return img.tobytes('raw', PIXEL_FORMATS[pixel_format]), img.size, pixel_format
+#
+##############################################################################
+#
+# scale_pixels()
+#
+def scale_pixels(data=None, size=None, quality=SCALE_QUALITY, exact=False, pixel_format='RGB'):
+    '''
+    Decode compressed image data and scale it to fit in size
+
+    Args:
+        data (bytes): Compressed image data
+        size (tuple): Width and height to fit in
+        quality (str): One of SCALE_QUALITIES
+        exact (bool): Scale to exactly size instead of fitting in it
+        pixel_format (str): One of PIXEL_FORMATS, e.g. the display's to blit without converting
+
+    Returns:
+        tuple: (pixels, size, mode) ready for pygame.image.frombuffer()
+
+    Raises:
+        RuntimeError: If any arguments are missing
+        OSError: If Pillow cannot decode the data
+    '''
+    if None in [data, size]:
+        raise RuntimeError("Missing an argument!")
+
+    import PIL.Image # pylint: disable=import-outside-toplevel
+
+    with PIL.Image.open(BytesIO(data)) as pil_image:
+        return image_pixels(resize_fit(pil_image, size, quality, exact), pixel_format)
+#
+##############################################################################
+#
+# scale_shared()
+#
+def scale_shared(data=None, size=None, quality=SCALE_QUALITY, exact=False, pixel_format='RGB'):
+    '''
+    scale_pixels() for a worker process. The pixels are left in a file for the caller to take
+        with map_shared(), instead of being pickled back.
+
+    Returns:
+        tuple: (path of the file, size, mode, bytes). The caller removes the file.
+
+    Raises:
+        RuntimeError: If any arguments are missing
+        OSError: If Pillow cannot decode the data or the file cannot be written
+    '''
+    pixels, new_size, mode = scale_pixels(data, size, quality, exact, pixel_format)
+    handle, path = tempfile.mkstemp(dir=SHARED_DIR, prefix='smug-frame-')
+    try:
+        with os.fdopen(handle, 'wb') as shared:
+            shared.write(pixels)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path, new_size, mode, len(pixels)
+#
+##############################################################################
+#
+# map_shared()
+#
+def map_shared(path=None, length=None):
+    '''
+    Map the pixels scale_shared() left in a file, and remove the file
+
+    Args:
+        path (str): File from scale_shared()
+        length (int): Bytes from scale_shared()
+
+    Returns:
+        memoryview: The pixels, read only, for pygame.image.frombuffer()
+    '''
+    try:
+        with open(path, 'rb') as shared:
+            # the mapping outlives the file, and goes once nothing uses the pixels
+            return memoryview(mmap.mmap(shared.fileno(), length, access=mmap.ACCESS_READ))
+    finally:
+        os.unlink(path)
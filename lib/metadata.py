@@ -0,0 +1,485 @@
+# -*- coding: utf-8 -*-
+#
+'''
+Image Metadata Classes
+
+Captions come from the EXIF and IPTC blocks at the start of a JPEG. They sit in APP segments in
+front of the image data, so a Range request for the first few kilobytes of an original is enough
+to read them. Metadata is kept in a small JSON file, so a gallery is only read once.
+'''
+#
+# Standard Imports
+#
+from __future__ import division, print_function
+import io
+import json
+import logging
+import os
+import struct
+import threading
+#
+# local directory imports here
+#
+from metrics import get_metrics
+from transport import get_transport
+#
+##############################################################################
+#
+# Global Variables
+#
+# JPEG markers
+SOI = 0xd8
+SOS = 0xda
+EOI = 0xd9
+APP1 = 0xe1
+APP13 = 0xed
+COM = 0xfe
+
+EXIF_HEADER = b'Exif\0\0'
+PHOTOSHOP_HEADER = b'Photoshop 3.0\0'
+
+# EXIF tags: IFD0, then the Exif sub-IFD
+EXIF_IFD = 0x8769
+IFD0_TAGS = {
+    0x010e: 'description',
+    0x010f: 'make',
+    0x0110: 'model',
+    0x0132: 'modified',
+    0x013b: 'artist',
+}
+EXIF_TAGS = {
+    0x829a: 'exposure_time',
+    0x829d: 'f_number',
+    0x8827: 'iso',
+    0x9003: 'taken',
+    0x920a: 'focal_length',
+    0xa434: 'lens',
+}
+
+# IPTC IIM application record (2) datasets
+IPTC_RESOURCE = 0x0404
+IPTC_TAGS = {
+    5: 'title',
+    80: 'byline',
+    120: 'caption',
+}
+#
+##############################################################################
+#
+# header_segments()
+#
+def header_segments(data=None):
+    '''
+    Find the APP1 and APP13 segments at the start of a JPEG
+
+    Args:
+        data (bytes): The start of the file
+
+    Returns:
+        tuple: (list of (marker, payload), bytes needed to read further or 0 if every metadata
+            segment was found)
+
+    Raises:
+        ValueError: If the data is not a JPEG
+    '''
+    if data[:2] != b'\xff' + bytes((SOI,)):
+        raise ValueError('not a JPEG')
+
+    segments = []
+    pos = 2
+    while True:
+        if pos + 4 > len(data):
+            return segments, pos + 4
+        if data[pos] != 0xff:
+            raise ValueError('no marker at {}'.format(pos))
+        marker = data[pos + 1]
+        if marker == 0xff:
+            # fill byte
+            pos += 1
+            continue
+        # metadata lives in APPn and COM segments, which come before the tables and image data
+        if marker in [SOS, EOI] or not (0xe0 <= marker <= 0xef or marker == COM):
+            return segments, 0
+
+        end = pos + 2 + struct.unpack_from('>H', data, pos + 2)[0]
+        if end > len(data):
+            return segments, end
+        if marker in [APP1, APP13]:
+            segments.append((marker, bytes(data[pos + 4:end])))
+        pos = end
+#
+##############################################################################
+#
+# _rational()
+#
+def _rational(value=None):
+    '''Turn an EXIF rational into a float, or None if it is not a number'''
+    try:
+        return float(value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+#
+##############################################################################
+#
+# _text()
+#
+def _text(value=None):
+    '''Turn an EXIF or IPTC string into stripped text, or None if it is empty'''
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', 'replace')
+    if not isinstance(value, str):
+        return None
+    value = value.replace('\0', '').strip()
+    return value if value else None
+#
+##############################################################################
+#
+# parse_exif()
+#
+def parse_exif(payload=None):
+    '''
+    Args:
+        payload (bytes): APP1 segment payload starting with the EXIF header
+
+    Returns:
+        dict: Metadata fields found, raw
+    '''
+    # pylint: disable=import-outside-toplevel
+    from PIL import Image
+
+    exif = Image.Exif()
+    exif.load(payload)
+    found = {}
+    for tags, ifd in [(IFD0_TAGS, exif), (EXIF_TAGS, exif.get_ifd(EXIF_IFD))]:
+        for tag, name in tags.items():
+            if tag in ifd:
+                found[name] = ifd[tag]
+    return found
+#
+##############################################################################
+#
+# parse_iptc()
+#
+def parse_iptc(payload=None):
+    '''
+    Args:
+        payload (bytes): APP13 segment payload starting with the Photoshop header
+
+    Returns:
+        dict: Metadata fields found, raw
+    '''
+    found = {}
+    pos = len(PHOTOSHOP_HEADER)
+    # image resource blocks: '8BIM', id, padded Pascal name, length, padded data
+    while pos + 12 <= len(payload) and payload[pos:pos + 4] == b'8BIM':
+        resource = struct.unpack_from('>H', payload, pos + 4)[0]
+        name_length = payload[pos + 6]
+        pos += 6 + name_length + 1 + (name_length + 1) % 2
+        if pos + 4 > len(payload):
+            break
+        length = struct.unpack_from('>I', payload, pos)[0]
+        block = payload[pos + 4:pos + 4 + length]
+        pos += 4 + length + length % 2
+        if resource != IPTC_RESOURCE:
+            continue
+
+        # IIM datasets: 0x1c, record, dataset, length, data
+        offset = 0
+        while offset + 5 <= len(block) and block[offset] == 0x1c:
+            record, dataset, size = struct.unpack_from('>BBH', block, offset + 1)
+            value = block[offset + 5:offset + 5 + size]
+            offset += 5 + size
+            if record == 2 and dataset in IPTC_TAGS:
+                found.setdefault(IPTC_TAGS[dataset], value)
+    return found
+#
+##############################################################################
+#
+# read_metadata()
+#
+def read_metadata(data=None):
+    '''
+    Read the caption fields of a JPEG from its first bytes
+
+    Args:
+        data (bytes): The start of the file, or all of it
+
+    Returns:
+        tuple: (dict of caption fields, bytes needed to read further or 0 if done). Only
+            fields present in the image are set: title, caption, artist, camera, lens,
+            exposure and date.
+
+    Raises:
+        ValueError: If the data is not a JPEG
+    '''
+    segments, needed = header_segments(data)
+
+    found = {}
+    for marker, payload in segments:
+        # pylint: disable=broad-except
+        try:
+            if marker == APP1 and payload.startswith(EXIF_HEADER):
+                found.update(parse_exif(payload))
+            elif marker == APP13 and payload.startswith(PHOTOSHOP_HEADER):
+                found.update(parse_iptc(payload))
+        except Exception as err:
+            # a broken block loses its own fields, not the others
+            logging.getLogger(__name__).debug("Unreadable metadata segment: '%s'", err)
+
+    meta = {}
+    for name in ['title', 'caption', 'artist', 'lens']:
+        meta[name] = _text(found.get(name))
+    meta['caption'] = meta['caption'] or _text(found.get('description'))
+    meta['artist'] = meta['artist'] or _text(found.get('byline'))
+
+    make, model = _text(found.get('make')), _text(found.get('model'))
+    if make and model and model.lower().startswith(make.split()[0].lower()):
+        # 'Canon' 'Canon EOS R5' and the like
+        make = None
+    meta['camera'] = ' '.join(part for part in [make, model] if part) or None
+
+    exposure = []
+    f_number = _rational(found.get('f_number'))
+    if f_number:
+        exposure.append('f/{:g}'.format(round(f_number, 1)))
+    exposure_time = _rational(found.get('exposure_time'))
+    if exposure_time:
+        exposure.append('1/{:d}s'.format(round(1 / exposure_time)) if exposure_time < 0.5 else
+                        '{:g}s'.format(round(exposure_time, 1)))
+    if isinstance(found.get('iso'), int):
+        exposure.append('ISO {}'.format(found['iso']))
+    focal_length = _rational(found.get('focal_length'))
+    if focal_length:
+        exposure.append('{:g}mm'.format(round(focal_length)))
+    meta['exposure'] = ' '.join(exposure) or None
+
+    # EXIF dates are 'YYYY:MM:DD HH:MM:SS'
+    taken = _text(found.get('taken')) or _text(found.get('modified'))
+    meta['date'] = taken[:10].replace(':', '-') + taken[10:16] if taken else None
+
+    return dict((name, value) for name, value in meta.items() if value), needed
+#
+##############################################################################
+#
+# caption_lines()
+#
+def caption_lines(meta=None):
+    '''
+    Args:
+        meta (dict): Caption fields from read_metadata(), plus the feed title
+
+    Returns:
+        list: Lines of text to show, empty if there is nothing to say
+    '''
+    if not meta:
+        return []
+    lines = [meta.get('title'), meta.get('caption'),
+             ' · '.join(meta[name] for name in ['camera', 'lens', 'exposure'] if meta.get(name)),
+             ' · '.join(meta[name] for name in ['date', 'artist'] if meta.get(name))]
+    seen = []
+    for line in lines:
+        if line and line not in seen:
+            seen.append(line)
+    return seen
+#
+##############################################################################
+#
+# MetadataCache
+#
+class MetadataCache(object):
+    '''
+    MetadataCache - caption fields of every image, read once and kept between runs
+
+    fetch() asks for the first HEAD_BYTES of an image and only for more when its metadata runs
+    past them. A server that ignores the Range header still only has HEAD_BYTES read from it
+    before the connection is dropped.
+    '''
+    #
+    ####################################################################################
+    #
+    # Class variables
+    #
+    # Bytes asked for first: enough for EXIF, IPTC and an EXIF thumbnail
+    HEAD_BYTES = 64 * 1024
+
+    # Give up on images whose metadata runs past this
+    MAX_HEAD_BYTES = 1024 * 1024
+
+    # Images to read at once
+    WORKERS = 1
+    #
+    ####################################################################################
+    #
+    # __init__()
+    #
+    def __init__(self, path=None):
+        '''
+        Args:
+            path (str): JSON file to keep the metadata in between runs. Default: memory only
+        '''
+        super(MetadataCache, self).__init__()
+
+        self._logger = logging.getLogger(type(self).__name__)
+
+        self._path = path
+        self._lock = threading.Lock()
+        # entry id -> caption fields, empty for images without any
+        self._entries = {}
+        self._changed = False
+        self._fetches = 0
+        self._bytes = 0
+
+        if None not in [path]:
+            self.load()
+    #
+    ####################################################################################
+    #
+    # _read_range()
+    #
+    def _read_range(self, url=None, start=0, length=None):
+        '''
+        Returns:
+            bytes: Up to length bytes of the image from start on, HEAD_BYTES by default
+        '''
+        length = self.HEAD_BYTES if None in [length] else length
+        headers = {'Range': 'bytes={}-{}'.format(start, start + length - 1)}
+        with get_transport().get(url, headers=headers, stream=True) as response:
+            response.raise_for_status()
+            if start and response.status_code != 206:
+                # the whole image again: skip what is already here
+                response.raw.read(start)
+            data = response.raw.read(length)
+        with self._lock:
+            self._fetches += 1
+            self._bytes += len(data)
+        return data
+    #
+    ####################################################################################
+    #
+    # fetch()
+    #
+    def fetch(self, key=None, url=None):
+        '''
+        Read the metadata of an image unless it is known already
+
+        Args:
+            key (str): Entry id of the image
+            url (str): URL of the image, the original or largest rendition
+
+        Returns:
+            dict: Caption fields, empty if the image has none or could not be read
+        '''
+        import requests # pylint: disable=import-outside-toplevel
+
+        meta = self.get(key)
+        if None not in [meta]:
+            return meta
+
+        try:
+            with get_metrics().span('metadata'):
+                data = self._read_range(url)
+                meta, needed = read_metadata(data)
+                while needed and len(data) < needed <= self.MAX_HEAD_BYTES:
+                    more = self._read_range(url, len(data), max(needed - len(data),
+                                                                 self.HEAD_BYTES))
+                    if not more:
+                        break
+                    data += more
+                    meta, needed = read_metadata(data)
+        except requests.RequestException as err:
+            # not remembered, so it is tried again next time round
+            self._logger.warning("Reading metadata of '%s' failed: '%s'", url, err)
+            return {}
+        except ValueError as err:
+            self._logger.info("No metadata in '%s': '%s'", url, err)
+            meta = {}
+
+        self.put(key, meta)
+        return meta
+    #
+    ####################################################################################
+    #
+    # get()
+    #
+    def get(self, key=None):
+        '''
+        Args:
+            key (str): Entry id of the image
+
+        Returns:
+            dict: Caption fields or None if the image has not been read yet
+        '''
+        with self._lock:
+            return self._entries.get(key)
+    #
+    ####################################################################################
+    #
+    # put()
+    #
+    def put(self, key=None, meta=None):
+        '''
+        Args:
+            key (str): Entry id of the image
+            meta (dict): Caption fields
+        '''
+        with self._lock:
+            self._entries[key] = dict(meta)
+            self._changed = True
+    #
+    ####################################################################################
+    #
+    # load()
+    #
+    def load(self):
+        '''Start from the metadata an earlier run read'''
+        try:
+            with io.open(self._path, encoding='utf-8') as meta_file:
+                entries = json.load(meta_file)
+        except (OSError, ValueError) as err:
+            self._logger.info("No saved metadata loaded: '%s'", err)
+            return
+
+        if isinstance(entries, dict):
+            with self._lock:
+                self._entries.update((key, meta) for key, meta in entries.items()
+                                     if isinstance(meta, dict))
+        self._logger.info("Loaded metadata of %d images", len(self._entries))
+    #
+    ####################################################################################
+    #
+    # save()
+    #
+    def save(self):
+        '''Keep what has been read for the next run'''
+        if None in [self._path] or not self._changed:
+            return
+
+        with self._lock:
+            entries = dict(self._entries)
+            self._changed = False
+
+        tmp_path = '{}.tmp'.format(self._path)
+        try:
+            with io.open(tmp_path, 'w', encoding='utf-8') as meta_file:
+                json.dump(entries, meta_file, ensure_ascii=False)
+            os.replace(tmp_path, self._path)
+        except OSError as err:
+            self._logger.warning("Saving metadata failed: '%s'", err)
+    #
+    ####################################################################################
+    #
+    # stats()
+    #
+    def stats(self):
+        '''
+        Returns:
+            dict: Images known, range requests made and bytes they read
+        '''
+        return {'entries': len(self._entries), 'fetches': self._fetches, 'bytes': self._bytes}
+    #
+    ##############################################################################
+    ##############################################################################
+    #
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
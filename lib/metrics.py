@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+#
+'''
+Hot Path Metrics Classes
+'''
+#
+# Standard Imports
+#
+from __future__ import division, print_function
+from bisect import bisect_left
+import logging
+import os
+import threading
+import time
+#
+##############################################################################
+#
+# Histogram
+#
+class Histogram(object):
+    '''
+    Histogram - count observations in fixed buckets, like a Prometheus histogram
+
+    Not thread safe on its own; Metrics serializes access.
+    '''
+    #
+    ####################################################################################
+    #
+    # Class variables
+    #
+    # Upper bounds in seconds, from a blit to a slow download
+    BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+               30)
+    #
+    ####################################################################################
+    #
+    # __init__()
+    #
+    def __init__(self, buckets=BUCKETS):
+        '''
+        Args:
+            buckets (tuple): Increasing upper bounds of the buckets. One for larger values
+                is added.
+        '''
+        super(Histogram, self).__init__()
+
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+    #
+    ####################################################################################
+    #
+    # observe()
+    #
+    def observe(self, value=None):
+        '''
+        Args:
+            value (float): Observation to count
+        '''
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+    #
+    ####################################################################################
+    #
+    # quantile()
+    #
+    def quantile(self, quantile=None):
+        '''
+        Estimate a quantile by interpolating within its bucket, like histogram_quantile()
+
+        Args:
+            quantile (float): Between 0 and 1
+
+        Returns:
+            float: The estimate or None if nothing was observed
+        '''
+        if not self.count:
+            return None
+
+        rank = quantile * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if index == len(self.buckets):
+                    # no upper bound to interpolate to
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+#
+##############################################################################
+#
+# Spans
+#
+class _Span(object):
+    '''Time a with block and observe it under a stage name'''
+    __slots__ = ('_metrics', '_name', '_start')
+
+    def __init__(self, metrics=None, name=None):
+        self._metrics = metrics
+        self._name = name
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self._metrics.observe(self._name, time.perf_counter() - self._start)
+        return False
+
+class _NullSpan(object):
+    '''Span of disabled metrics: does nothing'''
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+_NULL_SPAN = _NullSpan()
+#
+##############################################################################
+#
+# Metrics
+#
+class Metrics(object):
+    '''
+    Metrics - time the stages of the hot path and export them with other counters
+
+    span() times a with block and keeps the time in a histogram per stage. Collectors add the
+    counters other classes already keep, e.g. the cache statistics, when metrics are exported.
+    Everything can be served in the Prometheus text format on a local port, written to a file for
+    the node exporter textfile collector, or summarized for an on-screen overlay.
+
+    Disabled metrics hand out a span that does nothing, so the instrumented code costs a function
+    call per stage.
+    '''
+    #
+    ####################################################################################
+    #
+    # Class variables
+    #
+    PREFIX = 'smug_slideshow'
+    ADDRESS = '127.0.0.1'
+    #
+    ####################################################################################
+    #
+    # __init__()
+    #
+    def __init__(self, enabled=False):
+        '''
+        Args:
+            enabled (bool): Record spans
+        '''
+        super(Metrics, self).__init__()
+
+        self._logger = logging.getLogger(type(self).__name__)
+
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # stage name -> Histogram, in the order stages were first seen
+        self._histograms = {}
+        # name -> (callable returning a dict of numbers, names in it that only ever grow)
+        self._collectors = {}
+        self._server = None
+    #
+    ####################################################################################
+    #
+    # span()
+    #
+    def span(self, name=None):
+        '''
+        Args:
+            name (str): Stage name
+
+        Returns:
+            context manager: Times its with block as the stage
+        '''
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+    #
+    ####################################################################################
+    #
+    # observe()
+    #
+    def observe(self, name=None, seconds=None):
+        '''
+        Record the time a stage took
+
+        Args:
+            name (str): Stage name
+            seconds (float): Time it took
+        '''
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if None in [histogram]:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+    #
+    ####################################################################################
+    #
+    # add_collector()
+    #
+    def add_collector(self, name=None, collect=None, counters=()):
+        '''
+        Export numbers another class keeps. Adding a name again replaces the collector.
+
+        Args:
+            name (str): Prefix of the exported names, e.g. 'cache'
+            collect (callable): Returns a dict of names and numbers
+            counters (tuple): Names in the dict that only ever grow, exported as counters. The
+                rest are exported as gauges.
+        '''
+        with self._lock:
+            self._collectors[name] = (collect, frozenset(counters))
+    #
+    ####################################################################################
+    #
+    # _collect()
+    #
+    def _collect(self):
+        '''
+        Returns:
+            list: (name, value, True if it only ever grows) of every collected number
+        '''
+        with self._lock:
+            collectors = list(self._collectors.items())
+
+        values = []
+        for prefix, (collect, counters) in collectors:
+            # pylint: disable=broad-except
+            try:
+                collected = collect()
+            except Exception as err:
+                self._logger.warning("Collecting '%s' failed: '%s'", prefix, err)
+                continue
+            for name, value in sorted(collected.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    values.append(('{}_{}'.format(prefix, name), value, name in counters))
+        return values
+    #
+    ####################################################################################
+    #
+    # stages()
+    #
+    def stages(self):
+        '''
+        Returns:
+            dict: Stage name -> (count, mean seconds, p95 seconds) of every stage observed
+        '''
+        with self._lock:
+            return {name: (histogram.count, histogram.sum / histogram.count,
+                           histogram.quantile(0.95))
+                    for name, histogram in self._histograms.items() if histogram.count}
+    #
+    ####################################################################################
+    #
+    # summary()
+    #
+    def summary(self):
+        '''
+        Returns:
+            list: Lines of text with the count, mean and p95 of every stage in milliseconds and
+                every collected number, for an overlay
+        '''
+        lines = ['{:<12} {:>6} {:>9} {:>9}'.format('stage', 'count', 'mean ms', 'p95 ms')]
+        for name, (count, mean, p95) in self.stages().items():
+            lines.append('{:<12} {:>6} {:>9.1f} {:>9.1f}'.format(name, count, mean * 1000,
+                                                                  p95 * 1000))
+        for name, value, _ in self._collect():
+            lines.append('{:<22} {:>10}'.format(
+                name, '{:.3f}'.format(value) if isinstance(value, float) else value))
+        return lines
+    #
+    ####################################################################################
+    #
+    # exposition()
+    #
+    def exposition(self):
+        '''
+        Returns:
+            str: Every stage histogram and collected number in the Prometheus text format
+        '''
+        with self._lock:
+            histograms = [(name, histogram.buckets, list(histogram.counts), histogram.sum,
+                           histogram.count)
+                          for name, histogram in sorted(self._histograms.items())]
+
+        name = '{}_stage_seconds'.format(self.PREFIX)
+        lines = ['# HELP {} Time spent in each stage of the hot path'.format(name),
+                 '# TYPE {} histogram'.format(name)]
+        for stage, buckets, counts, total, count in histograms:
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append('{}_bucket{{stage="{}",le="{}"}} {}'.format(name, stage, bound,
+                                                                         cumulative))
+            lines.append('{}_sum{{stage="{}"}} {}'.format(name, stage, total))
+            lines.append('{}_count{{stage="{}"}} {}'.format(name, stage, count))
+
+        for collected, value, counter in self._collect():
+            name = '{}_{}'.format(self.PREFIX, collected)
+            if counter:
+                name += '_total'
+            lines.append('# TYPE {} {}'.format(name, 'counter' if counter else 'gauge'))
+            lines.append('{} {}'.format(name, value))
+        return '\n'.join(lines) + '\n'
+    #
+    ####################################################################################
+    #
+    # write_textfile()
+    #
+    def write_textfile(self, path=None):
+        '''
+        Write the exposition to a file, replacing it atomically so a reader never sees half of it
+
+        Args:
+            path (str): File to write, e.g. in the node exporter textfile directory
+        '''
+        tmp_path = '{}.tmp'.format(path)
+        try:
+            with open(tmp_path, 'w') as metrics_file:
+                metrics_file.write(self.exposition())
+            os.replace(tmp_path, path)
+        except OSError as err:
+            self._logger.warning("Writing metrics failed: '%s'", err)
+    #
+    ####################################################################################
+    #
+    # serve()
+    #
+    def serve(self, port=None, address=ADDRESS):
+        '''
+        Serve the exposition at /metrics on a background thread
+
+        Args:
+            port (int): Port to listen on
+            address (str): Address to listen on. Default: local connections only
+        '''
+        # only needed when serving
+        # pylint: disable=import-outside-toplevel
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            '''Answer scrapes'''
+            def do_GET(self): # pylint: disable=invalid-name
+                '''Send the exposition'''
+                if self.path.split('?')[0] not in ['/', '/metrics']:
+                    self.send_error(404)
+                    return
+                body = metrics.exposition().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args): # pylint: disable=arguments-differ
+                pass
+
+        self._server = ThreadingHTTPServer((address, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='metrics', daemon=True).start()
+        self._logger.info("Serving metrics on http://%s:%d/metrics", address,
+                          self._server.server_address[1])
+    #
+    ####################################################################################
+    #
+    # close()
+    #
+    def close(self):
+        '''Stop serving'''
+        if None not in [self._server]:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+#
+##############################################################################
+#
+# Shared metrics
+#
+_METRICS = Metrics()
+
+def configure_metrics(**kwargs):
+    '''
+    Replace the shared metrics
+
+    Args:
+        kwargs: Passed on to Metrics()
+
+    Returns:
+        Metrics: The new shared metrics
+    '''
+    global _METRICS # pylint: disable=global-statement
+    _METRICS.close()
+    _METRICS = Metrics(**kwargs)
+    return _METRICS
+
+def get_metrics():
+    '''
+    Returns:
+        Metrics: The shared metrics, disabled unless configured
+    '''
+    return _METRICS
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+#
+'''
+Playlist Ordering
+
+A plain shuffle ignores what is cached, so on a slow or metered link most slides are downloads.
+The cached order plays the show in passes: every image already on hand, shuffled, with images
+that still need downloading spread between them no closer than the link can fetch them. Images
+left out wait for a later pass, longest waiting first, so over time every image is shown.
+'''
+#
+# Standard Imports
+#
+from __future__ import division, print_function
+import random
+#
+##############################################################################
+#
+# Global Variables
+#
+# Playlist orders: a shuffle of every image, or passes that favour cached images
+ORDERS = ('shuffle', 'cached')
+ORDER = 'shuffle'
+
+# Slides before an image may come round again, and the shortest pass
+WINDOW = 20
+#
+##############################################################################
+#
+# cached_order()
+#
+# pylint: disable=too-many-arguments,too-many-locals
+def cached_order(entries=None, cached=None, spacing=1, recent=None, window=WINDOW, rng=random):
+    '''
+    Plan a pass of the show that favours cached images
+
+    Args:
+        entries (list): Every gallery entry, images still to download in the order they should
+            get their turn
+        cached (callable): cached(entry) is True if the image can be shown without downloading it
+        spacing (int): Slides the link needs to download one image
+        recent (list): Entry ids shown last, kept out of the start of the pass
+        window (int): Shortest pass, and how far into it recent images are kept out of
+        rng (random.Random): Source of randomness
+
+    Returns:
+        tuple: (entries of the pass, entries left for later passes in the order they wait)
+    '''
+    # downloads carry on while planning: decide once what counts as cached
+    on_hand = set(entry.entry_id for entry in entries if cached(entry))
+    hits = [entry for entry in entries if entry.entry_id in on_hand]
+    misses = [entry for entry in entries if entry.entry_id not in on_hand]
+    rng.shuffle(hits)
+
+    # every download gets spacing - 1 cached slides to itself
+    if spacing > 1:
+        count = min(len(misses), len(hits) // (spacing - 1))
+    else:
+        count = len(misses)
+    # a handful of cached images on their own would repeat too soon
+    count = max(count, min(len(misses), window - len(hits)))
+    chosen, waiting = misses[:count], misses[count:]
+    rng.shuffle(chosen)
+
+    # spread the downloads evenly, from a random start
+    length = len(hits) + len(chosen)
+    playlist = []
+    if chosen:
+        step = length / len(chosen)
+        start = rng.random() * step
+        slots = set(int(start + index * step) for index in range(len(chosen)))
+        hits, chosen = iter(hits), iter(chosen)
+        playlist = [next(chosen) if pos in slots else next(hits) for pos in range(length)]
+    else:
+        playlist = hits
+
+    # nothing shown at the end of the last pass comes back at the start of this one
+    recent = set(recent if recent else [])
+    head = min(window, length // 2)
+    for pos in range(head):
+        if playlist[pos].entry_id not in recent:
+            continue
+        kind = playlist[pos].entry_id in on_hand
+        swaps = [other for other in range(head, length)
+                 if playlist[other].entry_id not in recent and
+                 (playlist[other].entry_id in on_hand) == kind]
+        if swaps:
+            other = rng.choice(swaps)
+            playlist[pos], playlist[other] = playlist[other], playlist[pos]
+
+    return playlist, waiting
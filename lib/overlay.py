@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+#
+'''
+Overlay Classes
+
+Text drawn over the photos. Rendered text is cached, and a region whose text changed is redrawn
+and sent to the screen on its own, so a clock over a photo updates a few thousand pixels instead
+of the whole display.
+'''
+#
+# Standard Imports
+#
+from __future__ import division, print_function
+from collections import OrderedDict
+import logging
+#
+# Non-standard imports
+#
+import pygame
+#
+# local directory imports here
+#
+from cache import LruCache
+#
+##############################################################################
+#
+# TextCache
+#
+class TextCache(object):
+    '''
+    TextCache - rendered text surfaces, least recently used first out
+
+    A font object stands for its face and size, so (font, text, antialias, color) is the key.
+    Surfaces are counted by their pixel memory.
+    '''
+    #
+    ####################################################################################
+    #
+    # Class variables
+    #
+    # Maximum size of the rendered text to keep (in bytes)
+    MAX_SIZE = 4 * 1024 * 1024
+    #
+    ####################################################################################
+    #
+    # __init__()
+    #
+    def __init__(self, max_size=MAX_SIZE):
+        '''
+        Args:
+            max_size (int): Maximum size of the rendered text to keep (in bytes)
+        '''
+        super(TextCache, self).__init__()
+
+        self._cache = LruCache(max_size=max_size)
+    #
+    ####################################################################################
+    #
+    # render()
+    #
+    def render(self, font=None, text=None, color=pygame.Color('white'), antialias=True):
+        '''
+        Args:
+            font (pygame.font.Font): Font to render with
+            text (str): One line of text
+            color (pygame.Color): Text color
+            antialias (bool): Smooth the edges
+
+        Returns:
+            pygame.Surface: The rendered text, shared: it must not be drawn on
+        '''
+        color = tuple(pygame.Color(color))
+        key = (font, text, bool(antialias), color)
+        rendered = self._cache.get(key)
+        if None in [rendered]:
+            rendered = font.render(text, antialias, color)
+            self._cache.put(key, rendered, size=rendered.get_pitch() * rendered.get_height())
+        return rendered
+    #
+    ####################################################################################
+    #
+    # stats()
+    #
+    def stats(self):
+        '''
+        Returns:
+            dict: Entry count, size and hit/miss/eviction counters
+        '''
+        return self._cache.stats()
+#
+##############################################################################
+#
+# Shared text cache
+#
+_TEXT_CACHE = TextCache()
+
+def get_text_cache():
+    '''
+    Returns:
+        TextCache: The text cache shared by everything drawn on the display
+    '''
+    return _TEXT_CACHE
+#
+##############################################################################
+#
+# Overlay
+#
+class Overlay(object):
+    '''
+    Overlay - blocks of text in the corners of the display, over the picture
+
+    set() only marks a region dirty when what it shows changed. draw() puts the picture back
+    where the old text of dirty regions was, draws their new text and returns the rectangles that
+    changed, for pygame.display.update(). Regions a restored rectangle cut into are drawn again
+    too.
+    '''
+    #
+    ####################################################################################
+    #
+    # Class variables
+    #
+    # Where regions may sit: pygame.Rect attributes of the display rectangle
+    ANCHORS = ('topleft', 'topright', 'bottomleft', 'bottomright', 'midtop', 'midbottom')
+
+    # Pixels between a region and the display edge, and between its text and its edge
+    MARGIN = 10
+    PADDING = 10
+
+    # Opacity of the dimmed background behind a region's text
+    BACKGROUND_ALPHA = 160
+    #
+    ####################################################################################
+    #
+    # __init__()
+    #
+    def __init__(self, surface=None, texts=None):
+        '''
+        Args:
+            surface (pygame.Surface): Display surface to draw on
+            texts (TextCache): Rendered text cache. Default: the shared one
+        '''
+        super(Overlay, self).__init__()
+
+        if None in [surface]:
+            raise RuntimeError("Need a surface to proceed!")
+
+        self._logger = logging.getLogger(type(self).__name__)
+
+        self._surface = surface
+        self._texts = get_text_cache() if None in [texts] else texts
+        # the picture under the regions and where it is on the display
+        self._picture = None
+        self._picture_pos = None
+        # name -> region, drawn in the order they were first set
+        self._regions = OrderedDict()
+    #
+    ####################################################################################
+    #
+    # set_picture()
+    #
+    def set_picture(self, picture=None, pos=None):
+        '''
+        Tell the overlay a new picture was drawn over the whole display. Every region is drawn
+            again on top of it.
+
+        Args:
+            picture (pygame.Surface): The picture, or None for a black display
+            pos (pygame.Rect): Where it is on the display
+        '''
+        self._picture = picture
+        self._picture_pos = pos
+        for region in self._regions.values():
+            region['rect'] = None
+            region['dirty'] = True
+    #
+    ####################################################################################
+    #
+    # set()
+    #
+    # pylint: disable=too-many-arguments
+    def set(self, name=None, lines=None, font=None, anchor='topleft',
+            color=pygame.Color('white'), background=True):
+        '''
+        Show lines of text in a region, replacing what it showed
+
+        Args:
+            name (str): Region name
+            lines (list): Lines of text. Empty clears the region.
+            font (pygame.font.Font): Font to render with
+            anchor (str): One of ANCHORS
+            color (pygame.Color): Text color
+            background (bool): Dim the picture behind the text
+        '''
+        if anchor not in self.ANCHORS:
+            raise RuntimeError("Unknown anchor '{}'".format(anchor))
+
+        shown = (tuple(lines or ()), font, anchor, tuple(pygame.Color(color)), background)
+        region = self._regions.get(name)
+        if None in [region]:
+            region = self._regions[name] = {'shown': None, 'rect': None}
+        elif region['shown'] == shown:
+            return
+        region['shown'] = shown
+        region['dirty'] = True
+    #
+    ####################################################################################
+    #
+    # remove()
+    #
+    def remove(self, name=None):
+        '''
+        Stop showing a region
+
+        Args:
+            name (str): Region name
+        '''
+        if name in self._regions:
+            self.set(name, (), *self._regions[name]['shown'][1:])
+    #
+    ####################################################################################
+    #
+    # _restore()
+    #
+    def _restore(self, rect=None):
+        '''Put the picture, or black around it, back in a rectangle of the display'''
+        self._surface.fill(pygame.Color('black'), rect)
+        if None not in [self._picture]:
+            area = rect.move(-self._picture_pos[0], -self._picture_pos[1])
+            self._surface.blit(self._picture, rect.topleft, area)
+    #
+    ####################################################################################
+    #
+    # _draw_region()
+    #
+    def _draw_region(self, region=None):
+        '''
+        Returns:
+            pygame.Rect: Where the region was drawn or None if it shows nothing
+        '''
+        lines, font, anchor, color, background = region['shown']
+        if not lines:
+            return None
+
+        rendered = [self._texts.render(font, line, color) for line in lines]
+        rect = pygame.Rect(0, 0, max(line.get_width() for line in rendered) + 2 * self.PADDING,
+                           sum(line.get_height() for line in rendered) + 2 * self.PADDING)
+        inside = self._surface.get_rect().inflate(-2 * self.MARGIN, -2 * self.MARGIN)
+        setattr(rect, anchor, getattr(inside, anchor))
+
+        if background:
+            dim = pygame.Surface(rect.size)
+            dim.set_alpha(self.BACKGROUND_ALPHA)
+            dim.fill(pygame.Color('black'))
+            self._surface.blit(dim, rect.topleft)
+
+        current_y = rect.top + self.PADDING
+        for line in rendered:
+            self._surface.blit(line, (rect.left + self.PADDING, current_y))
+            current_y += line.get_height()
+        return rect
+    #
+    ####################################################################################
+    #
+    # draw()
+    #
+    def draw(self):
+        '''
+        Draw every dirty region
+
+        Returns:
+            list: Rectangles of the display that changed
+        '''
+        dirty = [region for region in self._regions.values() if region['dirty']]
+        if not dirty:
+            return []
+
+        # a clean region overlapping a restored rectangle loses part of its text, and restoring
+        # its own rectangle may cut into another
+        restored = [region['rect'] for region in dirty if None not in [region['rect']]]
+        overlapping = True
+        while overlapping:
+            overlapping = [region for region in self._regions.values()
+                           if not region['dirty'] and None not in [region['rect']] and
+                           region['rect'].collidelist(restored) >= 0]
+            for region in overlapping:
+                region['dirty'] = True
+                restored.append(region['rect'])
+                dirty.append(region)
+
+        for rect in restored:
+            self._restore(rect)
+
+        changed = list(restored)
+        for region in dirty:
+            region['rect'] = self._draw_region(region)
+            region['dirty'] = False
+            if None not in [region['rect']]:
+                changed.append(region['rect'])
+
+        for name in [name for name, region in self._regions.items() if not region['shown'][0]]:
+            del self._regions[name]
+        return changed
+    #
+    ##############################################################################
+    ##############################################################################
+    #
+    @property
+    def dirty(self):
+        '''bool: True if a region changed since it was last drawn'''
+        return any(region['dirty'] for region in self._regions.values())
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+#
+'''
+Prefetch Classes
+'''
+#
+# Standard Imports
+#
+from __future__ import print_function
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+#
+##############################################################################
+#
+# Prefetcher
+#
+class Prefetcher(object):
+    '''
+    Prefetcher - fetch upcoming images on a small worker pool
+
+    Jobs are keyed the same way as the slideshow cache. Scheduling a new window cancels any
+    queued job that is no longer wanted, so jumping around with the arrow keys does not leave
+    a backlog of stale downloads in front of the images that are actually needed.
+    '''
+    #
+    ####################################################################################
+    #
+    # __init__()
+    #
+    def __init__(self, fetch=None, workers=2):
+        '''
+        Args:
+            fetch (callable): Called as fetch(key, url) on a worker thread
+            workers (int): Maximum number of concurrent fetches
+        '''
+        super(Prefetcher, self).__init__()
+
+        if None in [fetch]:
+            raise RuntimeError("Need a fetch callable to proceed!")
+
+        self._logger = logging.getLogger(type(self).__name__)
+
+        self._fetch = fetch
+        self._lock = threading.RLock()
+        self._pending = {}
+        self._cancelled = 0
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers),
+                                            thread_name_prefix='prefetch')
+    #
+    ####################################################################################
+    #
+    # _done()
+    #
+    def _done(self, key, future):
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+        if not future.cancelled() and None not in [future.exception()]:
+            self._logger.warning("Prefetch of '%s' failed: '%s'", key, future.exception())
+    #
+    ####################################################################################
+    #
+    # schedule()
+    #
+    def schedule(self, wanted=None):
+        '''
+        Replace the prefetch window
+
+        Args:
+            wanted (list): (key, url) pairs in priority order
+        '''
+        wanted = wanted if wanted else []
+        wanted_keys = set(key for key, _ in wanted)
+
+        with self._lock:
+            # drop anything queued for the old window that has not started yet
+            for key, future in list(self._pending.items()):
+                if key not in wanted_keys and future.cancel():
+                    self._cancelled += 1
+                    self._logger.debug("Cancelled prefetch of '%s'", key)
+
+            for key, url in wanted:
+                if key in self._pending:
+                    continue
+                self._logger.debug("Prefetching '%s'", key)
+                future = self._executor.submit(self._fetch, key, url)
+                self._pending[key] = future
+                future.add_done_callback(lambda fut, key=key: self._done(key, fut))
+    #
+    ####################################################################################
+    #
+    # cancel()
+    #
+    def cancel(self):
+        '''Cancel every queued prefetch'''
+        self.schedule([])
+    #
+    ####################################################################################
+    #
+    # pending()
+    #
+    def pending(self, key=None):
+        '''
+        Find an in-flight fetch for a key
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            concurrent.futures.Future: Future for the fetch or None
+        '''
+        with self._lock:
+            return self._pending.get(key)
+    #
+    ####################################################################################
+    #
+    # shutdown()
+    #
+    def shutdown(self):
+        '''Cancel queued work and stop accepting new jobs'''
+        self.cancel()
+        self._executor.shutdown(wait=False)
+    #
+    ##############################################################################
+    ##############################################################################
+    #
+    @property
+    def cancelled(self):
+        '''int: number of queued prefetches cancelled so far'''
+        return self._cancelled
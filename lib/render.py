@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+#
+'''
+Render Pipeline Classes
+'''
+#
+# Standard Imports
+#
+from __future__ import print_function
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+import logging
+import multiprocessing
+import threading
+import time
+#
+# Non-standard imports
+#
+import pygame
+#
+# local directory imports here
+#
+from framepack import display_format
+from imaging import fit_size, map_shared, preload, scale_pixels, scale_shared, SCALE_QUALITY
+from metrics import get_metrics
+#
+##############################################################################
+#
+# Global Variables
+#
+# Posted when a frame for the current slide is ready, with key, frame, generation and preview
+# attributes
+FRAME_READY = pygame.USEREVENT + 1
+#
+##############################################################################
+#
+# Renderer
+#
+class Renderer(object):
+    '''
+    Renderer - fetch, decode and scale slides off the main thread
+
+    Each request() starts a new generation. Fetching runs on a small thread pool and the Pillow
+    decode and scale runs in worker processes, so neither holds up the event loop. Finished frames
+    go into the slideshow's frame cache and the one for the current slide is handed back with a
+    FRAME_READY event, leaving only the blit and flip to the main thread. Jobs from an older
+    generation are cancelled if they have not started and stop at their next step if they have.
+
+    While the current slide downloads, its smallest rendition is fetched alongside it, scaled up
+    to fill the display and posted first with preview set on the event. The full frame replaces
+    it when it is ready. Slides that are already on hand skip the preview.
+    '''
+    #
+    ####################################################################################
+    #
+    # Class variables
+    #
+    # Worker processes for decode and scale. 0 decodes on the render threads instead.
+    PROCESSES = 1
+
+    # Slides after the current one to render ahead of time
+    RENDER_AHEAD = 1
+
+    THREADS = 2
+
+    # Scaling quality for previews, which are small and replaced soon
+    PREVIEW_QUALITY = 'fast'
+    #
+    ####################################################################################
+    #
+    # __init__()
+    #
+    # pylint: disable=too-many-arguments
+    def __init__(self, slide_show=None, size=None, quality=SCALE_QUALITY, processes=PROCESSES,
+                 render_ahead=RENDER_AHEAD, preview=True, workers=None):
+        '''
+        Args:
+            slide_show (Slideshow): Slideshow to render slides of
+            size (tuple): Width and height of the display
+            quality (str): One of imaging.SCALE_QUALITIES
+            processes (int): Worker processes for decode and scale
+            render_ahead (int): Slides after the current one to render ahead of time
+            preview (bool): Show a small rendition while the full one loads
+            workers (ProcessPoolExecutor): Worker processes from start_workers(), started
+                earlier, to use instead of starting them here. The renderer shuts them down.
+        '''
+        super(Renderer, self).__init__()
+
+        if None in [slide_show, size]:
+            raise RuntimeError("Need a slide_show and size to proceed!")
+
+        self._logger = logging.getLogger(type(self).__name__)
+
+        self._slide_show = slide_show
+        self._size = tuple(size)
+        self._quality = quality
+        self._render_ahead = max(0, render_ahead)
+        self._preview = preview
+        # frames from a frame server come in the display's format, to blit without converting
+        surface = pygame.display.get_surface() if pygame.display.get_init() else None
+        self._pixel_format = (display_format(surface) if None not in [surface] else None) or 'RGB'
+
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._jobs = []
+        self._dropped = 0
+        self._closed = False
+
+        self._executor = ThreadPoolExecutor(max_workers=self.THREADS, thread_name_prefix='render')
+        # full size downloads that run while a preview is shown
+        self._fetcher = ThreadPoolExecutor(max_workers=self.THREADS, thread_name_prefix='fetch')
+        self._processes = workers
+        if None in [workers]:
+            self._processes = self.start_workers(processes)
+    #
+    ####################################################################################
+    #
+    # start_workers()
+    #
+    @staticmethod
+    def start_workers(processes=PROCESSES):
+        '''
+        Start the worker processes for decode and scale. Starting them takes a while, so this
+            can be called before there is a slideshow to render.
+
+        Args:
+            processes (int): Number of worker processes
+
+        Returns:
+            ProcessPoolExecutor: The workers or None to decode on the render threads
+        '''
+        if not processes or processes <= 0:
+            return None
+
+        # spawn: forking a process that already runs threads and SDL is not safe
+        workers = ProcessPoolExecutor(max_workers=processes,
+                                      mp_context=multiprocessing.get_context('spawn'))
+        # start the workers now, not on the first decode
+        for _ in range(processes):
+            workers.submit(preload)
+        return workers
+    #
+    ####################################################################################
+    #
+    # request()
+    #
+    def request(self):
+        '''
+        Ask for the current slide, dropping any work for earlier ones
+
+        Returns:
+            pygame.Surface: The frame if it is already rendered, otherwise None and a FRAME_READY
+                event follows once it is
+        '''
+        frame = self._slide_show.frame_get(size=self._size, quality=self._quality)
+
+        with self._lock:
+            self._generation += 1
+            for future in self._jobs:
+                if future.cancel():
+                    self._dropped += 1
+            self._jobs = [future for future in self._jobs if not future.done()]
+            if not self._closed:
+                self._jobs.append(self._executor.submit(self._render, self._generation,
+                                                        0 if None in [frame] else 1))
+        return frame
+    #
+    ####################################################################################
+    #
+    # _stale()
+    #
+    def _stale(self, generation=None):
+        return self._closed or generation != self._generation
+    #
+    ####################################################################################
+    #
+    # _drop()
+    #
+    def _drop(self):
+        '''Count a job that stopped early because a newer request replaced it'''
+        with self._lock:
+            self._dropped += 1
+    #
+    ####################################################################################
+    #
+    # _render()
+    #
+    def _render(self, generation=None, first=0):
+        '''
+        Render thread: render the current slide (unless first skips it) and the ones after it
+
+        Args:
+            generation (int): Generation the job belongs to
+            first (int): Offset of the first slide to render
+        '''
+        # a streamed gallery may not have its first entry yet
+        while not self._slide_show.wait_ready(0.5):
+            if self._stale(generation):
+                return self._drop()
+
+        for offset in range(first, self._render_ahead + 1):
+            if self._stale(generation):
+                return self._drop()
+
+            key, url = self._slide_show.image_ref(offset)
+            if None in [key]:
+                return None
+
+            frame = self._slide_show.frame_get(size=self._size, quality=self._quality, key=key)
+            if None in [frame]:
+                frame = self._shared_frame(key, url)
+            if None in [frame]:
+                if offset == 0 and self._preview and not self._slide_show.has_image(key):
+                    data = self._render_preview(generation, key, url)
+                else:
+                    data = self._slide_show.fetch(key, url)
+                if None in [data]:
+                    return None
+                if self._stale(generation):
+                    return self._drop()
+
+                start = time.perf_counter()
+                frame = self._scale(data)
+                if None in [frame]:
+                    continue
+                self._slide_show.observe_decode(key, time.perf_counter() - start)
+                self._slide_show.frame_put(size=self._size, quality=self._quality, frame=frame,
+                                           frame_size=frame.get_pitch() * frame.get_height(),
+                                           key=key)
+
+            if offset == 0:
+                if self._stale(generation):
+                    return self._drop()
+                self._post(key, frame, generation)
+        return None
+    #
+    ####################################################################################
+    #
+    # _shared_frame()
+    #
+    def _shared_frame(self, key=None, url=None):
+        '''
+        Take the frame from the slideshow's frame server, if it has one, and cache it
+
+        Returns:
+            pygame.Surface: The frame, backed by memory shared with the server, or None
+        '''
+        shared = self._slide_show.frame_fetch(size=self._size, quality=self._quality, key=key,
+                                              url=url, pixel_format=self._pixel_format)
+        if None in [shared]:
+            return None
+
+        pixels, frame_size, mode = shared
+        with get_metrics().span('surface'):
+            frame = pygame.image.frombuffer(pixels, frame_size, mode)
+        if mode == 'BGRA':
+            # the fourth byte is padding, not alpha: blit without blending
+            frame.set_alpha(None)
+        self._slide_show.frame_put(size=self._size, quality=self._quality, frame=frame,
+                                   frame_size=frame.get_pitch() * frame.get_height(), key=key)
+        return frame
+    #
+    ####################################################################################
+    #
+    # _render_preview()
+    #
+    def _render_preview(self, generation=None, key=None, url=None):
+        '''
+        Post a preview of the current slide while its full rendition downloads
+
+        Args:
+            generation (int): Generation the job belongs to
+            key (str): Cache key of the full rendition
+            url (str): URL of the full rendition
+
+        Returns:
+            bytes: Data of the full rendition or None
+        '''
+        full = self._fetcher.submit(self._slide_show.fetch, key, url)
+
+        preview_key, preview_url, full_size = self._slide_show.preview_ref()
+        if None not in [preview_key]:
+            data = self._slide_show.fetch(preview_key, preview_url)
+            if None not in [data] and not full.done() and not self._stale(generation):
+                # exactly the size the full frame will be, so swapping it in moves nothing
+                frame = self._scale(data, quality=self.PREVIEW_QUALITY,
+                                    size=fit_size(full_size, self._size))
+                if None not in [frame] and not full.done() and not self._stale(generation):
+                    self._logger.debug("Showing preview '%s'", preview_key)
+                    self._post(key, frame, generation, preview=True)
+
+        # pylint: disable=broad-except
+        try:
+            return full.result()
+        except Exception as err:
+            self._logger.error("Loading '%s' failed: '%s'", key, err)
+        return None
+    #
+    ####################################################################################
+    #
+    # _scale()
+    #
+    def _scale(self, data=None, quality=None, size=None):
+        '''
+        Decode and scale image data to fit the display
+
+        Args:
+            data (bytes): Compressed image data
+            quality (str): One of imaging.SCALE_QUALITIES. Default: the renderer's
+            size (tuple): Scale to exactly this size instead, up or down
+
+        Returns:
+            pygame.Surface: Scaled frame or None
+        '''
+        quality = self._quality if None in [quality] else quality
+        exact = None not in [size]
+        size = size if exact else self._size
+        processes = self._processes
+        metrics = get_metrics()
+        # pylint: disable=broad-except
+        try:
+            # Pillow decodes while it reduces and resizes, so they are timed as one stage
+            with metrics.span('decode'):
+                if None in [processes]:
+                    pixels, new_size, mode = scale_pixels(data, size, quality, exact)
+                else:
+                    # the frame comes back through shared memory, not pickled
+                    path, new_size, mode, length = processes.submit(scale_shared, data, size,
+                                                                    quality, exact).result()
+                    pixels = map_shared(path, length)
+            with metrics.span('surface'):
+                return pygame.image.frombuffer(pixels, new_size, mode)
+        except BrokenProcessPool as err:
+            self._logger.error("Render process failed, scaling on threads: '%s'", err)
+            self._processes = None
+            return self._scale(data, quality, size if exact else None)
+        except Exception as err:
+            self._logger.error("Scaling failed: '%s'", err)
+
+        # Pillow could not decode it; try pygame
+        try:
+            frame = pygame.image.load(BytesIO(data))
+            new_size = size if exact else fit_size(frame.get_size(), size)
+            if new_size != frame.get_size():
+                frame = pygame.transform.smoothscale(frame, new_size)
+            return frame
+        except (pygame.error, ValueError) as err:
+            self._logger.error("Scaling failed: '%s'", err)
+        return None
+    #
+    ####################################################################################
+    #
+    # _post()
+    #
+    def _post(self, key=None, frame=None, generation=None, preview=False):
+        try:
+            pygame.event.post(pygame.event.Event(FRAME_READY, key=key, frame=frame,
+                                                 generation=generation, preview=preview))
+        except pygame.error as err:
+            self._logger.warning("Could not post frame of '%s': '%s'", key, err)
+    #
+    ####################################################################################
+    #
+    # close()
+    #
+    def close(self):
+        '''Drop queued work and stop the render threads and processes'''
+        with self._lock:
+            self._closed = True
+            for future in self._jobs:
+                future.cancel()
+        self._logger.info("Dropped %d stale render jobs", self._dropped)
+        self._executor.shutdown(wait=False)
+        self._fetcher.shutdown(wait=False)
+        if None not in [self._processes]:
+            # waits for at most the decode in progress; not waiting breaks interpreter exit
+            self._processes.shutdown(wait=True)
+    #
+    ##############################################################################
+    ##############################################################################
+    #
+    @property
+    def generation(self):
+        '''int: generation of the latest request'''
+        return self._generation
+
+    @property
+    def dropped(self):
+        '''int: number of stale render jobs dropped so far'''
+        return self._dropped
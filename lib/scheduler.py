@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+#
+'''
+Cooperative Scheduler Classes
+'''
+#
+# Standard Imports
+#
+from __future__ import print_function
+import heapq
+import itertools
+import logging
+import time
+#
+##############################################################################
+#
+# Scheduler
+#
+class Scheduler(object):
+    '''
+    Scheduler - run background chores on the main thread when it has nothing else to do
+
+    Tasks are named. Scheduling a name again replaces the earlier task, so a chore asked for on
+    every slide change only runs once things settle. The event loop sleeps for timeout() seconds
+    at most, and calls run_pending() when that sleep ends without an event. hold() keeps every
+    task waiting for a while, e.g. while the user is paging through images.
+
+    Tasks must be quick: anything slow should only start work on another thread.
+    '''
+    #
+    ####################################################################################
+    #
+    # __init__()
+    #
+    def __init__(self, clock=time.monotonic):
+        '''
+        Args:
+            clock (callable): Returns the current time in seconds
+        '''
+        super(Scheduler, self).__init__()
+
+        self._logger = logging.getLogger(type(self).__name__)
+
+        self._clock = clock
+        # heap of (due, sequence, name)
+        self._queue = []
+        # name -> (sequence, func, interval)
+        self._tasks = {}
+        self._sequence = itertools.count()
+        self._hold_until = 0
+        self._runs = 0
+    #
+    ####################################################################################
+    #
+    # call_later()
+    #
+    def call_later(self, delay=0, func=None, name=None):
+        '''
+        Run a task once
+
+        Args:
+            delay (float): Seconds from now
+            func (callable): Called without arguments
+            name (str): Task name. Default: func's name
+        '''
+        self._add(delay, func, name, None)
+    #
+    ####################################################################################
+    #
+    # every()
+    #
+    def every(self, interval=None, func=None, name=None, delay=None):
+        '''
+        Run a task repeatedly
+
+        Args:
+            interval (float): Seconds between runs
+            func (callable): Called without arguments
+            name (str): Task name. Default: func's name
+            delay (float): Seconds until the first run. Default: interval
+        '''
+        if None in [interval] or interval <= 0:
+            raise RuntimeError("Need a positive interval to proceed!")
+        self._add(interval if None in [delay] else delay, func, name, interval)
+    #
+    ####################################################################################
+    #
+    # _add()
+    #
+    def _add(self, delay=0, func=None, name=None, interval=None):
+        if None in [func]:
+            raise RuntimeError("Need a func to proceed!")
+
+        name = name if name else func.__name__
+        sequence = next(self._sequence)
+        # an older entry for the same name is skipped when it comes up
+        self._tasks[name] = (sequence, func, interval)
+        heapq.heappush(self._queue, (self._clock() + max(0, delay), sequence, name))
+    #
+    ####################################################################################
+    #
+    # cancel()
+    #
+    def cancel(self, name=None):
+        '''
+        Forget a task
+
+        Args:
+            name (str): Task name
+        '''
+        self._tasks.pop(name, None)
+    #
+    ####################################################################################
+    #
+    # hold()
+    #
+    def hold(self, seconds=None):
+        '''
+        Keep every task waiting until at least seconds from now
+
+        Args:
+            seconds (float): How long to hold off
+        '''
+        self._hold_until = max(self._hold_until, self._clock() + seconds)
+    #
+    ####################################################################################
+    #
+    # _prune()
+    #
+    def _prune(self):
+        '''Drop replaced and cancelled entries from the front of the queue'''
+        while self._queue:
+            _, sequence, name = self._queue[0]
+            task = self._tasks.get(name)
+            if None not in [task] and task[0] == sequence:
+                return
+            heapq.heappop(self._queue)
+    #
+    ####################################################################################
+    #
+    # timeout()
+    #
+    def timeout(self):
+        '''
+        Returns:
+            float: Seconds until the next task is due (0 if one is overdue), None if none are
+                scheduled
+        '''
+        self._prune()
+        if not self._queue:
+            return None
+        due = max(self._queue[0][0], self._hold_until)
+        return max(0.0, due - self._clock())
+    #
+    ####################################################################################
+    #
+    # run_pending()
+    #
+    def run_pending(self, budget=None):
+        '''
+        Run the tasks that are due, oldest first
+
+        Args:
+            budget (float): Stop starting tasks after this many seconds. Default: run them all
+
+        Returns:
+            int: Number of tasks run
+        '''
+        start = self._clock()
+        count = 0
+        if start < self._hold_until:
+            return count
+
+        while 1:
+            self._prune()
+            if not self._queue or self._queue[0][0] > self._clock():
+                break
+            if None not in [budget] and count and self._clock() - start >= budget:
+                break
+
+            _, _, name = heapq.heappop(self._queue)
+            _, func, interval = self._tasks.pop(name)
+            if None not in [interval]:
+                self._add(interval, func, name, interval)
+
+            # pylint: disable=broad-except
+            try:
+                func()
+            except Exception as err:
+                self._logger.error("Task '%s' failed: '%s'", name, err)
+            count += 1
+
+        self._runs += count
+        return count
+    #
+    ##############################################################################
+    ##############################################################################
+    #
+    @property
+    def runs(self):
+        '''int: number of tasks run so far'''
+        return self._runs
@@ -7,20 +7,36 @@ SmugMug Classes
 # Standard Imports
 #
 from __future__ import print_function
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime
+from email.utils import parsedate
 import json
 import logging
+import math
 import os
 import random
 import re
-import sys
+import threading
+import time
 from urllib.parse import urlparse
+from xml.etree import ElementTree
 #
 # Non-standard imports
 #
-# import exifread
-import feedparser
-import requests
+# feedparser and requests are imported on first use, which happens on a loading thread, so
+# startup does not wait for them
+#
+# local directory imports here
+#
+from adaptive import CostModel
+from cache import available_memory, DiskCache, LruCache, PlaylistCache
+from gallery import GalleryEntry
+from metadata import MetadataCache
+from metrics import get_metrics
+from ordering import cached_order, ORDER, ORDERS, WINDOW
+from prefetch import Prefetcher
+from transport import get_transport
 #
 ##############################################################################
 #
@@ -82,6 +98,9 @@ class SmugRss(SmugBase):
 
     # 159365802_Wp7NDr
     GALLERY_URL = 'https://{url}/hack/feed.mg?Type=gallery&Data={gallery}&format=rss200'
+
+    # Media RSS elements holding the renditions of each item
+    MEDIA_CONTENT = '{http://search.yahoo.com/mrss/}content'
     #
     ####################################################################################
     #
@@ -99,23 +118,75 @@ class SmugRss(SmugBase):
         self._recent = None
         self._recent_feed_url = self.NICK_URL.format(url=site_url, nick=nickname)
         self._site_url = site_url
+        # feed URL -> (ETag, Last-Modified) of the last copy loaded
+        self._validators = {}
 
     #
     ####################################################################################
     #
+    # _parse_feed()
+    #
+    def _parse_feed(self, feed_url=None, conditional=False):
+        '''
+        Fetch a feed through the shared transport and parse it
+
+        Args:
+            feed_url (str): URL of the RSS feed
+            conditional (bool): Only download the feed if it changed since it was last loaded
+
+        Returns:
+            list: Feed entries. Empty if the feed could not be loaded, or None in conditional
+                mode if it is unchanged or could not be loaded.
+        '''
+        failed = None if conditional else []
+
+        headers = {}
+        etag, modified = self._validators.get(feed_url, (None, None))
+        if conditional and None not in [etag]:
+            headers['If-None-Match'] = etag
+        if conditional and None not in [modified]:
+            headers['If-Modified-Since'] = modified
+
+        # pylint: disable=import-outside-toplevel
+        import feedparser
+        import requests
+
+        try:
+            with get_metrics().span('feed'):
+                response = get_transport().get(feed_url, headers=headers)
+            response.raise_for_status()
+        except requests.RequestException as err:
+            self._logger.error("Loading feed '%s' failed: '%s'", feed_url, err)
+            return failed
+
+        if response.status_code == 304:
+            self._logger.info("Feed '%s' is unchanged", feed_url)
+            return None
+
+        self._validators[feed_url] = (response.headers.get('ETag'),
+                                      response.headers.get('Last-Modified'))
+
+        with get_metrics().span('feed_parse'):
+            return feedparser.parse(response.content,
+                                    response_headers=dict(response.headers)).get('entries')
+    #
+    ####################################################################################
+    #
     # get_gallery_feed()
     #
-    def get_gallery_feed(self, gallery=None, category=None, year=None):
+    def get_gallery_feed(self, gallery=None, category=None, year=None, conditional=False):
         '''
         Load the feed of recent items
 
         Args:
             category (str): Limit items to provided category (first portion of URL path)
+            conditional (bool): Only download the feed if it changed since it was last loaded
             gallery (str): SmugMug gallery id
             year (str): Limit items to provided year of modification
 
         Returns:
-            list: List of matching galleries from the feed
+            list: List of matching galleries from the feed, or None in conditional mode when
+                the feed is unchanged
 
         Raises:
             RuntimeError: if missing arguments needed to execute requests
@@ -130,64 +201,185 @@ class SmugRss(SmugBase):
         else:
             gallery_url = self._gallery_url
 
-        results = feedparser.parse(gallery_url).get('entries')
+        results = self._parse_feed(gallery_url, conditional=conditional)
+        if None in [results]:
+            return results
 
-        if None not in [year]:
-            filtered = []
+        return [entry for entry in results if self._matches(entry, category, year)]
+    #
+    ####################################################################################
+    #
+    # iter_gallery_feed()
+    #
+    def iter_gallery_feed(self, gallery=None, category=None, year=None):
+        '''
+        Stream the feed of a gallery, yielding each matching item as soon as it has been parsed.
+            Items are parsed one at a time from the response body and discarded once yielded,
+            so memory use does not grow with the size of the feed.
 
-            for entry in results:
-                if str(entry.get('published_parsed')[0]) == str(year):
-                    filtered.append(entry)
+        Args:
+            category (str): Limit items to provided category (first portion of URL path)
+            gallery (str): SmugMug gallery id
+            year (str): Limit items to provided year of modification
 
-            results = filtered
+        Yields:
+            dict: Entry with the same keys get_gallery_feed() entries use
 
-        if None not in [category]:
-            filtered = []
-            for entry in results:
-                link_info = urlparse(entry.get('link'))
-                # ['', 'Travel', '2018', 'Belgium']
-                paths = link_info.path.split('/')
-
-                if paths[1] == category:
-                    filtered.append(entry)
-            results = filtered
-        return results
+        Raises:
+            RuntimeError: if missing arguments needed to execute requests
+        '''
+        if [gallery, self._gallery_url].count(None) == 2:
+            raise RuntimeError("Need either gallery id OR gallery URL")
+
+        if None not in [gallery]:
+            gallery_url = self.GALLERY_URL.format(url=self.site_url, gallery=gallery)
+        else:
+            gallery_url = self._gallery_url
+
+        for entry in self._iter_feed(gallery_url, category, year):
+            yield entry
     #
     ####################################################################################
     #
-    # get_recent()
+    # _iter_feed()
     #
-    def get_recent(self, category=None, year=None):
+    def _iter_feed(self, feed_url=None, category=None, year=None):
         '''
-        Load the feed of recent items
+        Stream a feed, yielding matching items as they are parsed
 
         Args:
+            feed_url (str): URL of the RSS feed
             category (str): Limit items to provided category (first portion of URL path)
-            gallery (str): SmugMug gallery id
             year (str): Limit items to provided year of modification
+
+        Yields:
+            dict: Entry with the same keys get_gallery_feed() entries use
         '''
-        self._recent = feedparser.parse(self._recent_feed_url).get('entries')
+        import requests # pylint: disable=import-outside-toplevel
+
+        try:
+            response = get_transport().get(feed_url, stream=True)
+            response.raise_for_status()
+        except requests.RequestException as err:
+            self._logger.error("Loading feed '%s' failed: '%s'", feed_url, err)
+            return
+
+        self._validators[feed_url] = (response.headers.get('ETag'),
+                                      response.headers.get('Last-Modified'))
+
+        with response:
+            response.raw.decode_content = True
+            channel = None
+            for event, elem in ElementTree.iterparse(response.raw, events=('start', 'end')):
+                if event == 'start':
+                    if elem.tag == 'channel':
+                        channel = elem
+                    continue
+
+                if elem.tag != 'item':
+                    continue
+
+                entry = self._item_entry(elem)
+                # drop the parsed item (and anything before it) before moving on
+                if None not in [channel]:
+                    channel.clear()
+
+                if self._matches(entry, category, year):
+                    yield entry
+    #
+    ####################################################################################
+    #
+    # _item_entry()
+    #
+    def _item_entry(self, item=None):
+        '''
+        Returns:
+            dict: Entry for an RSS item element, using feedparser's key names
+        '''
+        published = item.findtext('pubDate')
+        media_content = [dict(content.attrib) for content in item.iter(self.MEDIA_CONTENT)]
 
-        if None not in [year]:
-            filtered = []
+        return {
+            'id': item.findtext('guid'),
+            'link': item.findtext('link'),
+            'title': item.findtext('title'),
+            'published_parsed': parsedate(published) if published else None,
+            'media_content': media_content,
+        }
+    #
+    ####################################################################################
+    #
+    # _matches()
+    #
+    @staticmethod
+    def _matches(entry=None, category=None, year=None):
+        '''
+        Check an entry against the year and category filters
 
-            for entry in self._recent:
-                if str(entry.get('published_parsed')[0]) == str(year):
-                    filtered.append(entry)
+        Args:
+            entry (dict): Feed entry
+            category (str): Category (first portion of URL path) or None for any
+            year (str): Year of modification or None for any
 
-            self._recent = filtered
+        Returns:
+            bool: True if the entry passes both filters
+        '''
+        if None not in [year]:
+            published = entry.get('published_parsed')
+            if not published or str(published[0]) != str(year):
+                return False
 
         if None not in [category]:
-            filtered = []
-            for entry in self._recent:
-                link_info = urlparse(entry.get('link'))
-                #      Cetegory   Year    Gallery
-                # ['', 'Travel', '2018', 'Belgium']
-                paths = link_info.path.split('/')
+            link_info = urlparse(entry.get('link'))
+            #      Cetegory   Year    Gallery
+            # ['', 'Travel', '2018', 'Belgium']
+            paths = link_info.path.split('/')
 
-                if paths[1] == category:
-                    filtered.append(entry)
-            self._recent = filtered
+            if len(paths) < 2 or paths[1] != category:
+                return False
+        return True
+    #
+    ####################################################################################
+    #
+    # get_recent()
+    #
+    def get_recent(self, category=None, year=None, conditional=False):
+        '''
+        Load the feed of recent items
+
+        Args:
+            category (str): Limit items to provided category (first portion of URL path)
+            conditional (bool): Only download the feed if it changed since it was last loaded
+            year (str): Limit items to provided year of modification
+
+        Returns:
+            list: List of matching items from the feed, or None in conditional mode when the
+                feed is unchanged
+        '''
+        results = self._parse_feed(self._recent_feed_url, conditional=conditional)
+        if None in [results]:
+            return results
+
+        self._recent = [entry for entry in results if self._matches(entry, category, year)]
+        return self._recent
+    #
+    ####################################################################################
+    #
+    # iter_recent()
+    #
+    def iter_recent(self, category=None, year=None):
+        '''
+        Stream the feed of recent items, yielding each matching item as soon as it is parsed
+
+        Args:
+            category (str): Limit items to provided category (first portion of URL path)
+            year (str): Limit items to provided year of modification
+
+        Yields:
+            dict: Entry with the same keys get_recent() entries use
+        '''
+        for entry in self._iter_feed(self._recent_feed_url, category, year):
+            yield entry
     #
     ##############################################################################
     ##############################################################################
@@ -229,7 +421,10 @@ class SmugRssGalleryUrl(SmugRss):
         super(SmugRssGalleryUrl, self).__init__(debug=False, site_url=site_url, nickname="FOO")
 
         # extract the RSS URL from the page content
-        self._gallery_url = ''.join([site_url, self._find_rss_feed_url(gallery_url)])
+        feed_path = self._find_rss_feed_url(gallery_url)
+        if None in [feed_path]:
+            raise RuntimeError("Could not find an RSS feed for '{}'".format(gallery_url))
+        self._gallery_url = ''.join([site_url, feed_path])
     #
     ####################################################################################
     #
@@ -247,8 +442,14 @@ class SmugRssGalleryUrl(SmugRss):
         '''
         result = None
 
+        import requests # pylint: disable=import-outside-toplevel
+
         if None not in [gallery_url]:
-            response = requests.get(gallery_url)
+            try:
+                response = get_transport().get(gallery_url)
+            except requests.RequestException as err:
+                self._logger.error("Loading gallery page '%s' failed: '%s'", gallery_url, err)
+                return result
 
             self._logger.info("Response code was '%s'", response.status_code)
 
@@ -265,7 +466,10 @@ class SmugRssGalleryUrl(SmugRss):
     #
     # _find_rss_feed_url()
     #
-    def get_recent(self, category=None, year=None):
+    def get_recent(self, category=None, year=None, conditional=False):
+        raise NotImplementedError("Does not apply to a gallery!")
+
+    def iter_recent(self, category=None, year=None):
         raise NotImplementedError("Does not apply to a gallery!")
 #
 ####################################################################################
@@ -282,6 +486,46 @@ class Slideshow(SmugBase):
     #
     # Maximum size of images to cache (in bytes)
     MAX_CACHE_SIZE = 128 * 1024 * 1024
+
+    # Share of available memory to use when the cache is sized automatically
+    AUTO_CACHE_FRACTION = 0.25
+
+    # Memory cache eviction policies: least recently used, or furthest next use in the playlist
+    CACHE_POLICIES = {'lru': LruCache, 'playlist': PlaylistCache}
+    CACHE_POLICY = 'playlist'
+
+    # Maximum size of images to cache on disk when a cache directory is set (in bytes)
+    MAX_DISK_CACHE_SIZE = 1024 * 1024 * 1024
+
+    # How many images either side of the current one to fetch in the background
+    PREFETCH_AHEAD = 2
+    PREFETCH_BEHIND = 1
+    PREFETCH_WORKERS = 2
+
+    # How often to check the gallery feed for changes (in seconds)
+    REFRESH_INTERVAL = 15 * 60
+
+    # Site gallery ids and nicknames are looked up on
+    SITE_URL = 'www.azriel.photo'
+    NICKNAME = 'azriel'
+
+    # Maximum number of feeds to load at once
+    FEED_WORKERS = 8
+
+    # What the rendition cost model learned, kept in the cache directory between runs
+    COST_MODEL_FILE = 'costs.json'
+
+    # Number of images whose adaptively chosen rendition is remembered
+    ADAPTED_ENTRIES = 64
+
+    # Caption metadata read from the images, kept in the cache directory between runs
+    METADATA_FILE = 'metadata.json'
+
+    # How many upcoming images to read caption metadata of in the background
+    METADATA_AHEAD = 4
+
+    # Share of the measured bandwidth the cached order lets downloads of new images use
+    BANDWIDTH_SHARE = 0.5
     #
     ##############################################################################
     #
@@ -289,20 +533,106 @@ class Slideshow(SmugBase):
     #
     # pylint: disable=too-many-arguments
     def __init__(self, debug=False, downscale=False, gallery_id=None, gallery_url=None, height=None,
-                 width=None):
+                 width=None, cache_size=MAX_CACHE_SIZE, cache_policy=CACHE_POLICY,
+                 prefetch_ahead=PREFETCH_AHEAD, prefetch_behind=PREFETCH_BEHIND,
+                 prefetch_workers=PREFETCH_WORKERS, cache_dir=None,
+                 disk_cache_size=MAX_DISK_CACHE_SIZE, stream=False, nickname=None, site_url=SITE_URL, time_budget=None,
+                 frame_pack=None, frame_server=None, metadata=False, order=ORDER,
+                 show_time=None, bandwidth_share=BANDWIDTH_SHARE):
         '''
         Args:
             debug (bool): Enable debug mode
             downscale (bool): Find images larger than display and downscale them
-            gallery_id (str): SmugMug gallery id
-            gallery_url (str): SmugMug gallery URL
+            gallery_id (str or list): SmugMug gallery id(s)
+            gallery_url (str or list): SmugMug gallery URL(s)
             height (int): Height of target display
             width (int): Width of target display
+            cache_size (int or str): Maximum size of the memory cache (in bytes) or 'auto' to size
+                it from available memory
+            cache_policy (str): Memory cache eviction policy, one of CACHE_POLICIES
+            prefetch_ahead (int): Number of upcoming images to fetch in the background
+            prefetch_behind (int): Number of previous images to fetch in the background
+            prefetch_workers (int): Maximum number of concurrent background fetches
+            cache_dir (str): Directory for the persistent image cache. Default: memory only
+            disk_cache_size (int): Maximum size of the persistent image cache (in bytes)
+            stream (bool): Stream the gallery feed and start with the first items while the
+                rest keeps loading
+            nickname (str or list): SmugMug nickname(s) whose recent items to show
+            site_url (str): Site to look gallery ids and nicknames up on
+            time_budget (float): Seconds to fetch, decode and scale an image in. Smaller
+                renditions are chosen when the best fit would take longer on this device and
+                network. Default: always the best fit
+            frame_pack (FramePack): Pre-scaled frames to show without fetching or decoding.
+                Images missing from it are fetched as usual.
+            frame_server (FrameClient): Shared server to take the playlist, images and scaled
+                frames from, instead of loading feeds and fetching and scaling here
+            metadata (bool): Read the title, camera and exposure of each image for captions
+            order (str): Playlist order, one of ordering.ORDERS. 'cached' plays cached images
+                and spaces out the ones that need downloading, see ordering.cached_order()
+            show_time (float): Seconds each slide is shown, for spacing downloads in the cached
+                order. Default: unknown, downloads are not spaced out
+            bandwidth_share (float): Share of the measured bandwidth the cached order lets
+                downloads use, between 0 and 1
+
+        All galleries and nicknames are loaded at once and merged into one shuffled playlist.
         '''
         super(Slideshow, self).__init__(debug=debug)
 
-        self._cache = {}
-        self._cache_size = 0
+        if cache_policy not in self.CACHE_POLICIES:
+            raise RuntimeError("Unknown cache policy '{}'".format(cache_policy))
+        if order not in ORDERS:
+            raise RuntimeError("Unknown playlist order '{}'".format(order))
+
+        if cache_size == 'auto':
+            cache_size = self.auto_cache_size()
+        self._cache = self.CACHE_POLICIES[cache_policy](max_size=cache_size)
+        self._logger.info("Caching up to %fMb of images (%s)", cache_size / 1024 / 1024,
+                          cache_policy)
+
+        # the in-memory cache is a hot tier in front of the disk
+        self._disk_cache = None
+        if None not in [cache_dir]:
+            self._disk_cache = DiskCache(path=cache_dir, max_size=disk_cache_size)
+
+        # learns fetch and decode times to pick renditions that fit time_budget
+        self._time_budget = time_budget
+        self._costs = CostModel()
+        self._cost_path = None
+        if None not in [cache_dir]:
+            self._cost_path = os.path.join(cache_dir, self.COST_MODEL_FILE)
+            self._costs.load(self._cost_path)
+        # entry id -> chosen rendition, so an image keeps its rendition while it is in play
+        self._adapted = OrderedDict()
+        # cache key -> pixels, for images on their way through fetch and decode
+        self._pixels = OrderedDict()
+
+        self._frame_pack = frame_pack
+        self._frame_server = frame_server
+
+        self._order = order
+        if order == 'cached' and None not in [frame_server]:
+            # what is cached is up to the server
+            self._logger.warning("A frame server's playlist is shuffled, not in cached order")
+            self._order = 'shuffle'
+        self._show_time = show_time
+        self._bandwidth_share = bandwidth_share
+        # entries left out of the current pass of the cached order, longest waiting first
+        self._deferred = []
+
+        self._prefetch_ahead = max(0, prefetch_ahead)
+        self._prefetch_behind = max(0, prefetch_behind)
+        self._prefetcher = None
+        if self._prefetch_ahead or self._prefetch_behind:
+            self._prefetcher = Prefetcher(fetch=self._prefetch_image, workers=prefetch_workers)
+
+        # caption metadata is read from the start of the originals, ahead of the slides
+        self._metadata = None
+        self._metadata_prefetcher = None
+        if metadata:
+            self._metadata = MetadataCache(path=None if None in [cache_dir] else
+                                           os.path.join(cache_dir, self.METADATA_FILE))
+            self._metadata_prefetcher = Prefetcher(fetch=self._metadata.fetch,
+                                                   workers=MetadataCache.WORKERS)
 
         self._downscale = downscale
 
@@ -311,12 +641,28 @@ class Slideshow(SmugBase):
 
         self._loop_pos = 0
 
+        # the gallery and position are shared with the refresh and streaming threads
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        # set once the gallery has at least one entry or has finished loading
+        self._ready = threading.Event()
+        self._stream = stream
+        self._streaming = False
+        self._streams = 0
+        self._stream_keys = set()
+
         # load the gallery RSS - do this last
+        self._site_url = site_url
+        self._sources = self._make_sources(gallery_id, gallery_url, nickname)
+        # source -> feed object, kept for conditional refreshes
+        self._feeds = {}
+        # source -> its latest compact entries
+        self._source_entries = {}
         self._gallery = None
-        self._gallery_id = gallery_id
-        self._gallery_url = gallery_url
-        self._logger.info("Setting URL to '%s'", gallery_url)
         self.load_gallery()
+
+        # the refresh_in_background() in progress
+        self._refresher = None
     #
     ##############################################################################
     #
@@ -328,34 +674,146 @@ class Slideshow(SmugBase):
         if None not in [key, url]:
 
             # do we already have the data?
-            if None in [self._cache.get(key)]:
-                result = self.load_image(image_url=url)
+            result = self._cache.get(key)
+
+            # is a prefetch worker already downloading it?
+            if None in [result] and None not in [self._prefetcher]:
+                future = self._prefetcher.pending(key)
+                if None not in [future]:
+                    self._logger.info("Waiting on prefetch of '%s'", key)
+                    # pylint: disable=broad-except
+                    try:
+                        future.result()
+                    except Exception:
+                        pass
+                    result = self._cache.peek(key)
+
+            if None in [result]:
+                self._logger.info("Cache miss for '%s'", key)
+                result = self._load_cached_image(key, url)
                 # cache the image for re-use
-                self._cache_size += sys.getsizeof(result)
-                self._cache[key] = result
-            else:
-                result = self._cache[key]
+                self._cache_put(key, result)
         return result
     #
     ##############################################################################
     #
-    # _cache_size_check()
+    # _load_cached_image()
     #
-    def _cache_size_check(self):
+    def _load_cached_image(self, key=None, url=None):
+        '''
+        Load an image from the frame server, or the disk cache falling back to the network
 
-        # is the cache too large?
-        self._logger.debug("Cache is %fMb", (self._cache_size / 1024 / 1024))
-        while self._cache_size >= self.MAX_CACHE_SIZE:
-            key = random.choice(list(self._cache.keys()))
-            self._logger.warning("Clearing '%s' from cache!", key)
-            # pylint: disable=bare-except
-            try:
-                self._cache_size -= sys.getsizeof(self._cache[key])
-                del self._cache[key]
-            except:
-                pass
-            self._logger.warning("Cache is %fMb", (self._cache_size / 1024 /1024))
+        Args:
+            key (str): Cache key
+            url (str): URL to load the image from on a disk cache miss
+
+        Returns:
+            bytes: Binary string data for the image
+        '''
+        if None not in [self._frame_server]:
+            return self._frame_server.image(key, url)
+
+        result = None
+        if None not in [self._disk_cache]:
+            result = self._disk_cache.get(key)
+
+        if None in [result]:
+            result = self.load_image(image_url=url)
+            if None not in [self._disk_cache, result]:
+                self._disk_cache.put(key, result)
+        return result
+    #
+    ##############################################################################
+    #
+    # _cache_put()
+    #
+    def _cache_put(self, key=None, data=None):
 
+        if None not in [key, data] and key not in self._cache:
+            self._cache.put(key, data)
+    #
+    ##############################################################################
+    #
+    # _image_ref()
+    #
+    def _image_ref(self, pos=None):
+        '''
+        Find the cache key and URL of the best image at a gallery position
+
+        Args:
+            pos (int): Gallery position. Default: current position
+
+        Returns:
+            tuple: (key, url) or (None, None)
+        '''
+        with self._lock:
+            if not self._gallery:
+                return None, None
+            entry = self._gallery[self._loop_pos if None in [pos] else pos]
+            index = self._adapt(entry)
+
+        if index < 0:
+            return None, None
+        url = entry.urls[index]
+        return os.path.basename(url), url
+    #
+    ##############################################################################
+    #
+    # _adapt()
+    #
+    def _adapt(self, entry=None):
+        '''
+        Choose the rendition of an entry to show. Without a time budget that is the best fit for
+            the display. With one it is the largest rendition, up to the best fit, that the cost
+            model expects to fetch, decode and scale within the budget. The choice is kept while
+            the image is in play, so its cache key does not change under the renderer.
+
+        Args:
+            entry (GalleryEntry): Gallery entry
+
+        Returns:
+            int: Index of the rendition or -1
+        '''
+        if None in [self._time_budget] or entry.chosen < 0:
+            return entry.chosen
+        if None not in [self._frame_pack] and entry.key in self._frame_pack:
+            # baked frames cost nothing to show
+            return entry.chosen
+
+        with self._lock:
+            index = self._adapted.get(entry.entry_id)
+            if None in [index]:
+                index = self._costs.choose(
+                    entry.widths, entry.heights, entry.chosen, self._time_budget,
+                    on_hand=lambda index: self.has_image(os.path.basename(entry.urls[index])))
+                if index != entry.chosen:
+                    self._logger.info("Showing %dx%d instead of %dx%d of '%s'",
+                                      entry.widths[index], entry.heights[index],
+                                      entry.widths[entry.chosen], entry.heights[entry.chosen],
+                                      entry.title)
+                    # let the playlist cache see it as the image it is
+                    self._cache.alias(os.path.basename(entry.urls[index]), entry.key)
+            self._adapted[entry.entry_id] = index
+            self._adapted.move_to_end(entry.entry_id)
+            while len(self._adapted) > self.ADAPTED_ENTRIES:
+                self._adapted.popitem(last=False)
+
+            self._pixels[os.path.basename(entry.urls[index])] = \
+                entry.widths[index] * entry.heights[index]
+            while len(self._pixels) > self.ADAPTED_ENTRIES:
+                self._pixels.popitem(last=False)
+        return index
+    #
+    ##############################################################################
+    #
+    # _prefetch_image()
+    #
+    def _prefetch_image(self, key=None, url=None):
+        '''Prefetch worker: load an image into the cache unless it is already there'''
+        if key in self._cache:
+            return
+
+        self._cache_put(key, self._load_cached_image(key, url))
     #
     ##############################################################################
     #
@@ -363,56 +821,47 @@ class Slideshow(SmugBase):
     #
     # find_best_image_size()
     #
-    def find_best_image_size(self):
+    def find_best_image_size(self, pos=None):
         '''
-        Choose the best size image for the set W x H
+        Choose the best size image for the set W x H. The choice is made once, when the gallery
+            is loaded.
+
+        Args:
+            pos (int): Gallery position to search. Default: current position
 
         Returns:
             str: URL to image
         '''
-        img = None
-        media_content = self._gallery[self._loop_pos].get('media_content')
-        if self._downscale:
-            # search from large to small
-            media_content = list(reversed(media_content))
-
-        self._logger.info("Searching for an image...")
-        if None not in [media_content]:
-            # which dimension do we care about more?
-            horizontal = False
-            closest = 10000000
-
-            for image in media_content:
-                self._logger.debug(self._json_dump(image, True))
-                horizontal = int(image.get('width')) >= int(image.get('height'))
-
-                if horizontal:
-                    diff = self.__width - int(image.get('width'))
-                else:
-                    diff = self._height - int(image.get('height'))
-
-                # NOTE: a positive diff indicates an image smaller than the display, end search if
-                # in downscale mode
-                if self._downscale and diff > 0:
-                    self._logger.info("Image is smaller than display. Skipping...")
-                    break
+        pos = self._loop_pos if None in [pos] else pos
+        entry = self._gallery[pos]
 
-                diff = abs(diff)
+        if None in [entry.url]:
+            self._logger.error("No image size match found for '%s'", entry.link)
 
-                if diff < closest:
-                    closest = diff
-                    self._logger.debug("Found a new match: %s", self._json_dump(image, True))
-                    img = image
-
-                if closest == 0:
-                    self._logger.debug("Found a perfect match: %s", self._json_dump(image, True))
-                    break
+        return entry.url
+    #
+    ##############################################################################
+    #
+    # _compact_entries()
+    #
+    def _compact_entries(self, entries=None):
+        '''
+        Turn feed entries into compact gallery entries with the rendition already chosen
 
-        if None in [img]:
-            self._logger.error("No image size match found in: %s",
-                               self._json_dump(media_content, True))
+        Args:
+            entries (list): feedparser entries
 
-        return img
+        Returns:
+            list: GalleryEntry for every entry with a usable rendition
+        '''
+        results = []
+        for entry in entries if entries else []:
+            compact = GalleryEntry.from_feed(entry)
+            if compact.choose(self.__width, self._height, self._downscale) >= 0:
+                results.append(compact)
+            else:
+                self._logger.error("No image size match found for '%s'", compact.link)
+        return results
     #
     ##############################################################################
     #
@@ -420,32 +869,438 @@ class Slideshow(SmugBase):
     #
     def load_gallery(self, gallery_id=None, gallery_url=None, shuffle=True):
         '''
-        Load the feed for the provided Gallery id
+        Load the feed for the provided Gallery id. Without arguments, (re)load every gallery and
+            nickname the slideshow was created with.
 
         Args:
-            gallery_id (str): SmugMug gallery id to load
-            gallery_url (str): SmugMug gallery URL to load
+            gallery_id (str or list): SmugMug gallery id(s) to load
+            gallery_url (str or list): SmugMug gallery URL(s) to load
             shuffle (bool): Shuffle the gallery entries. Default: True
         '''
-        self._gallery = None
+        if gallery_id or gallery_url:
+            self._sources = self._make_sources(gallery_id, gallery_url, None)
+
+        self._feeds = {}
+        self._source_entries = {}
+        self._logger.info("Loading %d feed(s)", len(self._sources))
+
+        if None not in [self._frame_server]:
+            gallery = self._server_entries() or []
+        elif self._stream:
+            self._start_stream(shuffle=shuffle)
+            return
+        else:
+            for source, entries in self._fetch_sources().items():
+                self._source_entries[source] = entries if entries else []
+            gallery = self._merge_sources()
+
+        if gallery and shuffle:
+            self._logger.info("Shuffling gallery...")
+            gallery = random.sample(gallery, k=len(gallery))
+
+        with self._lock:
+            self._gallery = gallery
+            self._deferred = []
+            self._loop_pos = 0
+            if gallery and self._order == 'cached':
+                self._next_pass()
+            self._update_playlist()
+        self._ready.set()
+    #
+    ##############################################################################
+    #
+    # _server_entries()
+    #
+    def _server_entries(self):
+        '''
+        Returns:
+            list: Compact entries of the frame server's playlist, with the renditions it chose,
+                or None if it cannot be reached
+        '''
+        try:
+            return [GalleryEntry.from_dict(entry) for entry in self._frame_server.gallery()]
+        except (OSError, RuntimeError) as err:
+            self._logger.error("Loading gallery from frame server failed: '%s'", err)
+        return None
+    #
+    ##############################################################################
+    #
+    # _make_sources()
+    #
+    @staticmethod
+    def _make_sources(gallery_id=None, gallery_url=None, nickname=None):
+        '''
+        Returns:
+            list: (kind, value) for every gallery id, gallery URL and nickname
+        '''
+        sources = []
+        for kind, values in [('id', gallery_id), ('url', gallery_url), ('nickname', nickname)]:
+            if not values:
+                continue
+            if isinstance(values, str):
+                values = [values]
+            sources += [(kind, value) for value in values if (kind, value) not in sources]
+        return sources
+    #
+    ##############################################################################
+    #
+    # _source_feed()
+    #
+    def _source_feed(self, source=None):
+        '''
+        Returns:
+            SmugRss: Feed object for a source, created on first use
+        '''
+        feed = self._feeds.get(source)
+        if None in [feed]:
+            kind, value = source
+            if kind == 'url':
+                feed = SmugRssGalleryUrl(gallery_url=value)
+            elif kind == 'nickname':
+                feed = SmugRss(site_url=self._site_url, nickname=value)
+            else:
+                feed = SmugRss(site_url=self._site_url, nickname=self.NICKNAME)
+            self._feeds[source] = feed
+        return feed
+    #
+    ##############################################################################
+    #
+    # _fetch_source()
+    #
+    def _fetch_source(self, source=None, conditional=False):
+        '''
+        Load one gallery or nickname feed
 
-        gallery_id = gallery_id if gallery_id else self._gallery_id
-        gallery_url = gallery_url if gallery_url else self._gallery_url
-        self._logger.info("Setting URL to '%s'", gallery_url)
+        Args:
+            source (tuple): (kind, value) from _make_sources()
+            conditional (bool): Only download the feed if it changed since it was last loaded
 
-        if None not in [gallery_id]:
-            self._logger.info("Loading gallery with id '%s'", gallery_id)
-            smugmug = SmugRss(site_url='www.azriel.photo', nickname='azriel')
-            self._gallery = smugmug.get_gallery_feed(gallery=gallery_id)
+        Returns:
+            list: Compact entries, or None if the feed is unchanged or could not be loaded
+        '''
+        kind, value = source
+        self._logger.info("Loading %s '%s'", kind, value)
+        try:
+            feed = self._source_feed(source)
+        except RuntimeError as err:
+            self._logger.error("Loading %s '%s' failed: '%s'", kind, value, err)
+            return None
+
+        if kind == 'nickname':
+            entries = feed.get_recent(conditional=conditional)
+        else:
+            entries = feed.get_gallery_feed(gallery=value if kind == 'id' else None,
+                                            conditional=conditional)
 
-        if None not in [gallery_url]:
-            self._logger.info("Loading gallery with URL '%s'", gallery_url)
-            smugmug = SmugRssGalleryUrl(gallery_url=gallery_url)
-            self._gallery = smugmug.get_gallery_feed()
+        return None if None in [entries] else self._compact_entries(entries)
+    #
+    ##############################################################################
+    #
+    # _iter_source()
+    #
+    def _iter_source(self, source=None):
+        '''
+        Stream one gallery or nickname feed
 
-        if self._gallery and shuffle:
-            self._logger.info("Shuffling gallery...")
-            self._gallery = random.sample(self._gallery, k=len(self._gallery))
+        Args:
+            source (tuple): (kind, value) from _make_sources()
+
+        Yields:
+            dict: Feed entries as they are parsed
+        '''
+        kind, value = source
+        feed = self._source_feed(source)
+        if kind == 'nickname':
+            entries = feed.iter_recent()
+        else:
+            entries = feed.iter_gallery_feed(gallery=value if kind == 'id' else None)
+
+        for entry in entries:
+            yield entry
+    #
+    ##############################################################################
+    #
+    # _fetch_sources()
+    #
+    def _fetch_sources(self, conditional=False):
+        '''
+        Load every feed concurrently, so loading takes as long as the slowest one
+
+        Args:
+            conditional (bool): Only download feeds that changed since they were last loaded
+
+        Returns:
+            dict: source -> compact entries, or None if unchanged or failed
+        '''
+        if not self._sources:
+            return {}
+
+        workers = min(self.FEED_WORKERS, len(self._sources))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='feed') as pool:
+            results = pool.map(lambda source: self._fetch_source(source, conditional),
+                               self._sources)
+            return dict(zip(self._sources, results))
+    #
+    ##############################################################################
+    #
+    # _merge_sources()
+    #
+    def _merge_sources(self):
+        '''
+        Combine the entries of every source, dropping images that appear in more than one
+
+        Returns:
+            list: Compact entries in source order
+        '''
+        seen = set()
+        merged = []
+        for source in self._sources:
+            for entry in self._source_entries.get(source, []):
+                if entry.key in seen:
+                    continue
+                seen.add(entry.key)
+                merged.append(entry)
+
+        total = sum(len(entries) for entries in self._source_entries.values())
+        if total > len(merged):
+            self._logger.info("Dropped %d duplicate images", total - len(merged))
+        return merged
+    #
+    ##############################################################################
+    #
+    # _start_stream()
+    #
+    def _start_stream(self, shuffle=True):
+        '''
+        Start loading every feed on its own background thread
+
+        Args:
+            shuffle (bool): Shuffle the gallery entries as they arrive
+        '''
+        with self._lock:
+            self._gallery = []
+            self._loop_pos = 0
+            self._source_entries = dict((source, []) for source in self._sources)
+            self._streams = len(self._sources)
+            self._streaming = bool(self._sources)
+            self._stream_keys = set()
+        self._ready.clear()
+
+        if not self._sources:
+            self._ready.set()
+            return
+
+        for source in self._sources:
+            threading.Thread(target=self._stream_source, args=(source, shuffle), name='stream',
+                             daemon=True).start()
+    #
+    ##############################################################################
+    #
+    # _stream_source()
+    #
+    def _stream_source(self, source=None, shuffle=True):
+        '''
+        Background thread: add feed items to the gallery as they are parsed. Each one lands at a
+            random place in the part of the playlist that has not been shown yet, so the show
+            can start with the first item and still be shuffled. Images already added by another
+            feed are skipped.
+        '''
+        count = 0
+        # pylint: disable=broad-except
+        try:
+            for entry in self._iter_source(source):
+                if self._stop.is_set():
+                    break
+
+                for compact in self._compact_entries([entry]):
+                    with self._lock:
+                        self._source_entries[source].append(compact)
+                        if compact.key in self._stream_keys:
+                            continue
+                        self._stream_keys.add(compact.key)
+
+                        pos = len(self._gallery)
+                        if shuffle:
+                            pos = random.randint(min(self._loop_pos + 1, pos), pos)
+                        self._gallery.insert(pos, compact)
+                        count += 1
+                        # keep the cache's view of the playlist roughly current
+                        if len(self._gallery) == 1 or len(self._gallery) % 100 == 0:
+                            self._update_playlist()
+                    self._ready.set()
+        except Exception as err:
+            self._logger.error("Streaming %s '%s' failed: '%s'", source[0], source[1], err)
+        finally:
+            with self._lock:
+                self._streams -= 1
+                if self._streams <= 0:
+                    self._streaming = False
+                    self._update_playlist()
+                    self._ready.set()
+            self._logger.info("Streamed %d gallery entries from %s '%s'", count, *source)
+    #
+    ##############################################################################
+    #
+    # refresh_gallery()
+    #
+    def refresh_gallery(self):
+        '''
+        Check the gallery feeds for changes and merge them into the playlist. Feeds are only
+            downloaded if they changed. Removed entries are dropped, added entries are shuffled
+            into the part of the playlist that has not been shown yet, and the current position
+            and the cache are kept.
+
+        Returns:
+            bool: True if the gallery changed
+        '''
+        if None not in [self._frame_server]:
+            # the server refreshes the feeds; pick up what it has now
+            entries = self._server_entries()
+            if None in [entries]:
+                return False
+        else:
+            if not self._sources or self._streaming:
+                return False
+
+            changed = dict((source, entries) for source, entries
+                           in self._fetch_sources(conditional=True).items()
+                           if None not in [entries])
+            if not changed:
+                return False
+            self._source_entries.update(changed)
+            entries = self._merge_sources()
+
+        fresh = dict((entry.entry_id, entry) for entry in entries)
+        with self._lock:
+            old = self._gallery if self._gallery else []
+            known = set(entry.entry_id for entry in old + self._deferred)
+
+            # keep the existing order, picking up any changed details
+            merged = [fresh[entry.entry_id] for entry in old if entry.entry_id in fresh]
+            deferred = [fresh[entry.entry_id] for entry in self._deferred
+                        if entry.entry_id in fresh]
+            removed = len(old) + len(self._deferred) - len(merged) - len(deferred)
+
+            # the current image, or the one that took its place if it was removed
+            pos = len([entry for entry in old[:self._loop_pos]
+                       if entry.entry_id in fresh])
+
+            added = [entry for entry_id, entry in fresh.items() if entry_id not in known]
+            for entry in added:
+                merged.insert(random.randint(min(pos + 1, len(merged)), len(merged)), entry)
+
+            if not added and not removed:
+                return False
+
+            self._logger.warning("Gallery changed: %d added, %d removed", len(added), removed)
+            self._gallery = merged
+            self._deferred = deferred
+            self._loop_pos = min(pos, max(0, len(merged) - 1))
+            self._update_playlist()
+            self._cache.set_position(self._loop_pos, 1)
+        return True
+    #
+    ##############################################################################
+    #
+    # _refresh_once()
+    #
+    def _refresh_once(self):
+        # pylint: disable=broad-except
+        try:
+            self.refresh_gallery()
+        except Exception as err:
+            self._logger.error("Refreshing gallery failed: '%s'", err)
+    #
+    ##############################################################################
+    #
+    # refresh_in_background()
+    #
+    def refresh_in_background(self):
+        '''
+        Start refresh_gallery() on a background thread. Callers schedule it, e.g. every
+            REFRESH_INTERVAL seconds, at a time that suits them.
+
+        Returns:
+            bool: False if the previous refresh is still running
+        '''
+        with self._lock:
+            if None not in [self._refresher] and self._refresher.is_alive():
+                return False
+            self._refresher = threading.Thread(target=self._refresh_once, name='refresh',
+                                               daemon=True)
+            self._refresher.start()
+        return True
+    #
+    ##############################################################################
+    #
+    # _on_hand()
+    #
+    def _on_hand(self, entry=None):
+        '''
+        Returns:
+            bool: True if the entry can be shown without downloading: its best fit, or a smaller
+                rendition the adaptive choice could fall back on, is cached or baked
+        '''
+        if entry.chosen < 0:
+            return False
+        if None not in [self._frame_pack] and entry.key in self._frame_pack:
+            return True
+        pixels = entry.widths[entry.chosen] * entry.heights[entry.chosen]
+        return any(self.has_image(os.path.basename(url))
+                   for url, width, height in zip(entry.urls, entry.widths, entry.heights)
+                   if width * height <= pixels)
+    #
+    ##############################################################################
+    #
+    # _miss_spacing()
+    #
+    def _miss_spacing(self):
+        '''
+        Returns:
+            int: Slides it takes to download an image with the share of the measured bandwidth
+                the cached order may use
+        '''
+        if not self._show_time or self._show_time <= 0 or self._bandwidth_share <= 0:
+            return 1
+
+        sizes = [entry.widths[entry.chosen] * entry.heights[entry.chosen]
+                 for entry in self._gallery + self._deferred if entry.chosen >= 0]
+        if not sizes:
+            return 1
+        pixels = sum(sizes) / len(sizes)
+        fetch = self._costs.estimate(pixels) - self._costs.estimate(pixels, on_hand=True)
+        return max(1, int(math.ceil(fetch / (self._show_time * self._bandwidth_share))))
+    #
+    ##############################################################################
+    #
+    # _next_pass()
+    #
+    def _next_pass(self, recent=None):
+        '''
+        Start the next pass of the cached order: cached images shuffled, with images to download
+            spaced out between them and the rest left for later passes. Called with the lock held.
+
+        Args:
+            recent (list): Entry ids shown at the end of the last pass
+        '''
+        spacing = self._miss_spacing()
+        # images left out last time get their turn first
+        entries = self._deferred + random.sample(self._gallery, k=len(self._gallery))
+        self._gallery, self._deferred = cached_order(entries, self._on_hand, spacing, recent)
+        self._loop_pos = 0
+        self._logger.info("Playing %d images, %d to download, one every %d slides; %d wait",
+                          len(self._gallery), len(self._gallery) -
+                          len([entry for entry in self._gallery if self._on_hand(entry)]),
+                          spacing, len(self._deferred))
+    #
+    ##############################################################################
+    #
+    # _update_playlist()
+    #
+    def _update_playlist(self):
+        '''Tell the cache what is coming so it can keep the right images'''
+        with self._lock:
+            self._cache.set_playlist([entry.key for entry in self._gallery])
     #
     ##############################################################################
     #
@@ -459,15 +1314,27 @@ class Slideshow(SmugBase):
             image_url (str): Valid URL to an image file
 
         Returns:
-            str: Binary string data for loaded content
+            str: Binary string data for loaded content or None if it could not be loaded
         '''
+        import requests # pylint: disable=import-outside-toplevel
+
         result = None
         if None not in [image_url]:
             self._logger.info("Loading image '%s'", image_url)
             # Download the image
-            img_data = requests.get(image_url)
+            start = time.perf_counter()
+            try:
+                with get_metrics().span('download'):
+                    img_data = get_transport().get(image_url)
+                img_data.raise_for_status()
+            except requests.RequestException as err:
+                self._logger.error("Loading image '%s' failed: '%s'", image_url, err)
+                return result
 
             result = img_data.content
+            self._costs.observe_fetch(len(result), img_data.elapsed.total_seconds(),
+                                      time.perf_counter() - start,
+                                      self._pixels.get(os.path.basename(image_url)))
 
         return result
 
@@ -486,15 +1353,16 @@ class Slideshow(SmugBase):
 
         result = None
 
-        img = self.find_best_image_size()
+        # a streamed gallery may not have its first entry yet
+        self._ready.wait()
 
-        if None not in [img]:
+        file_name, url = self._image_ref()
 
-            file_name = os.path.basename(img.get('url'))
-            self._logger.debug(self._json_dump(img, True))
+        if None not in [file_name]:
+            result = self._cache_get(file_name, url)
 
-            result = self._cache_get(file_name, img.get('url'))
-            self._cache_size_check()
+        # keep the neighbours warm while this one is on screen
+        self.prefetch()
 
         return result
     #
@@ -509,14 +1377,7 @@ class Slideshow(SmugBase):
         Returns:
             str: Binary string data for next image
         '''
-        self._loop_pos += 1
-
-        # do we need to reset the loop?
-        if self._loop_pos >= len(self._gallery):
-            # re-load the gallery (on the off chance it has been updated while we were running)
-            self.load_gallery()
-            self._loop_pos = 0
-
+        self.move(1)
         return self.current()
     #
     ##############################################################################
@@ -530,22 +1391,404 @@ class Slideshow(SmugBase):
         Returns:
             str: Binary string data for previous image
         '''
-        self._loop_pos -= 1
+        self.move(-1)
+        return self.current()
+    #
+    ##############################################################################
+    #
+    # move()
+    #
+    def move(self, offset=1):
+        '''
+        Move through the gallery without loading anything
 
-        # have we looped around?
-        if self._loop_pos <= 0:
-            self._loop_pos = len(self._gallery)
+        Args:
+            offset (int): 1 for the next image, -1 for the previous one
+        '''
+        with self._lock:
+            if not self._gallery:
+                return
+
+            # have we looped around? The background refresh keeps the gallery up to date,
+            # so the playlist simply starts over, or the cached order plans its next pass
+            if self._order == 'cached' and self._loop_pos + offset >= len(self._gallery):
+                self._next_pass([entry.entry_id for entry in self._gallery[-WINDOW:]])
+                self._update_playlist()
+            else:
+                self._loop_pos = (self._loop_pos + offset) % len(self._gallery)
 
-        return self.current()
-    # Return Exif tags
-    # try:
-    #     tags = exifread.process_file(BytesIO(img_data.content), details=False)
-    # except (Exception) as err:
-    #     raise err
-    #
-    # print(tags)
-
-    # Display some image info
-    # displayText = "Matt Test"
-    # text = largefont.render(displayText, 1, (255, 255, 255))
-    # main_surface.blit(text, (main_surface.get_rect().centerx,main_surface.get_rect().centery))
+            self._cache.set_position(self._loop_pos, offset)
+    #
+    ##############################################################################
+    #
+    # current_key()
+    #
+    def current_key(self):
+        '''
+        Returns:
+            str: Cache key of the current image or None
+        '''
+        return self._image_ref()[0]
+    #
+    ##############################################################################
+    #
+    # image_ref()
+    #
+    def image_ref(self, offset=0):
+        '''
+        Find the image a number of positions away from the current one
+
+        Args:
+            offset (int): Positions ahead (or behind if negative) of the current image
+
+        Returns:
+            tuple: (key, url) or (None, None)
+        '''
+        with self._lock:
+            if not self._gallery:
+                return None, None
+            return self._image_ref((self._loop_pos + offset) % len(self._gallery))
+    #
+    ##############################################################################
+    #
+    # entries()
+    #
+    def entries(self):
+        '''
+        Returns:
+            list: Compact entries of the playlist, in order, then any waiting for a later pass
+        '''
+        with self._lock:
+            return list(self._gallery or []) + self._deferred
+    #
+    ##############################################################################
+    #
+    # image_refs()
+    #
+    def image_refs(self):
+        '''
+        Returns:
+            list: (key, url) of every image in the playlist, from the current one on
+        '''
+        with self._lock:
+            if not self._gallery:
+                return []
+            length = len(self._gallery)
+            refs = [self._image_ref((self._loop_pos + offset) % length)
+                    for offset in range(length)]
+        return [ref for ref in refs if None not in ref]
+    #
+    ##############################################################################
+    #
+    # preview_ref()
+    #
+    def preview_ref(self, offset=0):
+        '''
+        Find the smallest rendition of the image a number of positions away from the current one
+
+        Args:
+            offset (int): Positions ahead (or behind if negative) of the current image
+
+        Returns:
+            tuple: (key, url, size of the chosen rendition), or (None, None, None) if the chosen
+                rendition is already the smallest
+        '''
+        with self._lock:
+            if not self._gallery:
+                return None, None, None
+            entry = self._gallery[(self._loop_pos + offset) % len(self._gallery)]
+            index = self._adapt(entry)
+
+        preview = entry.preview
+        if preview < 0 or index < 0 or preview == index:
+            return None, None, None
+        return (os.path.basename(entry.urls[preview]), entry.urls[preview],
+                (entry.widths[index], entry.heights[index]))
+    #
+    ##############################################################################
+    #
+    # has_image()
+    #
+    def has_image(self, key=None):
+        '''
+        Args:
+            key (str): Cache key
+
+        Returns:
+            bool: True if the image can be loaded without the network
+        '''
+        if key in self._cache:
+            return True
+        return None not in [self._disk_cache] and key in self._disk_cache
+    #
+    ##############################################################################
+    #
+    # observe_decode()
+    #
+    def observe_decode(self, key=None, seconds=None):
+        '''
+        Tell the cost model how long decoding and scaling an image took
+
+        Args:
+            key (str): Cache key from image_ref()
+            seconds (float): Time taken
+        '''
+        self._costs.observe_decode(self._pixels.get(key), seconds)
+    #
+    ##############################################################################
+    #
+    # fetch()
+    #
+    def fetch(self, key=None, url=None):
+        '''
+        Load an image through the memory cache, disk cache and prefetcher, without moving
+
+        Args:
+            key (str): Cache key from image_ref()
+            url (str): URL from image_ref()
+
+        Returns:
+            bytes: Binary string data for the image or None
+        '''
+        return self._cache_get(key, url)
+    #
+    ##############################################################################
+    #
+    # wait_ready()
+    #
+    def wait_ready(self, timeout=None):
+        '''
+        Wait until the gallery has at least one entry or has finished loading
+
+        Args:
+            timeout (float): Seconds to wait. Default: forever
+
+        Returns:
+            bool: True if the gallery is ready
+        '''
+        return self._ready.wait(timeout)
+    #
+    ##############################################################################
+    #
+    # frame_get()
+    #
+    def frame_get(self, size=None, quality=None, key=None):
+        '''
+        Look up a display-ready frame of an image, in the memory cache or else the frame pack.
+            Frames from the pack are taken whatever quality they were baked with.
+
+        Args:
+            size (tuple): Width and height the frame was scaled to
+            quality (str): Scaling quality the frame was made with
+            key (str): Cache key of the image. Default: the current image
+
+        Returns:
+            object: Cached frame or None
+        '''
+        key = self.current_key() if None in [key] else key
+        if None in [key]:
+            return None
+        frame = self._cache.get((key, tuple(size), quality))
+        if None in [frame] and None not in [self._frame_pack] and \
+                tuple(size) == self._frame_pack.size:
+            frame = self._frame_pack.frame(key)
+        return frame
+    #
+    ##############################################################################
+    #
+    # frame_put()
+    #
+    # pylint: disable=too-many-arguments
+    def frame_put(self, size=None, quality=None, frame=None, frame_size=None, key=None):
+        '''
+        Cache a display-ready frame of an image. Frames share the memory budget with the
+            compressed images.
+
+        Args:
+            size (tuple): Width and height the frame was scaled to
+            quality (str): Scaling quality the frame was made with
+            frame (object): The frame, e.g. a pygame.Surface
+            frame_size (int): Memory used by the frame (in bytes)
+            key (str): Cache key of the image. Default: the current image
+        '''
+        key = self.current_key() if None in [key] else key
+        if None not in [key, frame, frame_size]:
+            self._cache.put((key, tuple(size), quality), frame, size=frame_size)
+    #
+    ##############################################################################
+    #
+    # frame_fetch()
+    #
+    # pylint: disable=too-many-arguments
+    def frame_fetch(self, size=None, quality=None, key=None, url=None, pixel_format='RGB'):
+        '''
+        Ask the frame server for a display-ready frame of an image. Blocks while the server
+            fetches, decodes and scales it.
+
+        Args:
+            size (tuple): Width and height to fit in
+            quality (str): Scaling quality
+            key (str): Cache key from image_ref()
+            url (str): URL from image_ref()
+            pixel_format (str): Pixel format of the display
+
+        Returns:
+            tuple: (pixels, size, mode) ready for pygame.image.frombuffer(), or None without a
+                frame server or if it failed
+        '''
+        if None in [self._frame_server]:
+            return None
+        pixels, frame_size, mode = self._frame_server.frame(key, url, size, quality,
+                                                            pixel_format)
+        return None if None in [pixels] else (pixels, frame_size, mode)
+    #
+    ##############################################################################
+    #
+    # prefetch()
+    #
+    def prefetch(self):
+        '''
+        Fetch the images around the current position in the background. Anything still queued
+        from an earlier position that falls outside the new window is cancelled.
+        '''
+        self._prefetch_metadata()
+
+        if None in [self._prefetcher] or None not in [self._frame_server]:
+            # the renderer asking for the next frames is what warms a frame server
+            return
+
+        offsets = list(range(1, self._prefetch_ahead + 1))
+        offsets += [-offset for offset in range(1, self._prefetch_behind + 1)]
+
+        wanted = []
+        with self._lock:
+            if not self._gallery:
+                return
+            length = len(self._gallery)
+            for offset in offsets:
+                key, url = self._image_ref((self._loop_pos + offset) % length)
+                if None in [key] or key in [want[0] for want in wanted]:
+                    continue
+                if key in self._cache:
+                    continue
+                if None not in [self._frame_pack] and key in self._frame_pack:
+                    # nothing to download, but the frame may need reading from disk
+                    self._frame_pack.advise(key)
+                    continue
+                wanted.append((key, url))
+
+        self._prefetcher.schedule(wanted)
+    #
+    ##############################################################################
+    #
+    # _prefetch_metadata()
+    #
+    def _prefetch_metadata(self):
+        '''Read the caption metadata of the current and upcoming images in the background'''
+        if None in [self._metadata_prefetcher]:
+            return
+
+        wanted = []
+        with self._lock:
+            if not self._gallery:
+                return
+            length = len(self._gallery)
+            for offset in range(min(length, self.METADATA_AHEAD + 1)):
+                entry = self._gallery[(self._loop_pos + offset) % length]
+                if entry.original < 0 or entry.entry_id in self._metadata:
+                    continue
+                wanted.append((entry.entry_id, entry.urls[entry.original]))
+
+        self._metadata_prefetcher.schedule(wanted)
+    #
+    ##############################################################################
+    #
+    # metadata()
+    #
+    def metadata(self, offset=0):
+        '''
+        Find the caption metadata of the image a number of positions away from the current one
+
+        Args:
+            offset (int): Positions ahead (or behind if negative) of the current image
+
+        Returns:
+            dict: Caption fields, with the feed title if the image has none, or None if they
+                have not been read yet or metadata is off
+        '''
+        if None in [self._metadata]:
+            return None
+
+        with self._lock:
+            if not self._gallery:
+                return None
+            entry = self._gallery[(self._loop_pos + offset) % len(self._gallery)]
+
+        meta = self._metadata.get(entry.entry_id)
+        if None in [meta]:
+            return None
+        meta = dict(meta)
+        if entry.title and 'title' not in meta:
+            meta['title'] = entry.title
+        return meta
+    #
+    ##############################################################################
+    #
+    # auto_cache_size()
+    #
+    @classmethod
+    def auto_cache_size(cls):
+        '''
+        Size the memory cache from the memory currently available
+
+        Returns:
+            int: Cache size (in bytes). Falls back to MAX_CACHE_SIZE if memory is unknown.
+        '''
+        available = available_memory()
+        if None in [available]:
+            return cls.MAX_CACHE_SIZE
+        return max(cls.MAX_CACHE_SIZE // 4, int(available * cls.AUTO_CACHE_FRACTION))
+    #
+    ##############################################################################
+    #
+    # cache_stats()
+    #
+    def cache_stats(self):
+        '''
+        Returns:
+            dict: Memory cache entry count, size and hit/miss/eviction counters
+        '''
+        return self._cache.stats()
+    #
+    ##############################################################################
+    #
+    # flush()
+    #
+    def flush(self):
+        '''Write out the disk cache index and metadata so a crash does not lose them'''
+        if None not in [self._disk_cache]:
+            self._disk_cache.flush()
+        if None not in [self._metadata]:
+            self._metadata.save()
+    #
+    ##############################################################################
+    #
+    # close()
+    #
+    def close(self):
+        '''Stop any background work'''
+        self._stop.set()
+        self._logger.info("Cache stats: %s", self._json_dump(self.cache_stats()))
+        self._logger.info("Cost model: %s", self._json_dump(self._costs.stats()))
+        if None not in [self._cost_path]:
+            self._costs.save(self._cost_path)
+        if None not in [self._prefetcher]:
+            self._prefetcher.shutdown()
+        if None not in [self._metadata]:
+            self._metadata_prefetcher.shutdown()
+            self._logger.info("Metadata: %s", self._json_dump(self._metadata.stats()))
+            self._metadata.save()
+        if None not in [self._disk_cache]:
+            self._disk_cache.flush()
+        if None not in [self._frame_server]:
+            self._frame_server.close()
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+#
+'''
+Soak Test Classes
+'''
+#
+# Standard Imports
+#
+from __future__ import division, print_function
+import gc
+import logging
+import resource
+import time
+#
+##############################################################################
+#
+# resident_memory()
+#
+def resident_memory():
+    '''
+    Find how much memory this process has resident
+
+    Returns:
+        int: Resident set size (in bytes). The peak if the current size cannot be determined.
+    '''
+    # pylint: disable=broad-except
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except Exception:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+#
+##############################################################################
+#
+# _slope()
+#
+def _slope(points=None):
+    '''
+    Least squares slope of (x, y) points
+
+    Returns:
+        float: dy/dx or 0.0 if x does not vary
+    '''
+    count = len(points)
+    mean_x = sum(x for x, _ in points) / count
+    mean_y = sum(y for _, y in points) / count
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    if not spread:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
+#
+##############################################################################
+#
+# SoakMonitor
+#
+class SoakMonitor(object):
+    '''
+    SoakMonitor - track throughput and memory while slides are shown as fast as possible
+
+    Every interval it samples the slides shown, the resident memory, the bytes in the image cache
+    and the number of objects the garbage collector tracks. Memory grows while the cache fills,
+    so the leak check only looks at the second half of the run: resident memory that keeps
+    growing faster than the cache, or a steadily growing object count, points at a leak.
+    '''
+    #
+    ####################################################################################
+    #
+    # Class variables
+    #
+    # Seconds between samples
+    INTERVAL = 10
+
+    # Growth per 1000 slides after warm-up that counts as a leak. The allocator alone adds a
+    # megabyte or two as frames of different sizes fragment the heap.
+    LEAK_BYTES = 4 * 1024 * 1024
+    LEAK_OBJECTS = 1000
+
+    # Samples needed in the second half to judge growth
+    MIN_SAMPLES = 3
+    #
+    ####################################################################################
+    #
+    # __init__()
+    #
+    def __init__(self, interval=INTERVAL, cache_stats=None, clock=time.monotonic):
+        '''
+        Args:
+            interval (float): Seconds between samples
+            cache_stats (callable): Returns the image cache statistics, with a size in bytes
+            clock (callable): Returns the current time in seconds
+        '''
+        super(SoakMonitor, self).__init__()
+
+        self._logger = logging.getLogger(type(self).__name__)
+
+        self._interval = interval
+        self._cache_stats = cache_stats
+        self._clock = clock
+        self._start = clock()
+        self._slides = 0
+        # (seconds, slides, resident bytes, cache bytes, objects)
+        self._samples = [self._sample()]
+    #
+    ####################################################################################
+    #
+    # _sample()
+    #
+    def _sample(self):
+        cache = self._cache_stats().get('size', 0) if None not in [self._cache_stats] else 0
+        return (self._clock() - self._start, self._slides, resident_memory(), cache,
+                len(gc.get_objects()))
+    #
+    ####################################################################################
+    #
+    # shown()
+    #
+    def shown(self):
+        '''
+        Count a slide that made it to the screen
+
+        Returns:
+            str: A progress line if a sample was due, otherwise None
+        '''
+        self._slides += 1
+        if self._clock() - self._start - self._samples[-1][0] < self._interval:
+            return None
+
+        self._samples.append(self._sample())
+        return self._format(self._samples[-1])
+    #
+    ####################################################################################
+    #
+    # _format()
+    #
+    def _format(self, sample=None):
+        seconds, slides, resident, cache, objects = sample
+        return ('{:>8.1f}s {:>8} slides {:>8.2f} slides/s  RSS {:>7.1f} MB  '
+                'cache {:>7.1f} MB  {:>8} objects'.format(
+                    seconds, slides, slides / seconds if seconds else 0.0,
+                    resident / 1024 / 1024, cache / 1024 / 1024, objects))
+    #
+    ####################################################################################
+    #
+    # summary()
+    #
+    def summary(self):
+        '''
+        Take a last sample and judge the run
+
+        Returns:
+            list: Lines of text with the throughput, memory growth and leak verdict
+        '''
+        self._samples.append(self._sample())
+        first, last = self._samples[0], self._samples[-1]
+        seconds, slides = last[0], last[1]
+
+        lines = [
+            'Slides shown: {} in {:.1f}s, {:.2f} slides/s'.format(
+                slides, seconds, slides / seconds if seconds else 0.0),
+            'RSS: {:.1f} MB -> {:.1f} MB, cache: {:.1f} MB -> {:.1f} MB, objects: {} -> {}'.format(
+                first[2] / 1024 / 1024, last[2] / 1024 / 1024, first[3] / 1024 / 1024,
+                last[3] / 1024 / 1024, first[4], last[4]),
+        ]
+
+        settled = self._samples[len(self._samples) // 2:]
+        if len(settled) < self.MIN_SAMPLES or settled[-1][1] == settled[0][1]:
+            lines.append('Too few samples after warm-up to judge memory growth; run longer')
+            return lines
+
+        per_slide = {
+            'resident': _slope([(sample[1], sample[2]) for sample in settled]),
+            'cache': _slope([(sample[1], sample[3]) for sample in settled]),
+            'objects': _slope([(sample[1], sample[4]) for sample in settled]),
+        }
+        growth = (per_slide['resident'] - per_slide['cache']) * 1000
+        objects = per_slide['objects'] * 1000
+        lines.append('Growth after warm-up per 1000 slides: RSS {:+.2f} MB, cache {:+.2f} MB, '
+                     'objects {:+.0f}'.format(per_slide['resident'] * 1000 / 1024 / 1024,
+                                              per_slide['cache'] * 1000 / 1024 / 1024, objects))
+        if growth > self.LEAK_BYTES or objects > self.LEAK_OBJECTS:
+            lines.append('Possible leak: memory keeps growing beyond the cache')
+        else:
+            lines.append('No leak found')
+        return lines
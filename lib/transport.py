@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+#
+'''
+HTTP Transport Classes
+'''
+#
+# Standard Imports
+#
+from __future__ import print_function
+import logging
+import threading
+#
+# Non-standard imports
+#
+# requests is imported when the first transport is created, off the startup path
+#
+##############################################################################
+#
+# Transport
+#
+class Transport(object):
+    '''
+    Transport - one pooled HTTP session for every SmugMug request
+
+    Connections are kept alive and reused per host, at most pool_size of them at once (extra
+    requests wait for a free connection rather than opening more). Every request has a connect
+    and a read timeout, and failed connections or 429/5xx responses are retried a bounded number
+    of times with exponential backoff.
+    '''
+    #
+    ####################################################################################
+    #
+    # Class variables
+    #
+    CONNECT_TIMEOUT = 5
+    READ_TIMEOUT = 30
+    RETRIES = 3
+    BACKOFF = 0.5
+    POOL_SIZE = 4
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    USER_AGENT = 'smugmug_slideshow'
+    #
+    ####################################################################################
+    #
+    # __init__()
+    #
+    # pylint: disable=too-many-arguments
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 retries=RETRIES, backoff=BACKOFF, pool_size=POOL_SIZE):
+        '''
+        Args:
+            connect_timeout (float): Seconds to wait for a connection
+            read_timeout (float): Seconds to wait between bytes of a response
+            retries (int): Maximum number of retries per request
+            backoff (float): Backoff factor. Retries wait backoff * 2 ** (retry - 1) seconds.
+            pool_size (int): Maximum number of connections per host
+        '''
+        # pylint: disable=import-outside-toplevel
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        super(Transport, self).__init__()
+
+        self._logger = logging.getLogger(type(self).__name__)
+
+        self._timeout = (connect_timeout, read_timeout)
+
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries,
+                      backoff_factor=backoff, status_forcelist=self.RETRY_STATUSES,
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=max(1, pool_size),
+                              pool_block=True, max_retries=retry)
+
+        self._session = requests.Session()
+        self._session.headers['User-Agent'] = self.USER_AGENT
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+    #
+    ####################################################################################
+    #
+    # get()
+    #
+    def get(self, url=None, **kwargs):
+        '''
+        GET a URL through the shared pool
+
+        Args:
+            url (str): URL to load
+            kwargs: Passed on to requests.Session.get(). timeout defaults to the transport's.
+
+        Returns:
+            requests.Response: The response
+
+        Raises:
+            requests.RequestException: When the request fails after all retries
+        '''
+        kwargs.setdefault('timeout', self._timeout)
+        return self._session.get(url, **kwargs)
+    #
+    ####################################################################################
+    #
+    # close()
+    #
+    def close(self):
+        '''Close all pooled connections'''
+        self._session.close()
+#
+##############################################################################
+#
+# Shared transport
+#
+_TRANSPORT = None
+_TRANSPORT_LOCK = threading.Lock()
+
+def configure_transport(**kwargs):
+    '''
+    Replace the shared transport
+
+    Args:
+        kwargs: Passed on to Transport()
+
+    Returns:
+        Transport: The new shared transport
+    '''
+    global _TRANSPORT # pylint: disable=global-statement
+    with _TRANSPORT_LOCK:
+        if None not in [_TRANSPORT]:
+            _TRANSPORT.close()
+        _TRANSPORT = Transport(**kwargs)
+        return _TRANSPORT
+
+def get_transport():
+    '''
+    Returns:
+        Transport: The shared transport, created with defaults on first use
+    '''
+    global _TRANSPORT # pylint: disable=global-statement
+    with _TRANSPORT_LOCK:
+        if None in [_TRANSPORT]:
+            _TRANSPORT = Transport()
+        return _TRANSPORT
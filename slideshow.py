@@ -8,7 +8,11 @@ Run a SmugMug Slideshow
 # Standard Imports
 #
 from __future__ import absolute_import, division, print_function, unicode_literals
+from time import perf_counter
+# Start of the startup timing breakdown
+STARTED = perf_counter()
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime
 import json
 import logging
@@ -22,11 +26,7 @@ import sys
 #
 # Non-standard imports
 #
-from io import BytesIO
-
-import PIL
-# pylint: disable=unused-import
-from PIL import Image
+# Pillow is imported on first use; the show decodes in worker processes by default
 
 import pygame
 from pygame import display, image, time
@@ -41,7 +41,19 @@ sys.path.append(str(LIB_PATH))
 # pylint: disable=wrong-import-position
 # local directory imports here
 #
+from cache import LruCache
+from framepack import display_format, FramePack
+from frameserver import FrameClient, SOCKET_PATH
+from imaging import SCALE_QUALITIES, SCALE_QUALITY
+from metadata import caption_lines
+from metrics import configure_metrics, get_metrics
+from ordering import ORDER, ORDERS
+from overlay import get_text_cache, Overlay
+from render import FRAME_READY, Renderer
+from scheduler import Scheduler
 from smug import Slideshow
+from soak import SoakMonitor
+from transport import configure_transport, Transport
 #
 ##############################################################################
 #
@@ -54,6 +66,33 @@ DISPLAY_TIME = 45 * 1000
 
 FONT = 'courier'
 
+# Share of the show time an image may take to fetch, decode and scale
+TIME_BUDGET_FRACTION = 0.25
+
+# Redraws per second at most, however fast events arrive
+MAX_FPS = 60
+
+# Seconds after a slide change before background tasks may run
+IDLE_HOLD = 0.5
+
+# Seconds of background tasks to run per idle wake-up
+TASK_BUDGET = 0.005
+
+# How often to write out the disk cache index (in seconds)
+CACHE_FLUSH_INTERVAL = 5 * 60
+
+# How often to write the metrics file (in seconds)
+METRICS_INTERVAL = 15
+
+# How often to refresh the clock, caption and metrics overlays (in seconds)
+OVERLAY_INTERVAL = 1
+
+# strftime() format of the clock
+CLOCK_FORMAT = '%H:%M'
+
+# With a show time of 0, how long to wait for a slide before skipping it (in milliseconds)
+STALL_TIME = 30 * 1000
+
 STARTUP_TEXT = """SmugMug Slideshow
 
 [Escape]    Stop the show
@@ -104,9 +143,12 @@ def _json_serial(obj):
 #
 # init_display()
 #
-def init_display():
+def init_display(size=None):
     '''
     Initialize pygame display
+
+    Args:
+        size (tuple): Width and height of the display. Default: the whole screen
     '''
     # Get the size of the display
     display.init()
@@ -115,6 +157,8 @@ def init_display():
     info = display.Info()
     max_y = info.current_h
     max_x = info.current_w
+    if size:
+        max_x, max_y = size
 
     _get_logger().info(info)
 
@@ -144,121 +188,36 @@ def init_fonts():
 #
 ##############################################################################
 #
-# resize_contain()
-#
-def resize_contain(the_image=None, size=None):
-    """
-    Resize image according to size.
-
-    Inspiration fron:
-    https://github.com/charlesthk/python-resize-image/blob/master/resizeimage/resizeimage.py#L98
-
-    Args:
-        image (PIL.Image): A Pillow image instance
-        size (list): A list of two integers [width, height]
-
-    Returns:
-        PIL.Image: Scaled image results
-    """
-    img_format = the_image.format
-    img = the_image.copy()
-
-    # NOTE: https://pillow.readthedocs.io/en/5.2.x/handbook/concepts.html#filters-comparison-table
-    img.thumbnail(size, PIL.Image.LANCZOS)
-
-    # FIll with black. Non-alpha mode
-    background = PIL.Image.new('RGB', size, (0, 0, 0))
-    img_position = (
-        int(math.ceil((size[0] - img.size[0]) / 2)),
-        int(math.ceil((size[1] - img.size[1]) / 2))
-    )
-    background.paste(img, img_position)
-    background.format = img_format
-    return background
-#
-##############################################################################
-#
-# scale_image()
-#
-def scale_image(img=None, size=None):
-    '''
-    Take loaded image bytes and scale it to the max size that will fit in the width x height
-        provided while preserving the aspect ratio of the original.
-
-    Inspiration fron:
-    https://github.com/charlesthk/python-resize-image/blob/master/resizeimage/resizeimage.py#L98
-
-    Args:
-        picture (BytesIO): The image data to scale
-        size (set): Two member set of width and height
-
-    Return:
-        pygame.image: Image result (might be unchanged)
-
-    Raises:
-        RuntimeError: If any arguments are missing
-    '''
-
-    # Make a copy, which is stupid, but everything that touches img closes it
-    tmp_img = BytesIO(img.getvalue())
-    result = pygame.image.load(tmp_img)
-
-    if None in [img, size]:
-        raise RuntimeError("Missing an argument!")
-
-    scaled = None
-    # pylint: disable=broad-except
-    try:
-        with PIL.Image.open(img) as pil_image:
-            scaled = resize_contain(pil_image, size)
-    except Exception as err:
-        _get_logger().error("Scaling failed: '%s'", err)
-
-    try:
-        result = pygame.image.fromstring(scaled.tobytes(), scaled.size, scaled.mode)
-    except Exception as err:
-        _get_logger().error("Loading failed: '%s'", err)
-
-    return result
-#
-##############################################################################
-#
-# draw_image()
+# draw_picture()
 #
-def draw_image(surface=None, image_file=None):
+def draw_picture(surface=None, picture=None, overlay=None):
     '''
-    Draw the provided image on the global display
+    Draw an already scaled picture centered on the global display
 
     Args:
         surface (pygame.display): On which display to draw.
-        image_file (str or buffer): File path on disk or binary buffer
+        picture (pygame.Surface): Scaled picture
+        overlay (Overlay): Overlay to draw again over the picture
 
     Returns:
         bool: True or False indicating sucess and that the display should be updated
     '''
-    update_display = False
-
     surface = display.get_surface() if None in [surface] else surface
 
-    if None in [surface, image_file]:
+    if None in [surface, picture]:
         _get_logger().warning("Missing required argument. No-op.")
-
-    else:
-        _get_logger().info("Trying to scale the image...")
-        # pylint: disable=bare-except
-        try:
-            picture = scale_image(img=image_file, size=surface.get_size())
-
-            # clear the previous displayed image
-            surface.fill(pygame.Color('black'))
-            imagepos = picture.get_rect()
-            imagepos.centerx = surface.get_rect().centerx
-            imagepos.centery = surface.get_rect().centery
-            surface.blit(picture, imagepos)
-            update_display = True
-        except:
-            update_display = False
-    return update_display
+        return False
+
+    with get_metrics().span('blit'):
+        # clear the previous displayed image
+        surface.fill(pygame.Color('black'))
+        imagepos = picture.get_rect()
+        imagepos.centerx = surface.get_rect().centerx
+        imagepos.centery = surface.get_rect().centery
+        surface.blit(picture, imagepos)
+    if None not in [overlay]:
+        overlay.set_picture(picture, imagepos)
+    return True
 #
 ##############################################################################
 #
@@ -293,9 +252,10 @@ def draw_multiline_text(surface=None, text=None, pos=None, font=None, color=pyga
     max_width = surface.get_size()[0]
 
     current_x, current_y = pos
+    texts = get_text_cache()
     for line in words:
         for word in line:
-            word_surface = font.render(word, 0, color)
+            word_surface = texts.render(font, word, color, antialias=False)
             word_width, word_height = word_surface.get_size()
             if current_x + word_width >= max_width:
                 current_x = pos[0]  # Reset the x.
@@ -307,6 +267,78 @@ def draw_multiline_text(surface=None, text=None, pos=None, font=None, color=pyga
 #
 ##############################################################################
 #
+# log_startup()
+#
+def log_startup(phases=None):
+    '''
+    Log how long startup took to the first image, phase by phase
+
+    Args:
+        phases (list): (name, seconds) of every phase
+    '''
+    _get_logger().info("Startup took %.2fs to the first image: %s", perf_counter() - STARTED,
+                       ', '.join('{} {:.2f}s'.format(name, seconds) for name, seconds in phases))
+#
+##############################################################################
+#
+# open_frame_pack()
+#
+def open_frame_pack(path=None, size=None):
+    '''
+    Map a frame pack baked for the display
+
+    Args:
+        path (str): Pack file written by bake.py
+        size (tuple): Width and height of the display
+
+    Returns:
+        FramePack: The pack or None if it cannot be used
+    '''
+    try:
+        pack = FramePack(path)
+    except (OSError, RuntimeError) as err:
+        _get_logger().error("Not using frame pack '%s': '%s'", path, err)
+        return None
+
+    if pack.size != tuple(size):
+        _get_logger().warning("Not using frame pack '%s': baked for %dx%d, display is %dx%d",
+                              path, pack.size[0], pack.size[1], size[0], size[1])
+        pack.close()
+        return None
+    return pack
+#
+##############################################################################
+#
+# next_events()
+#
+def next_events(scheduler=None):
+    '''
+    Sleep until there is something to handle. Scheduled tasks run whenever the wait ends
+        without an event, so they only use time the show would otherwise spend idle.
+
+    Args:
+        scheduler (Scheduler): Background tasks to run while idle
+
+    Returns:
+        list: Every pending pygame event, at least one
+    '''
+    while 1:
+        timeout = scheduler.timeout() if None not in [scheduler] else None
+        if None in [timeout]:
+            # pylint: disable=no-member
+            event = pygame.event.wait()
+        else:
+            # wait(0) would block forever
+            event = pygame.event.wait(max(1, int(math.ceil(timeout * 1000))))
+
+        # pylint: disable=no-member
+        if event.type != pygame.NOEVENT:
+            return [event] + pygame.event.get()
+
+        scheduler.run_pending(budget=TASK_BUDGET)
+#
+##############################################################################
+#
 # main()
 #
 def handle_arguments():
@@ -319,13 +351,19 @@ def handle_arguments():
     #
     # Handle CLI args
     #
-    parser = argparse.ArgumentParser(description='Run a slideshow of a SmugMug gallery')
+    parser = argparse.ArgumentParser(description='Run a slideshow of one or more SmugMug galleries')
 
-    # add arguments
-    group = parser.add_mutually_exclusive_group(required=True)
+    # add arguments - every gallery and nickname given is merged into one playlist
+    parser.add_argument('-g', '--gallery-id', action='append',
+                        help='Gallery Id to display. May be repeated.')
+    parser.add_argument('-u', '--gallery-url', action='append',
+                        help='URL of Gallery to display. May be repeated.')
+    parser.add_argument('-n', '--nickname', action='append',
+                        help='SmugMug nickname whose recent images to display. May be repeated.')
 
-    group.add_argument('-g', '--gallery-id', action='store', help='Gallery Id to display')
-    group.add_argument('-u', '--gallery-url', action='store', help='URL of Gallery to display')
+    parser.add_argument("--site-url", action='store', required=False, default=Slideshow.SITE_URL,
+                        help=("Site to look gallery ids and nicknames up on. "
+                              "Default: {}".format(Slideshow.SITE_URL)))
 
     parser.add_argument("--debug", action='store_true', required=False, default=False,
                         help="Enable debug mode. Increases verbosity and shortens show time.")
@@ -339,11 +377,183 @@ def handle_arguments():
                         default=DEFAULT_LOG_LEVEL.upper(),
                         help='Logging verbosity. Default: {}'.format(DEFAULT_LOG_LEVEL.upper()))
 
+    parser.add_argument("--cache-size", action='store', required=False,
+                        default=str(Slideshow.MAX_CACHE_SIZE // 1024 // 1024),
+                        help=("Maximum size of the in-memory image cache in megabytes, or 'auto' "
+                              "to size it from available memory. "
+                              "Default: {}".format(Slideshow.MAX_CACHE_SIZE // 1024 // 1024)))
+
+    parser.add_argument("--cache-policy", action='store', required=False,
+                        choices=sorted(Slideshow.CACHE_POLICIES), default=Slideshow.CACHE_POLICY,
+                        help=("Memory cache eviction policy: least recently used, or the image "
+                              "whose next use in the playlist is furthest away. "
+                              "Default: {}".format(Slideshow.CACHE_POLICY)))
+
+    parser.add_argument("--order", action='store', required=False, choices=ORDERS,
+                        default=ORDER,
+                        help=("Playlist order: a shuffle of every image, or passes of the images "
+                              "already cached with new ones spaced out as fast as the link "
+                              "allows, for slow or metered connections. Default: {}".format(ORDER)))
+
+    parser.add_argument("--bandwidth-share", action='store', required=False,
+                        default=Slideshow.BANDWIDTH_SHARE, type=float,
+                        help=("Share of the measured bandwidth --order cached lets downloads of "
+                              "new images use, between 0 and 1. "
+                              "Default: {}".format(Slideshow.BANDWIDTH_SHARE)))
+
+    parser.add_argument("--cache-dir", action='store', required=False, default=None,
+                        help=("Directory for a persistent image cache that survives restarts. "
+                              "Default: memory only"))
+
+    parser.add_argument("--disk-cache-size", action='store', required=False,
+                        default=Slideshow.MAX_DISK_CACHE_SIZE // 1024 // 1024, type=int,
+                        help=("Maximum size of the persistent image cache in megabytes. "
+                              "Default: {}".format(Slideshow.MAX_DISK_CACHE_SIZE // 1024 // 1024)))
+
+    parser.add_argument("--connect-timeout", action='store', required=False,
+                        default=Transport.CONNECT_TIMEOUT, type=float,
+                        help=("Seconds to wait for a SmugMug connection. "
+                              "Default: {}".format(Transport.CONNECT_TIMEOUT)))
+
+    parser.add_argument("--read-timeout", action='store', required=False,
+                        default=Transport.READ_TIMEOUT, type=float,
+                        help=("Seconds to wait for more of a SmugMug response. "
+                              "Default: {}".format(Transport.READ_TIMEOUT)))
+
+    parser.add_argument("--retries", action='store', required=False, default=Transport.RETRIES,
+                        type=int,
+                        help=("Maximum retries, with exponential backoff, for failed requests. "
+                              "Default: {}".format(Transport.RETRIES)))
+
+    parser.add_argument("--connections-per-host", action='store', required=False,
+                        default=Transport.POOL_SIZE, type=int,
+                        help=("Maximum kept-alive connections to each host. "
+                              "Default: {}".format(Transport.POOL_SIZE)))
+
+    parser.add_argument("--refresh-interval", action='store', required=False,
+                        default=Slideshow.REFRESH_INTERVAL, type=int,
+                        help=("Seconds between background checks of the gallery feed for changes. "
+                              "0 disables them. Default: {}".format(Slideshow.REFRESH_INTERVAL)))
+
+    parser.add_argument("--stream", action='store_true', required=False, default=False,
+                        help=("Stream the gallery feed and start the show with the first items "
+                              "while the rest keeps loading. Default: False"))
+
+    parser.add_argument("--prefetch-ahead", action='store', required=False,
+                        default=Slideshow.PREFETCH_AHEAD, type=int,
+                        help=("Number of upcoming images to fetch in the background. "
+                              "Default: {}".format(Slideshow.PREFETCH_AHEAD)))
+
+    parser.add_argument("--prefetch-behind", action='store', required=False,
+                        default=Slideshow.PREFETCH_BEHIND, type=int,
+                        help=("Number of previous images to fetch in the background. "
+                              "Default: {}".format(Slideshow.PREFETCH_BEHIND)))
+
+    parser.add_argument("--prefetch-workers", action='store', required=False,
+                        default=Slideshow.PREFETCH_WORKERS, type=int,
+                        help=("Maximum number of concurrent background fetches. "
+                              "Default: {}".format(Slideshow.PREFETCH_WORKERS)))
+
+    parser.add_argument("--scale-quality", action='store', required=False,
+                        choices=sorted(SCALE_QUALITIES), default=SCALE_QUALITY,
+                        help=("Image scaling quality. fast and balanced decode JPEGs at reduced "
+                              "size first. Default: {}".format(SCALE_QUALITY)))
+
+    parser.add_argument("--render-processes", action='store', required=False,
+                        default=Renderer.PROCESSES, type=int,
+                        help=("Worker processes that decode and scale images. 0 does it on "
+                              "background threads instead. Default: {}".format(Renderer.PROCESSES)))
+
+    parser.add_argument("--render-ahead", action='store', required=False,
+                        default=Renderer.RENDER_AHEAD, type=int,
+                        help=("Number of upcoming images to decode and scale ahead of time. "
+                              "Default: {}".format(Renderer.RENDER_AHEAD)))
+
+    parser.add_argument("--no-preview", action='store_true', required=False, default=False,
+                        help=("Do not show the smallest rendition of an image, scaled up, while "
+                              "the full one downloads. Default: False"))
+
+    parser.add_argument("--no-adaptive", action='store_true', required=False, default=False,
+                        help=("Always show the rendition that best fits the display, instead of "
+                              "a smaller one when fetching, decoding and scaling it would take "
+                              "more than {:.0f}%% of the show time. "
+                              "Default: False".format(TIME_BUDGET_FRACTION * 100)))
+
+    parser.add_argument("--metrics-port", action='store', required=False, default=None, type=int,
+                        help=("Serve hot path timings and cache counters in the Prometheus "
+                              "format on this local port. Default: off"))
+
+    parser.add_argument("--metrics-file", action='store', required=False, default=None,
+                        help=("Write hot path timings and cache counters in the Prometheus "
+                              "format to this file every {} seconds, e.g. for the node exporter "
+                              "textfile collector. Default: off".format(METRICS_INTERVAL)))
+
+    parser.add_argument("--metrics-overlay", action='store_true', required=False, default=False,
+                        help="Show hot path timings and cache counters on screen. Default: False")
+
+    parser.add_argument("--clock", action='store', required=False, default=None, nargs='?',
+                        const=CLOCK_FORMAT, metavar='FORMAT',
+                        help=("Show the time in the bottom right corner, in a strftime() format. "
+                              "Default: off, or {} if no format is given".format(
+                                  CLOCK_FORMAT.replace('%', '%%'))))
+
+    parser.add_argument("--caption", action='store_true', required=False, default=False,
+                        help=("Show the title, camera, exposure and date of each image in the "
+                              "bottom left corner, read from the start of the original with a "
+                              "Range request. With --cache-dir they are kept between runs. "
+                              "Default: False"))
+
+    parser.add_argument("--frame-server", action='store', required=False, default=None,
+                        nargs='?', const=SOCKET_PATH, metavar='SOCKET',
+                        help=("Take the playlist, images and scaled frames from slideshowd.py "
+                              "listening on this Unix socket or HOST:PORT, instead of loading, "
+                              "fetching and scaling here. Galleries are then given to "
+                              "slideshowd.py. Default: off, or {} if no socket is "
+                              "given".format(SOCKET_PATH)))
+
+    parser.add_argument("--frame-pack", action='store', required=False, default=None,
+                        help=("Frame pack made by bake.py for this display size. Its images are "
+                              "shown without fetching or decoding them. Default: none"))
+
+    parser.add_argument("--headless", action='store_true', required=False, default=False,
+                        help=("Render offscreen with the SDL dummy video driver instead of opening "
+                              "a window, and report throughput and memory growth. "
+                              "Default: False"))
+
+    parser.add_argument("--resolution", action='store', required=False, default=None, type=int,
+                        nargs=2, metavar=('WIDTH', 'HEIGHT'),
+                        help="Display size to render for. Default: the whole screen")
+
+    parser.add_argument("--slides", action='store', required=False, default=0, type=int,
+                        help="Stop after showing this many slides. 0 runs forever. Default: 0")
+
+    parser.add_argument("--report-interval", action='store', required=False,
+                        default=SoakMonitor.INTERVAL, type=float,
+                        help=("Seconds between throughput and memory reports in headless mode. "
+                              "Default: {}".format(SoakMonitor.INTERVAL)))
+
     parser.add_argument("--show-time", action='store', required=False, default=DISPLAY_TIME,
                         type=int,
-                        help="Time in milliseconds to show image. Default: {}".format(DISPLAY_TIME))
+                        help=("Time in milliseconds to show image. 0 shows the next one as soon "
+                              "as the current one is on screen. Default: {}".format(DISPLAY_TIME)))
+
+    args = parser.parse_args()
+
+    if not (args.gallery_id or args.gallery_url or args.nickname or args.frame_server):
+        parser.error("at least one of -g/--gallery-id, -u/--gallery-url, -n/--nickname or "
+                     "--frame-server is required")
 
-    return parser.parse_args()
+    if args.frame_server:
+        # the server decodes and scales
+        args.render_processes = 0
+
+    if args.cache_size != 'auto':
+        try:
+            args.cache_size = int(args.cache_size) * 1024 * 1024
+        except ValueError:
+            parser.error("--cache-size must be a number of megabytes or 'auto'")
+
+    return args
 #
 ##############################################################################
 #
@@ -356,6 +566,18 @@ def main():
 
     args = handle_arguments()
 
+    # (name, seconds) of every startup phase, logged once the first image is up
+    phases = []
+    last = STARTED
+
+    def phase(name):
+        nonlocal last
+        now = perf_counter()
+        phases.append((name, now - last))
+        last = now
+
+    phase('imports')
+
     if args.debug:
         args.log_level = 'INFO'
         # 5 seconds is too fast once images are cached: one cannot interupt easily
@@ -365,17 +587,62 @@ def main():
     logging.basicConfig(format='%(levelname)s:%(module)s.%(funcName)s:%(message)s',
                         level=getattr(logging, args.log_level.upper()))
 
-    # pylint: disable=no-member
-    pygame.init()
+    # timing spans cost next to nothing unless something reads them
+    metrics = configure_metrics(enabled=(None not in [args.metrics_port] or
+                                         None not in [args.metrics_file] or
+                                         args.metrics_overlay))
+    if None not in [args.metrics_port]:
+        metrics.serve(port=args.metrics_port)
 
-    # init the pygame dislay (Sloooooow)
-    init_display()
+    if args.headless:
+        # render into SDL's offscreen surface, no window or console needed
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+
+    # as fast as possible: every slide goes as soon as it is up, paging is not waited out
+    fast = args.show_time <= 0
 
+    # only the display is needed to learn its size; pygame.init() would also open the audio
+    # device, which the show never uses
+    display.init()
     info = display.Info()
+    size = tuple(args.resolution) if args.resolution else (info.current_w, info.current_h)
+
+    frame_pack = None
+    if None not in [args.frame_pack]:
+        frame_pack = open_frame_pack(args.frame_pack, size)
+
+    def load_show():
+        started = perf_counter()
+        # every SmugMug request goes through one pooled session
+        configure_transport(connect_timeout=args.connect_timeout, read_timeout=args.read_timeout,
+                            retries=args.retries, pool_size=args.connections_per_host)
+        show = Slideshow(gallery_id=args.gallery_id, gallery_url=args.gallery_url,
+                         nickname=args.nickname, site_url=args.site_url,
+                         downscale=args.downscale_only, height=size[1], width=size[0],
+                         cache_size=args.cache_size, cache_policy=args.cache_policy,
+                         prefetch_ahead=args.prefetch_ahead, prefetch_behind=args.prefetch_behind,
+                         prefetch_workers=args.prefetch_workers, cache_dir=args.cache_dir,
+                         disk_cache_size=args.disk_cache_size * 1024 * 1024,
+                         stream=args.stream, frame_pack=frame_pack,
+                         frame_server=(FrameClient(path=args.frame_server)
+                                       if args.frame_server else None),
+                         metadata=args.caption, order=args.order,
+                         show_time=None if fast else args.show_time / 1000,
+                         bandwidth_share=args.bandwidth_share,
+                         # a frame server shares the renditions it chose between displays
+                         time_budget=(None if args.no_adaptive or fast or args.frame_server else
+                                      args.show_time / 1000 * TIME_BUDGET_FRACTION))
+        return show, perf_counter() - started
+
+    # the gallery loads and the render processes start while the display, fonts and startup
+    # message come up
+    loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix='startup')
+    loading = loader.submit(load_show)
+    workers = Renderer.start_workers(args.render_processes)
 
-    slide_show = Slideshow(gallery_id=args.gallery_id, gallery_url=args.gallery_url,
-                           downscale=args.downscale_only, height=info.current_h,
-                           width=info.current_w)
+    # init the pygame dislay (Sloooooow)
+    init_display(size=size)
+    phase('display')
 
     # init fonts
     fonts = init_fonts()
@@ -384,62 +651,181 @@ def main():
     main_surface = pygame.display.get_surface()
     main_surface.fill(pygame.Color('black'))
 
+    if None not in [frame_pack] and frame_pack.pixel_format != display_format(main_surface):
+        _get_logger().warning("Frame pack is %s but the display wants %s: every frame is "
+                              "converted as it is drawn", frame_pack.pixel_format,
+                              display_format(main_surface))
+
     center_x = main_surface.get_rect().centerx
     center_y = main_surface.get_rect().centery
 
-    # Display startup message for 5 seconds
+    # Display the startup message until the first image is ready
     draw_multiline_text(surface=main_surface, text=STARTUP_TEXT, pos=(center_x, center_y),
                         font=fonts['medium'])
     display.flip()
-    pygame.time.delay(5000)
-
-    # Start by drawing the first image
-    update = draw_image(image_file=BytesIO(slide_show.current()))
-    # update = draw_image(image_file=slide_show.current())
-    if update:
-        display.flip()
-
-    # draw an image at set intervals by sending an event on an interval
-    # pylint: disable=no-member
-    time.set_timer(pygame.USEREVENT, args.show_time)
+    phase('fonts and message')
+
+    slide_show, loaded = loading.result()
+    loader.shutdown()
+    phase('waiting for gallery')
+    phases.append(('gallery (alongside)', loaded))
+
+    # fetch, decode and scale happen off the event loop, which only blits and flips
+    renderer = Renderer(slide_show=slide_show, size=main_surface.get_size(),
+                        quality=args.scale_quality, processes=args.render_processes,
+                        render_ahead=args.render_ahead, preview=not args.no_preview,
+                        workers=workers)
+    phase('renderer')
+
+    metrics.add_collector('cache', slide_show.cache_stats, counters=LruCache.COUNTERS)
+    metrics.add_collector('render', lambda: {'dropped_jobs': renderer.dropped},
+                          counters=('dropped_jobs',))
+    metrics.add_collector('text_cache', get_text_cache().stats, counters=LruCache.COUNTERS)
+
+    # text over the picture: between slides only the regions that changed are redrawn
+    overlay = Overlay(surface=main_surface)
+
+    def set_overlay():
+        if args.metrics_overlay:
+            overlay.set('metrics', metrics.summary(), font=fonts['small'])
+        if None not in [args.clock]:
+            overlay.set('clock', [datetime.now().strftime(args.clock)], font=fonts['large'],
+                        anchor='bottomright')
+        if args.caption:
+            overlay.set('caption', caption_lines(slide_show.metadata()), font=fonts['small'],
+                        anchor='bottomleft')
+
+    def refresh_overlay():
+        set_overlay()
+        # the startup message stays untouched until the first image is up
+        if None in [phases] and overlay.dirty:
+            with metrics.span('overlay'):
+                display.update(overlay.draw())
+
+    monitor = None
+    if args.headless:
+        monitor = SoakMonitor(interval=args.report_interval, cache_stats=slide_show.cache_stats)
+
+    def stop():
+        renderer.close()
+        slide_show.close()
+        if None not in [frame_pack]:
+            frame_pack.close()
+        if None not in [monitor]:
+            print('\n'.join(monitor.summary()))
+        if None not in [args.metrics_file]:
+            metrics.write_textfile(args.metrics_file)
+        metrics.close()
+        sys.exit(0)
+
+    # background chores run on the main thread only while it is idle
+    scheduler = Scheduler()
+    if args.refresh_interval > 0:
+        scheduler.every(args.refresh_interval, slide_show.refresh_in_background, name='refresh')
+    scheduler.every(CACHE_FLUSH_INTERVAL, slide_show.flush, name='flush')
+    if None not in [args.metrics_file]:
+        scheduler.every(METRICS_INTERVAL, lambda: metrics.write_textfile(args.metrics_file),
+                        name='metrics')
+    if args.metrics_overlay or args.caption or None not in [args.clock]:
+        scheduler.every(OVERLAY_INTERVAL, refresh_overlay, name='overlay')
+    clock = time.Clock()
+
+    shown = 0
+
+    def slide_shown():
+        # a full frame made it to the screen
+        nonlocal shown
+        shown += 1
+        if None not in [monitor]:
+            report = monitor.shown()
+            if None not in [report]:
+                print(report)
+        if args.slides and shown >= args.slides:
+            stop()
+        if fast:
+            # pylint: disable=no-member
+            pygame.event.post(pygame.event.Event(pygame.USEREVENT))
+
+    def show_slide():
+        if fast:
+            # skip a slide that never arrives
+            time.set_timer(pygame.USEREVENT, STALL_TIME)
+        else:
+            # let the user page through images before any background work starts
+            scheduler.hold(IDLE_HOLD)
+        scheduler.call_later(0, slide_show.prefetch, name='prefetch')
+        # a frame rendered ahead of time is drawn right away, otherwise FRAME_READY follows
+        picture = renderer.request()
+        if None in [picture] or not draw_picture(surface=main_surface, picture=picture,
+                                                 overlay=overlay):
+            return False
+        slide_shown()
+        return True
+
+    # Start rendering the first image; the startup message stays up until it is ready
+    update = show_slide()
 
     # the event loop
     while 1:
 
-        update = True
         try:
             # pylint: disable=no-member
-            for event in pygame.event.get():
+            for event in next_events(scheduler):
 
                 if event.type == pygame.QUIT:
-                    sys.exit(0)
+                    stop()
 
                 # keypresses
                 if event.type == pygame.KEYUP:
                     # look for escape key
                     if event.key == pygame.K_ESCAPE:
-                        sys.exit(0)
+                        stop()
 
                     # left arrow - display the previous image
                     if event.key == pygame.K_LEFT:
-                        # Draw the image
-                        update = draw_image(image_file=BytesIO(slide_show.previous()))
+                        slide_show.move(-1)
+                        update = show_slide() or update
 
                     # right arrow - display the next image
                     if event.key == pygame.K_RIGHT:
-                        # Draw the image
-                        update = draw_image(image_file=BytesIO(slide_show.next()))
+                        slide_show.move(1)
+                        update = show_slide() or update
 
                 # image display events
                 if event.type == pygame.USEREVENT:
-                    # Draw the image
-                    update = draw_image(image_file=BytesIO(slide_show.next()))
-
-                # Update the display - sometimes can't find a good image size match
-                if update:
+                    slide_show.move(1)
+                    update = show_slide() or update
+
+                # a rendered frame, or a preview of one - only draw it if the show is still on
+                # that image. The full frame replaces a preview in a single flip.
+                if event.type == FRAME_READY and event.key == slide_show.current_key():
+                    if draw_picture(surface=main_surface, picture=event.frame,
+                                    overlay=overlay):
+                        update = True
+                        if not event.preview:
+                            slide_shown()
+
+            # Update the display once per batch of events, at most MAX_FPS times a second
+            if update:
+                set_overlay()
+                overlay.draw()
+                with metrics.span('flip'):
                     display.flip()
+
+                if None not in [phases]:
+                    phase('first image')
+                    log_startup(phases)
+                    phases = None
+                    # draw an image at set intervals by sending an event on an interval, counting
+                    # from the first one
+                    # pylint: disable=no-member
+                    if not fast:
+                        time.set_timer(pygame.USEREVENT, args.show_time)
+
+                clock.tick(0 if fast else MAX_FPS)
+            update = False
         except KeyboardInterrupt:
-            sys.exit(0)
+            stop()
 
 if __name__ == '__main__':
     main()
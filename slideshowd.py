@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+'''
+Serve SmugMug galleries to every slideshow.py --frame-server on this machine or the LAN
+'''
+#
+# Standard Imports
+#
+from __future__ import absolute_import, division, print_function, unicode_literals
+import argparse
+import logging
+import os
+try:
+    from pathlib import Path
+except ModuleNotFoundError:
+    from pathlib2 import Path
+import signal
+import sys
+import threading
+#
+# Ensure ./lib is in the lib path for local includes
+#
+LIB_PATH = Path(__file__).resolve().parent / 'lib'
+sys.path.append(str(LIB_PATH))
+#
+# pylint: disable=wrong-import-position
+# local directory imports here
+#
+from frameserver import FrameServer, SOCKET_PATH
+from smug import Slideshow
+from transport import configure_transport, Transport
+#
+##############################################################################
+#
+# Global Variables
+#
+DEFAULT_LOG_LEVEL = os.environ.get('PY_LOG_LEVEL', 'WARNING')
+
+# Renditions are chosen for the largest display served; smaller ones are scaled from them
+RESOLUTION = (3840, 2160)
+
+# How often to write out the disk cache index (in seconds)
+CACHE_FLUSH_INTERVAL = 5 * 60
+#
+##############################################################################
+#
+# handle_arguments()
+#
+def handle_arguments():
+    '''
+    Parse command line arguments
+
+    Returns:
+        argparse.Namespace: Representation of provided arguments
+    '''
+    parser = argparse.ArgumentParser(
+        description=('Load one or more SmugMug galleries once and serve the playlist and scaled '
+                     'frames to every slideshow.py --frame-server on this machine or the LAN'))
+
+    parser.add_argument('-g', '--gallery-id', action='append',
+                        help='Gallery Id to serve. May be repeated.')
+    parser.add_argument('-u', '--gallery-url', action='append',
+                        help='URL of Gallery to serve. May be repeated.')
+    parser.add_argument('-n', '--nickname', action='append',
+                        help='SmugMug nickname whose recent images to serve. May be repeated.')
+
+    parser.add_argument("--site-url", action='store', required=False, default=Slideshow.SITE_URL,
+                        help=("Site to look gallery ids and nicknames up on. "
+                              "Default: {}".format(Slideshow.SITE_URL)))
+
+    parser.add_argument("--socket", action='store', required=False, default=SOCKET_PATH,
+                        help=("Unix socket to listen on, or HOST:PORT to serve displays on "
+                              "other machines over TCP. Frames then travel as bytes instead of "
+                              "shared memory, and anyone who can reach the port is served. "
+                              "Default: {}".format(SOCKET_PATH)))
+
+    parser.add_argument("--resolution", action='store', required=False, default=RESOLUTION,
+                        type=int, nargs=2, metavar=('WIDTH', 'HEIGHT'),
+                        help=("Size of the largest display served. Images are downloaded and "
+                              "decoded for it once and scaled down for smaller ones. "
+                              "Default: {} {}".format(*RESOLUTION)))
+
+    parser.add_argument('-d', '--downscale-only', action='store_true', required=False,
+                        help=('Enable downscale mode. Prefer images larger than the display. '
+                              'Default: False'), default=False)
+
+    parser.add_argument("--cache-size", action='store', required=False,
+                        default=Slideshow.MAX_CACHE_SIZE // 1024 // 1024, type=int,
+                        help=("Maximum size of the in-memory cache of downloaded images in "
+                              "megabytes. Default: {}".format(Slideshow.MAX_CACHE_SIZE // 1024 //
+                                                              1024)))
+
+    parser.add_argument("--decoded-cache-size", action='store', required=False,
+                        default=FrameServer.DECODED_CACHE_SIZE // 1024 // 1024, type=int,
+                        help=("Maximum size of decoded images kept to scale for more displays, in "
+                              "megabytes. Default: {}".format(
+                                  FrameServer.DECODED_CACHE_SIZE // 1024 // 1024)))
+
+    parser.add_argument("--frame-cache-size", action='store', required=False,
+                        default=FrameServer.FRAME_CACHE_SIZE // 1024 // 1024, type=int,
+                        help=("Maximum size of scaled frames kept in shared memory, in "
+                              "megabytes. Default: {}".format(
+                                  FrameServer.FRAME_CACHE_SIZE // 1024 // 1024)))
+
+    parser.add_argument("--cache-dir", action='store', required=False, default=None,
+                        help=("Directory for a persistent image cache that survives restarts. "
+                              "Default: memory only"))
+
+    parser.add_argument("--disk-cache-size", action='store', required=False,
+                        default=Slideshow.MAX_DISK_CACHE_SIZE // 1024 // 1024, type=int,
+                        help=("Maximum size of the persistent image cache in megabytes. "
+                              "Default: {}".format(Slideshow.MAX_DISK_CACHE_SIZE // 1024 // 1024)))
+
+    parser.add_argument("--refresh-interval", action='store', required=False,
+                        default=Slideshow.REFRESH_INTERVAL, type=int,
+                        help=("Seconds between background checks of the gallery feed for changes. "
+                              "0 disables them. Default: {}".format(Slideshow.REFRESH_INTERVAL)))
+
+    parser.add_argument("--connections-per-host", action='store', required=False,
+                        default=Transport.POOL_SIZE, type=int,
+                        help=("Maximum kept-alive connections to each host. "
+                              "Default: {}".format(Transport.POOL_SIZE)))
+
+    parser.add_argument('-l', '--log-level', action='store', required=False,
+                        choices=["debug", "info", "warning", "error", "critical"],
+                        default=DEFAULT_LOG_LEVEL.upper(),
+                        help='Logging verbosity. Default: {}'.format(DEFAULT_LOG_LEVEL.upper()))
+
+    args = parser.parse_args()
+
+    if not (args.gallery_id or args.gallery_url or args.nickname):
+        parser.error("at least one of -g/--gallery-id, -u/--gallery-url or -n/--nickname "
+                     "is required")
+
+    return args
+#
+##############################################################################
+#
+# run_every()
+#
+def run_every(interval=None, action=None, stop=None):
+    '''
+    Call action every interval seconds until stop is set
+
+    Args:
+        interval (float): Seconds between calls
+        action (callable): What to call
+        stop (threading.Event): Set to end the loop
+    '''
+    while not stop.wait(interval):
+        action()
+#
+##############################################################################
+#
+# main()
+#
+def main():
+    '''
+    Serve the galleries until interrupted
+    '''
+    args = handle_arguments()
+
+    logging.basicConfig(format='%(levelname)s:%(module)s.%(funcName)s:%(message)s',
+                        level=getattr(logging, args.log_level.upper()))
+
+    configure_transport(pool_size=args.connections_per_host)
+    slide_show = Slideshow(gallery_id=args.gallery_id, gallery_url=args.gallery_url,
+                           nickname=args.nickname, site_url=args.site_url,
+                           downscale=args.downscale_only, width=args.resolution[0],
+                           height=args.resolution[1], cache_size=args.cache_size * 1024 * 1024,
+                           prefetch_ahead=0, prefetch_behind=0, cache_dir=args.cache_dir,
+                           disk_cache_size=args.disk_cache_size * 1024 * 1024)
+
+    server = FrameServer(slide_show=slide_show, path=args.socket,
+                         decoded_cache_size=args.decoded_cache_size * 1024 * 1024,
+                         frame_cache_size=args.frame_cache_size * 1024 * 1024)
+
+    # puts only journal themselves, so write the disk cache index out now and then
+    stop = threading.Event()
+    threading.Thread(target=run_every, args=(CACHE_FLUSH_INTERVAL, slide_show.flush, stop),
+                     name='flush', daemon=True).start()
+    if args.refresh_interval > 0:
+        threading.Thread(target=run_every, name='refresh', daemon=True,
+                         args=(args.refresh_interval, slide_show.refresh_in_background,
+                               stop)).start()
+
+    # shutdown() waits for serve_forever() to return, so it cannot run on the serving thread
+    signal.signal(signal.SIGTERM, lambda *args: threading.Thread(target=server.shutdown).start())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+    finally:
+        stop.set()
+        logging.getLogger(Path(__file__).resolve().name).info("Frame server stats: %s",
+                                                              server.stats())
+        slide_show.close()
+
+
+if __name__ == '__main__':
+    main()